@@ -0,0 +1,367 @@
+"""API аналитики работодателя: воронка и динамика событий по вакансиям"""
+import json
+import os
+import base64
+import hashlib
+import hmac
+import re
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from typing import Optional
+
+PREPARED_STATEMENTS = {
+    'user_by_session': """
+        SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """,
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+MAINTENANCE_TOKEN = os.environ.get('MAINTENANCE_TOKEN', '')
+MAX_DAYS = 3650
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
+
+def get_db_connection():
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        dsn = os.environ.get('DATABASE_URL')
+        conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row['jti'] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
+
+def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
+    """Получение пользователя по токену сессии"""
+    if not session_token:
+        return None
+    
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'user_by_session', (session_token,))
+            return cur.fetchone()
+    finally:
+        release_db_connection(conn)
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
+
+ROLLUP_BATCH_SIZE = int(os.environ.get('ROLLUP_BATCH_SIZE', '50000'))
+ROLLUP_LAG_SECONDS = int(os.environ.get('ROLLUP_LAG_SECONDS', '30'))
+
+def rollup_events(batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Перенос новых событий в почасовые и посуточные агрегаты; возвращает число обработанных событий"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT last_id FROM rollup_watermarks WHERE name = 'vacancy_events' FOR UPDATE")
+            last_id = cur.fetchone()['last_id']
+            
+            # Свежие события пропускаются, чтобы не обогнать ещё не закоммиченные вставки с меньшими id
+            cur.execute("""
+                SELECT MAX(id) AS upper_id FROM (
+                    SELECT id FROM vacancy_events
+                    WHERE id > %s AND created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    ORDER BY id
+                    LIMIT %s
+                ) batch
+            """, (last_id, ROLLUP_LAG_SECONDS, batch_size))
+            upper_id = cur.fetchone()['upper_id']
+            if upper_id is None:
+                return 0
+            
+            cur.execute("""
+                INSERT INTO vacancy_event_rollups (vacancy_id, granularity, bucket, event_type, events)
+                SELECT e.vacancy_id, g.granularity, date_trunc(g.granularity, e.created_at), e.event_type, COUNT(*)
+                FROM vacancy_events e
+                CROSS JOIN (VALUES ('hour'), ('day')) AS g(granularity)
+                WHERE e.id > %s AND e.id <= %s
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (vacancy_id, granularity, bucket, event_type)
+                DO UPDATE SET events = vacancy_event_rollups.events + EXCLUDED.events
+            """, (last_id, upper_id))
+            
+            cur.execute("""
+                UPDATE rollup_watermarks SET last_id = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE name = 'vacancy_events'
+            """, (upper_id,))
+            conn.commit()
+            return upper_id - last_id
+    finally:
+        release_db_connection(conn)
+
+def is_maintenance_call(event: dict) -> bool:
+    """Вызов по таймеру (событие без httpMethod) или HTTP-запрос с X-Maintenance-Token, равным MAINTENANCE_TOKEN;
+    пока токен не задан, HTTP-запуск закрыт"""
+    if 'httpMethod' not in event:
+        return True
+    headers = event.get('headers') or {}
+    token = headers.get('X-Maintenance-Token') or headers.get('x-maintenance-token') or ''
+    return bool(MAINTENANCE_TOKEN) and hmac.compare_digest(token.encode(), MAINTENANCE_TOKEN.encode())
+
+def parse_int_param(params: dict, name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    """Целый параметр запроса в пределах [low, high]; ValueError с текстом для ответа 400"""
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name}: ожидается целое число')
+    if not low <= number <= high:
+        raise ValueError(f'{name}: от {low} до {high}')
+    return number
+
+def handler(event: dict, context) -> dict:
+    """API endpoint для аналитики по вакансиям"""
+    method = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token, X-Maintenance-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    
+    try:
+        if method == 'POST':
+            if not is_maintenance_call(event):
+                return {
+                    'statusCode': 403,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            processed = rollup_events()
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({'processed': processed}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        if method != 'GET':
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        session_token = event.get('headers', {}).get('X-Session-Token') or event.get('headers', {}).get('x-session-token')
+        user = get_user_from_session(session_token)
+        
+        if not user or user['user_type'] != 'employer':
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        params = event.get('queryStringParameters') or {}
+        granularity = params.get('granularity', 'day')
+        try:
+            vacancy_id = parse_int_param(params, 'vacancy_id', None, 1, 2 ** 31 - 1)
+            days = parse_int_param(params, 'days', 30, 1, MAX_DAYS)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        if granularity not in ('hour', 'day'):
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'granularity: hour или day'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT r.vacancy_id, r.bucket, r.event_type, r.events
+                    FROM vacancy_event_rollups r
+                    JOIN vacancies v ON v.id = r.vacancy_id
+                    WHERE v.employer_id = %s
+                      AND (%s::integer IS NULL OR r.vacancy_id = %s::integer)
+                      AND r.granularity = %s
+                      AND r.bucket >= date_trunc(%s, CURRENT_TIMESTAMP - make_interval(days => %s))
+                    ORDER BY r.bucket
+                """, (user['id'], vacancy_id, vacancy_id, granularity, granularity, days))
+                rows = cur.fetchall()
+        finally:
+            release_db_connection(conn)
+        
+        series = {}
+        funnel = {}
+        for row in rows:
+            bucket = series.setdefault(row['bucket'].isoformat(), {})
+            bucket[row['event_type']] = bucket.get(row['event_type'], 0) + row['events']
+            funnel[row['event_type']] = funnel.get(row['event_type'], 0) + row['events']
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'vacancy_id': vacancy_id,
+                'granularity': granularity,
+                'funnel': funnel,
+                'series': [{'bucket': bucket, 'events': events} for bucket, events in series.items()]
+            }, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
@@ -1,32 +1,409 @@
 """API для управления откликами на вакансии"""
 import json
 import os
+import base64
+import hashlib
+import hmac
+import itertools
+import re
+import time
+from functools import lru_cache
+from json.encoder import encode_basestring
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import NamedTupleCursor, RealDictCursor
 from typing import Optional
 
+PREPARED_STATEMENTS = {
+    'user_by_session': """
+        SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """,
+    'applications_by_applicant': """
+        SELECT a.*, v.title, v.company, v.salary_min, v.salary_max
+        FROM applications a
+        JOIN vacancies v ON a.vacancy_id = v.id
+        WHERE a.applicant_id = %s
+        ORDER BY a.created_at DESC
+    """,
+    'applications_by_vacancy': """
+        SELECT a.*, u.full_name, u.email, r.position, r.phone
+        FROM applications a
+        JOIN users u ON a.applicant_id = u.id
+        LEFT JOIN resumes r ON a.resume_id = r.id
+        JOIN vacancies v ON a.vacancy_id = v.id
+        WHERE a.vacancy_id = %s AND v.employer_id = %s
+        ORDER BY a.created_at DESC
+    """,
+    # Границы по vacancy_id вычисляются в InitPlan: секции applications вне диапазона
+    # отсекаются при выполнении (по = ANY массива PostgreSQL секции не отсекает)
+    'applications_by_employer': """
+        WITH owned AS (
+            SELECT array_agg(id) AS ids, MIN(id) AS first_id, MAX(id) AS last_id
+            FROM vacancies WHERE employer_id = %s
+        )
+        SELECT a.*, u.full_name, u.email, v.title, v.company
+        FROM applications a
+        JOIN users u ON a.applicant_id = u.id
+        JOIN vacancies v ON a.vacancy_id = v.id
+        WHERE a.vacancy_id BETWEEN (SELECT first_id FROM owned) AND (SELECT last_id FROM owned)
+          AND a.vacancy_id = ANY((SELECT ids FROM owned)::integer[])
+        ORDER BY a.created_at DESC
+    """,
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
+
 def get_db_connection():
-    """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        dsn = os.environ.get('DATABASE_URL')
+        conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
 
-def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
-    """Получение пользователя по токену сессии"""
-    if not session_token:
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_URLS = [
+    url for url in re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL', ''))
+    if url
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', '1'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+
+_replicas = {url: {'conn': None, 'lag': None, 'checked_at': float('-inf'), 'down_until': float('-inf')} for url in REPLICA_URLS}
+_replica_rotation = itertools.count()
+_recent_writers = {}
+
+def mark_write(user_id):
+    """Отметка о записи пользователя: следующие READ_YOUR_WRITES_SECONDS его чтения идут на primary"""
+    if not REPLICA_URLS or user_id is None:
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        for key, written_at in list(_recent_writers.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                del _recent_writers[key]
+
+def get_replica_connection(url: str):
+    """Подключение к реплике, если она доступна и отстаёт не больше REPLICA_MAX_LAG_SECONDS; иначе None"""
+    state = _replicas[url]
+    now = time.monotonic()
+    if now < state['down_until']:
         return None
-    
+    try:
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = psycopg2.connect(url, connect_timeout=2, cursor_factory=RealDictCursor)
+            state['conn'].set_session(readonly=True)
+            _prepared_by_conn[id(state['conn'])] = set()
+            state['checked_at'] = float('-inf')
+        if now - state['checked_at'] >= REPLICA_CHECK_SECONDS:
+            # Догнавшая primary реплика на простое тоже имеет старый replay_timestamp, поэтому сначала сравниваем LSN
+            with state['conn'].cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+                """)
+                state['lag'] = float(cur.fetchone()[0])
+            state['conn'].rollback()
+            state['checked_at'] = now
+    except psycopg2.Error:
+        if state['conn'] is not None:
+            state['conn'].close()
+        state['down_until'] = now + REPLICA_RETRY_SECONDS
+        return None
+    return state['conn'] if state['lag'] <= REPLICA_MAX_LAG_SECONDS else None
+
+def get_read_connection(user_id=None, recently_wrote: bool = False):
+    """Подключение для чтения: реплики по кругу; primary, если реплик нет, все отстают или недоступны,
+    а также сразу после записи этого пользователя (по отметке клиента или этого инстанса)"""
+    recently_wrote = recently_wrote or \
+        time.monotonic() - _recent_writers.get(user_id, float('-inf')) <= READ_YOUR_WRITES_SECONDS
+    if REPLICA_URLS and not recently_wrote:
+        start = next(_replica_rotation)
+        for offset in range(len(REPLICA_URLS)):
+            conn = get_replica_connection(REPLICA_URLS[(start + offset) % len(REPLICA_URLS)])
+            if conn is not None:
+                return conn
+    return get_db_connection()
+
+def client_wrote_recently(event: dict) -> bool:
+    """Отметка о записи от клиента: X-Since-Last-Write — миллисекунды с его последней записи. Память инстанса
+    видит только записи, прошедшие через него, а отметка клиента работает при любом числе инстансов"""
+    headers = event.get('headers') or {}
+    value = headers.get('X-Since-Last-Write') or headers.get('x-since-last-write')
+    try:
+        return 0 <= float(value) <= READ_YOUR_WRITES_SECONDS * 1000
+    except (TypeError, ValueError):
+        return False
+
+def mark_replica_down(conn) -> bool:
+    """Сбой запроса на реплике: она пропускается REPLICA_RETRY_SECONDS, чтение повторяется на primary.
+    False — подключение не реплика, повторять негде"""
+    for state in _replicas.values():
+        if state['conn'] is conn:
+            conn.close()
+            state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+            return True
+    return False
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+# Дата и время приходят строкой из текстового протокола PostgreSQL, без разбора в datetime и обратно
+DATES_AS_TEXT = psycopg2.extensions.new_type((1082, 1114, 1184), 'DATES_AS_TEXT', lambda value, cur: value)
+
+# Кодирование значения в JSON по OID типа колонки; остальные типы — через json.dumps(default=str)
+JSON_VALUE_ENCODERS = {
+    16: "('null' if {0} is None else 'true' if {0} else 'false')",
+    20: "('null' if {0} is None else str({0}))",
+    21: "('null' if {0} is None else str({0}))",
+    23: "('null' if {0} is None else str({0}))",
+    25: "('null' if {0} is None else escape({0}))",
+    1042: "('null' if {0} is None else escape({0}))",
+    1043: "('null' if {0} is None else escape({0}))",
+    1082: "('null' if {0} is None else escape({0}))",
+    1114: "('null' if {0} is None else escape({0}))",
+    1184: "('null' if {0} is None else escape({0}))",
+}
+
+def open_row_cursor(conn):
+    """Курсор для выдачи строк клиенту: строки — namedtuple вместо dict, даты — текстом"""
+    cur = conn.cursor(cursor_factory=NamedTupleCursor)
+    psycopg2.extensions.register_type(DATES_AS_TEXT, cur)
+    return cur
+
+@lru_cache(maxsize=None)
+def compile_row_serializer(columns: tuple):
+    """Сериализатор строки в JSON-объект для набора колонок (имя, OID): ключи закодированы заранее,
+    значения — без промежуточного dict; tail дописывается перед закрывающей скобкой"""
+    keys = ','.join(json.dumps(name, ensure_ascii=False).replace('%', '%%') + ':%s' for name, _ in columns)
+    values = ''.join(JSON_VALUE_ENCODERS.get(oid, 'dumps({0})').format(f'row[{i}]') + ', ' for i, (_, oid) in enumerate(columns))
+    source = f"def serialize(row, tail=''):\n    return TEMPLATE % ({values}tail)\n"
+    namespace = {
+        'TEMPLATE': '{' + keys + '%s}',
+        'escape': encode_basestring,
+        'dumps': lambda value: json.dumps(value, ensure_ascii=False, default=str),
+    }
+    exec(compile(source, '<row serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+def row_serializer(cur):
+    """Сериализатор для колонок последнего запроса курсора"""
+    return compile_row_serializer(tuple((column.name, column.type_code) for column in cur.description))
+
+def rows_to_json(cur, rows) -> str:
+    """JSON-массив строк результата"""
+    serialize = row_serializer(cur)
+    return '[' + ','.join(map(serialize, rows)) + ']'
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT u.id, u.email, u.full_name, u.user_type
-                FROM user_sessions s
-                JOIN users u ON s.user_id = u.id
-                WHERE s.session_token = %s AND s.expires_at > NOW()
-            """, (session_token,))
-            return cur.fetchone()
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row['jti'] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
     finally:
-        conn.close()
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
+
+def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
+    """Получение пользователя по токену сессии"""
+    if not session_token:
+        return None
+    
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection()
+    while True:
+        try:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'user_by_session', (session_token,))
+                user = cur.fetchone()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            user = None
+        finally:
+            release_db_connection(conn)
+        if user or conn is _db_conn:
+            return user
+        conn = get_db_connection()
+
+def get_idempotency_key(event: dict) -> Optional[str]:
+    """Ключ идемпотентности из заголовка Idempotency-Key"""
+    headers = event.get('headers') or {}
+    return headers.get('Idempotency-Key') or headers.get('idempotency-key')
+
+def claim_idempotency_key(cur, user_id: int, key: str, endpoint: str, body: Optional[str]) -> Optional[dict]:
+    """Захват ключа в транзакции запроса: None — запрос новый и выполняется, иначе готовый ответ.
+    Параллельный повтор ждёт на первичном ключе, пока первый запрос не зафиксируется или не откатится"""
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key длиннее 255 символов'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    request_hash = hashlib.sha256(f'{endpoint}\n{body or ""}'.encode()).hexdigest()
+    cur.execute("""
+        INSERT INTO idempotency_keys (user_id, key, request_hash) VALUES (%s, %s, %s)
+        ON CONFLICT (user_id, key) DO NOTHING
+        RETURNING user_id
+    """, (user_id, key, request_hash))
+    if cur.fetchone():
+        return None
+    cur.execute(
+        "SELECT request_hash, status_code, response_body FROM idempotency_keys WHERE user_id = %s AND key = %s",
+        (user_id, key)
+    )
+    saved = cur.fetchone()
+    if not saved:
+        return claim_idempotency_key(cur, user_id, key, endpoint, body)
+    if saved['request_hash'] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key уже использован для другого запроса'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': saved['status_code'],
+        'headers': dict(headers, **{'Idempotent-Replayed': 'true'}),
+        'body': saved['response_body'],
+        'isBase64Encoded': False
+    }
+
+def save_idempotent_response(cur, user_id: int, key: str, response: dict):
+    """Ответ сохраняется в той же транзакции, что и запись в основные таблицы"""
+    cur.execute(
+        "UPDATE idempotency_keys SET status_code = %s, response_body = %s WHERE user_id = %s AND key = %s",
+        (response['statusCode'], response['body'], user_id, key)
+    )
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
 
 def handler(event: dict, context) -> dict:
     """API endpoint для работы с откликами"""
@@ -38,7 +415,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token, Idempotency-Key, X-Since-Last-Write',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -61,51 +438,27 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
+    conn = get_read_connection(user['id'], client_wrote_recently(event)) if method == 'GET' else get_db_connection()
     try:
-        with conn.cursor() as cur:
+        with (open_row_cursor(conn) if method == 'GET' else conn.cursor()) as cur:
             if method == 'GET':
                 params = event.get('queryStringParameters') or {}
                 vacancy_id = params.get('vacancy_id')
                 
                 if user['user_type'] == 'applicant':
-                    query = """
-                        SELECT a.*, v.title, v.company, v.salary_min, v.salary_max
-                        FROM applications a
-                        JOIN vacancies v ON a.vacancy_id = v.id
-                        WHERE a.applicant_id = %s
-                        ORDER BY a.created_at DESC
-                    """
-                    cur.execute(query, (user['id'],))
+                    execute_prepared(cur, 'applications_by_applicant', (user['id'],))
                 elif user['user_type'] == 'employer':
                     if vacancy_id:
-                        query = """
-                            SELECT a.*, u.full_name, u.email, r.position, r.phone
-                            FROM applications a
-                            JOIN users u ON a.applicant_id = u.id
-                            LEFT JOIN resumes r ON a.resume_id = r.id
-                            JOIN vacancies v ON a.vacancy_id = v.id
-                            WHERE a.vacancy_id = %s AND v.employer_id = %s
-                            ORDER BY a.created_at DESC
-                        """
-                        cur.execute(query, (vacancy_id, user['id']))
+                        execute_prepared(cur, 'applications_by_vacancy', (vacancy_id, user['id']))
                     else:
-                        query = """
-                            SELECT a.*, u.full_name, u.email, v.title, v.company
-                            FROM applications a
-                            JOIN users u ON a.applicant_id = u.id
-                            JOIN vacancies v ON a.vacancy_id = v.id
-                            WHERE v.employer_id = %s
-                            ORDER BY a.created_at DESC
-                        """
-                        cur.execute(query, (user['id'],))
+                        execute_prepared(cur, 'applications_by_employer', (user['id'],))
                 
                 applications = cur.fetchall()
                 
                 return {
                     'statusCode': 200,
                     'headers': headers,
-                    'body': json.dumps([dict(a) for a in applications], ensure_ascii=False, default=str),
+                    'body': rows_to_json(cur, applications),
                     'isBase64Encoded': False
                 }
             
@@ -118,35 +471,75 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                data = json.loads(event.get('body', '{}'))
+                raw_body = event.get('body') or '{}'
+                data = json.loads(raw_body)
                 vacancy_id = data.get('vacancy_id')
                 resume_id = data.get('resume_id')
                 cover_letter = data.get('cover_letter', '')
                 
-                try:
-                    cur.execute("""
+                idempotency_key = get_idempotency_key(event)
+                if idempotency_key:
+                    replay = claim_idempotency_key(cur, user['id'], idempotency_key, 'POST applications', raw_body)
+                    if replay:
+                        conn.rollback()
+                        return replay
+                
+                # Проверки в том же запросе, что и вставка: вакансия открыта, резюме принадлежит соискателю.
+                # Повторный отклик не прерывает транзакцию ошибкой уникальности, а просто не вставляет строку
+                cur.execute("""
+                    WITH target AS (
+                        SELECT v.id AS vacancy_id,
+                               v.status = 'active' AND (v.expires_at IS NULL OR v.expires_at > NOW()) AS vacancy_open,
+                               %s::integer IS NULL OR EXISTS (
+                                   SELECT 1 FROM resumes r
+                                   WHERE r.id = %s::integer AND r.user_id = %s AND r.deleted_at IS NULL
+                               ) AS resume_owned
+                        FROM vacancies v
+                        WHERE v.id = %s
+                    ), created AS (
                         INSERT INTO applications (vacancy_id, applicant_id, resume_id, cover_letter)
-                        VALUES (%s, %s, %s, %s)
-                        RETURNING id
-                    """, (vacancy_id, user['id'], resume_id, cover_letter))
-                    
-                    application_id = cur.fetchone()['id']
-                    conn.commit()
-                    
-                    return {
-                        'statusCode': 201,
-                        'headers': headers,
-                        'body': json.dumps({'id': application_id, 'message': 'Отклик отправлен'}, ensure_ascii=False),
-                        'isBase64Encoded': False
-                    }
-                except psycopg2.IntegrityError:
+                        SELECT vacancy_id, %s, %s, %s FROM target WHERE vacancy_open AND resume_owned
+                        ON CONFLICT (vacancy_id, applicant_id) DO NOTHING
+                        RETURNING id, vacancy_id
+                    ), logged AS (
+                        INSERT INTO vacancy_events (vacancy_id, event_type)
+                        SELECT vacancy_id, 'apply' FROM created
+                    )
+                    SELECT (SELECT id FROM created) AS id, t.vacancy_open, t.resume_owned
+                    FROM (SELECT 1) AS one
+                    LEFT JOIN target t ON true
+                """, (resume_id, resume_id, user['id'], vacancy_id, user['id'], resume_id, cover_letter))
+                created = cur.fetchone()
+                
+                if not created['id']:
                     conn.rollback()
+                    if created['vacancy_open'] is None:
+                        status_code, error = 404, 'Вакансия не найдена'
+                    elif not created['vacancy_open']:
+                        status_code, error = 409, 'Вакансия закрыта'
+                    elif not created['resume_owned']:
+                        status_code, error = 404, 'Резюме не найдено'
+                    else:
+                        status_code, error = 409, 'Вы уже откликались на эту вакансию'
                     return {
-                        'statusCode': 400,
+                        'statusCode': status_code,
                         'headers': headers,
-                        'body': json.dumps({'error': 'Вы уже откликались на эту вакансию'}, ensure_ascii=False),
+                        'body': json.dumps({'error': error}, ensure_ascii=False),
                         'isBase64Encoded': False
                     }
+                
+                response = {
+                    'statusCode': 201,
+                    'headers': headers,
+                    'body': json.dumps({'id': created['id'], 'message': 'Отклик отправлен'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+                if idempotency_key:
+                    save_idempotent_response(cur, user['id'], idempotency_key, response)
+                conn.commit()
+                mark_write(user['id'])
+                
+                return response
             
             elif method == 'PUT':
                 if user['user_type'] != 'employer':
@@ -161,13 +554,23 @@ def handler(event: dict, context) -> dict:
                 application_id = data.get('id')
                 status = data.get('status')
                 
+                # Проверка владельца в самом UPDATE; vacancy_id из тела (если передан) отсекает лишние секции
                 cur.execute("""
-                    SELECT a.id FROM applications a
-                    JOIN vacancies v ON a.vacancy_id = v.id
-                    WHERE a.id = %s AND v.employer_id = %s
-                """, (application_id, user['id']))
+                    WITH changed AS (
+                        UPDATE applications a
+                        SET status = %s, updated_at = CURRENT_TIMESTAMP
+                        FROM vacancies v
+                        WHERE a.id = %s AND a.vacancy_id = v.id AND v.employer_id = %s
+                          AND (%s::integer IS NULL OR a.vacancy_id = %s::integer)
+                        RETURNING a.vacancy_id, a.status
+                    ), logged AS (
+                        INSERT INTO vacancy_events (vacancy_id, event_type)
+                        SELECT vacancy_id, 'status:' || status FROM changed
+                    )
+                    SELECT COUNT(*) AS updated FROM changed
+                """, (status, application_id, user['id'], data.get('vacancy_id'), data.get('vacancy_id')))
                 
-                if not cur.fetchone():
+                if not cur.fetchone()['updated']:
                     return {
                         'statusCode': 403,
                         'headers': headers,
@@ -175,13 +578,8 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute("""
-                    UPDATE applications 
-                    SET status = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (status, application_id))
-                
                 conn.commit()
+                mark_write(user['id'])
                 
                 return {
                     'statusCode': 200,
@@ -199,6 +597,10 @@ def handler(event: dict, context) -> dict:
                 }
     
     except Exception as e:
+        if method == 'GET' and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) \
+                and mark_replica_down(conn):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            return handler(dict(event, headers=dict(event.get('headers') or {}, **{'X-Since-Last-Write': '0'})), context)
         return {
             'statusCode': 500,
             'headers': headers,
@@ -206,4 +608,4 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     finally:
-        conn.close()
+        release_db_connection(conn)
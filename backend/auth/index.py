@@ -1,23 +1,488 @@
 import json
 import os
+import base64
+import hmac
+import itertools
+import re
+import time
 import hashlib
 import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import Optional
+
+PREPARED_STATEMENTS = {
+    'user_by_session': """SELECT u.id, u.email, u.full_name, u.user_type, u.created_at
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()""",
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+    'user_by_id': """SELECT id, email, full_name, user_type, created_at FROM users WHERE id = %s""",
+    # Хеш пароля нужен только update_profile для проверки текущего пароля, остальным он не отдаётся
+    'user_by_session_with_password': """SELECT u.id, u.email, u.full_name, u.user_type, u.password_hash
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()""",
+    'user_by_id_with_password': """SELECT id, email, full_name, user_type, password_hash FROM users WHERE id = %s""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+SESSION_TTL_SECONDS = 30 * 24 * 3600
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '260000'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '8'))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', '2'))
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '20'))
+RATE_LIMIT_EMAIL_PER_MINUTE = float(os.environ.get('RATE_LIMIT_EMAIL_PER_MINUTE', '5'))
+MAX_ACTIVE_SESSIONS = int(os.environ.get('MAX_ACTIVE_SESSIONS', '10'))
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+_db_conn = None
 
 def get_db_connection():
-    """Создание подключения к базе данных"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Подключение к базе данных, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_URLS = [
+    url for url in re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL', ''))
+    if url
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', '1'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+
+_replicas = {url: {'conn': None, 'lag': None, 'checked_at': float('-inf'), 'down_until': float('-inf')} for url in REPLICA_URLS}
+_replica_rotation = itertools.count()
+_recent_writers = {}
+
+def mark_write(user_id):
+    """Отметка о записи пользователя: следующие READ_YOUR_WRITES_SECONDS его чтения идут на primary"""
+    if not REPLICA_URLS or user_id is None:
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        for key, written_at in list(_recent_writers.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                del _recent_writers[key]
+
+def get_replica_connection(url: str):
+    """Подключение к реплике, если она доступна и отстаёт не больше REPLICA_MAX_LAG_SECONDS; иначе None"""
+    state = _replicas[url]
+    now = time.monotonic()
+    if now < state['down_until']:
+        return None
+    try:
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = psycopg2.connect(url, connect_timeout=2)
+            state['conn'].set_session(readonly=True)
+            _prepared_by_conn[id(state['conn'])] = set()
+            state['checked_at'] = float('-inf')
+        if now - state['checked_at'] >= REPLICA_CHECK_SECONDS:
+            # Догнавшая primary реплика на простое тоже имеет старый replay_timestamp, поэтому сначала сравниваем LSN
+            with state['conn'].cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+                """)
+                state['lag'] = float(cur.fetchone()[0])
+            state['conn'].rollback()
+            state['checked_at'] = now
+    except psycopg2.Error:
+        if state['conn'] is not None:
+            state['conn'].close()
+        state['down_until'] = now + REPLICA_RETRY_SECONDS
+        return None
+    return state['conn'] if state['lag'] <= REPLICA_MAX_LAG_SECONDS else None
+
+def get_read_connection(user_id=None, recently_wrote: bool = False):
+    """Подключение для чтения: реплики по кругу; primary, если реплик нет, все отстают или недоступны,
+    а также сразу после записи этого пользователя (по отметке клиента или этого инстанса)"""
+    recently_wrote = recently_wrote or \
+        time.monotonic() - _recent_writers.get(user_id, float('-inf')) <= READ_YOUR_WRITES_SECONDS
+    if REPLICA_URLS and not recently_wrote:
+        start = next(_replica_rotation)
+        for offset in range(len(REPLICA_URLS)):
+            conn = get_replica_connection(REPLICA_URLS[(start + offset) % len(REPLICA_URLS)])
+            if conn is not None:
+                return conn
+    return get_db_connection()
+
+def client_wrote_recently(event: dict) -> bool:
+    """Отметка о записи от клиента: X-Since-Last-Write — миллисекунды с его последней записи. Память инстанса
+    видит только записи, прошедшие через него, а отметка клиента работает при любом числе инстансов"""
+    headers = event.get('headers') or {}
+    value = headers.get('X-Since-Last-Write') or headers.get('x-since-last-write')
+    try:
+        return 0 <= float(value) <= READ_YOUR_WRITES_SECONDS * 1000
+    except (TypeError, ValueError):
+        return False
+
+def mark_replica_down(conn) -> bool:
+    """Сбой запроса на реплике: она пропускается REPLICA_RETRY_SECONDS, чтение повторяется на primary.
+    False — подключение не реплика, повторять негде"""
+    for state in _replicas.values():
+        if state['conn'] is conn:
+            conn.close()
+            state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+            return True
+    return False
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
 
-def hash_password(password: str) -> str:
-    """Хеширование пароля"""
-    return hashlib.sha256(password.encode()).hexdigest()
+class PasswordHasherBusy(Exception):
+    """Очередь хеширования паролей переполнена"""
+
+def hash_password(password: str, iterations: int = None) -> str:
+    """Хеширование пароля: PBKDF2-SHA256 с солью, формат pbkdf2_sha256$итерации$соль$хеш"""
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f'pbkdf2_sha256${iterations}${b64url_encode(salt)}${b64url_encode(digest)}'
+
+def check_password(password: str, password_hash: str) -> tuple:
+    """Проверка пароля; второй элемент — нужно ли перехешировать (старый SHA-256 или меньшая стоимость)"""
+    if '$' not in password_hash:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, password_hash), True
+    
+    try:
+        algorithm, iterations, salt, digest = password_hash.split('$')
+        iterations = int(iterations)
+        if algorithm != 'pbkdf2_sha256':
+            return False, False
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), b64url_decode(salt), iterations)
+        expected = b64url_decode(digest)
+    except (ValueError, OverflowError):
+        # Повреждённый хеш (другое число частей, нечисловая стоимость, не base64) — неудачная проверка, а не 500
+        return False, False
+    return hmac.compare_digest(candidate, expected), iterations < PASSWORD_HASH_ITERATIONS
+
+def run_password_task(fn, *args):
+    """Выполнение хеширования в ограниченном пуле потоков; при переполнении очереди — PasswordHasherBusy"""
+    if not _password_slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        raise PasswordHasherBusy()
+    try:
+        return _password_pool.submit(fn, *args).result()
+    finally:
+        _password_slots.release()
 
 def generate_session_token() -> str:
     """Генерация токена сессии"""
     return secrets.token_urlsafe(32)
 
+def create_session(cur, user_id: int) -> str:
+    """Создание сессии с ограничением числа активных сессий пользователя"""
+    session_token = generate_session_token()
+    expires_at = datetime.now() + timedelta(days=30)
+    cur.execute(
+        """INSERT INTO user_sessions (user_id, session_token, expires_at) 
+           VALUES (%s, %s, %s)""",
+        (user_id, session_token, expires_at)
+    )
+    cur.execute(
+        """DELETE FROM user_sessions WHERE id IN (
+               SELECT id FROM user_sessions WHERE user_id = %s
+               ORDER BY created_at DESC, id DESC OFFSET %s
+           )""",
+        (user_id, MAX_ACTIVE_SESSIONS)
+    )
+    return session_token
+
+def b64url_encode(value: bytes) -> str:
+    """Кодирование base64url без выравнивания"""
+    return base64.urlsafe_b64encode(value).rstrip(b'=').decode()
+
+def issue_signed_token(user: dict) -> str:
+    """Подписанный HMAC токен с id пользователя, типом и сроком действия"""
+    claims = {
+        'uid': user['id'],
+        'typ': user['user_type'],
+        'exp': int(time.time() + SESSION_TTL_SECONDS),
+        'jti': secrets.token_urlsafe(12),
+    }
+    payload = b64url_encode(json.dumps(claims, separators=(',', ':')).encode())
+    signature = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+    return f'{SIGNED_TOKEN_PREFIX}{payload}.{b64url_encode(signature)}'
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row[0] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
+
+class LocalRateLimitStore:
+    """Общее хранилище расхода токенов в памяти процесса (для тестов и локального запуска)"""
+    
+    def __init__(self):
+        self._log = []
+    
+    def exchange(self, instance_id: str, deltas: dict, cursor: int) -> tuple:
+        """Запись своего расхода и получение расхода других инстансов после cursor"""
+        self._log.extend((instance_id, key, amount) for key, amount in deltas.items())
+        foreign = {}
+        for owner, key, amount in self._log[cursor:]:
+            if owner != instance_id:
+                foreign[key] = foreign.get(key, 0.0) + amount
+        return foreign, len(self._log)
+
+class PostgresRateLimitStore:
+    """Общее хранилище расхода токенов в таблице rate_limit_log"""
+    
+    def exchange(self, instance_id: str, deltas: dict, cursor: int) -> tuple:
+        """Одна транзакция: вставка своего расхода и чтение чужого после cursor"""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                if deltas:
+                    execute_values(
+                        cur,
+                        "INSERT INTO rate_limit_log (instance_id, bucket_key, amount) VALUES %s",
+                        [(instance_id, key, amount) for key, amount in deltas.items()]
+                    )
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM rate_limit_log")
+                latest = cur.fetchone()[0]
+                rows = []
+                if cursor:
+                    cur.execute(
+                        """SELECT bucket_key, SUM(amount) FROM rate_limit_log
+                           WHERE id > %s AND id <= %s AND instance_id <> %s
+                           GROUP BY bucket_key""",
+                        (cursor, latest, instance_id)
+                    )
+                    rows = cur.fetchall()
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+        return {key: float(amount) for key, amount in rows}, latest
+
+class TokenBucketLimiter:
+    """Ограничитель частоты на токен-бакетах: ключ -> [остаток токенов, время пополнения]"""
+    
+    def __init__(self, capacity: float, refill_per_sec: float, max_keys: int = 50000,
+                 store=None, sync_interval: float = 5.0, namespace: str = ''):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.max_keys = max_keys
+        self.store = store
+        self.sync_interval = sync_interval
+        # Несколько ограничителей делят одно хранилище: ключи в нём с префиксом ограничителя, чужие пропускаются
+        self.prefix = f'{namespace}:' if namespace else ''
+        self.instance_id = secrets.token_hex(8)
+        self._buckets = {}
+        self._pending = {}
+        self._cursor = 0
+        self._synced_at = time.monotonic()
+    
+    def _bucket(self, key: str, now: float) -> list:
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            if len(self._buckets) >= self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_sec)
+            bucket[1] = now
+        self._buckets[key] = bucket
+        return bucket
+    
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        """Списание cost токенов; False, если бакет пуст"""
+        now = time.monotonic()
+        if self.store is not None and now - self._synced_at >= self.sync_interval:
+            self.sync(now)
+        bucket = self._bucket(key, now)
+        if bucket[0] < cost:
+            return False
+        bucket[0] -= cost
+        if self.store is not None:
+            self._pending[self.prefix + key] = self._pending.get(self.prefix + key, 0.0) + cost
+        return True
+    
+    def retry_after(self, key: str, cost: float = 1.0) -> int:
+        """Через сколько секунд в бакете появится cost токенов"""
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket[0] >= cost:
+            return 0
+        return int((cost - bucket[0]) / self.refill_per_sec) + 1
+    
+    def sync(self, now: float = None):
+        """Обмен расходом с общим хранилищем: свой расход туда, чужой списывается локально"""
+        now = time.monotonic() if now is None else now
+        pending, self._pending = self._pending, {}
+        try:
+            foreign, self._cursor = self.store.exchange(self.instance_id, pending, self._cursor)
+        except psycopg2.Error:
+            for key, amount in pending.items():
+                self._pending[key] = self._pending.get(key, 0.0) + amount
+            foreign = {}
+        for key, amount in foreign.items():
+            if not key.startswith(self.prefix):
+                continue
+            bucket = self._bucket(key[len(self.prefix):], now)
+            bucket[0] = max(0.0, bucket[0] - amount)
+        self._synced_at = now
+
+def get_client_ip(event: dict) -> str:
+    """IP клиента, который видит платформа; X-Forwarded-For задаёт сам клиент, и по нему лимит обходился бы"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or 'unknown'
+
+def check_auth_rate_limit(event: dict, email: str):
+    """Проверка лимитов по IP и email до обращения к БД; возвращает ответ 429 или None"""
+    keys = [(ip_limiter, get_client_ip(event))]
+    if email:
+        # Длиннее 254 символов адрес не бывает; обрезка держит ключ с префиксом в пределах bucket_key VARCHAR(320)
+        keys.append((email_limiter, email[:254]))
+    for limiter, key in keys:
+        if not limiter.allow(key):
+            return {
+                'statusCode': 429,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Retry-After': str(limiter.retry_after(key))
+                },
+                'body': json.dumps({'error': 'Слишком много попыток, повторите позже'}),
+                'isBase64Encoded': False
+            }
+    return None
+
+_rate_limit_store = PostgresRateLimitStore() if os.environ.get('RATE_LIMIT_SYNC') == '1' else None
+ip_limiter = TokenBucketLimiter(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_PER_MINUTE / 60,
+                                store=_rate_limit_store, namespace='ip')
+email_limiter = TokenBucketLimiter(RATE_LIMIT_EMAIL_PER_MINUTE, RATE_LIMIT_EMAIL_PER_MINUTE / 60,
+                                   store=_rate_limit_store, namespace='email')
+
+# Хеш для несуществующих email: проверка занимает столько же времени, что и для реальных
+DUMMY_PASSWORD_HASH = f'pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${b64url_encode(bytes(16))}${b64url_encode(bytes(32))}'
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
+
 def handler(event: dict, context) -> dict:
     """API для регистрации, авторизации и управления профилем пользователей"""
     method = event.get('httpMethod', 'GET')
@@ -28,7 +493,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization, X-Since-Last-Write'
             },
             'body': '',
             'isBase64Encoded': False
@@ -52,6 +517,11 @@ def handler(event: dict, context) -> dict:
         body = json.loads(event.get('body', '{}'))
         action = body.get('action')
         
+        if action in ('register', 'login'):
+            limited = check_auth_rate_limit(event, body.get('email', '').strip().lower())
+            if limited:
+                return limited
+        
         if action == 'register':
             return register_user(body)
         elif action == 'login':
@@ -68,6 +538,14 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
     
+    except PasswordHasherBusy:
+        return {
+            'statusCode': 503,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+            'body': json.dumps({'error': 'Сервер перегружен, повторите попытку позже'}),
+            'isBase64Encoded': False
+        }
+    
     except Exception as e:
         return {
             'statusCode': 500,
@@ -99,6 +577,9 @@ def register_user(body: dict) -> dict:
             'isBase64Encoded': False
         }
     
+    # PBKDF2 — сотни миллисекунд: хеш считается до подключения, чтобы транзакция не простаивала открытой
+    password_hash = run_password_task(hash_password, password)
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -111,7 +592,6 @@ def register_user(body: dict) -> dict:
                     'isBase64Encoded': False
                 }
             
-            password_hash = hash_password(password)
             cur.execute(
                 """INSERT INTO users (email, password_hash, full_name, user_type) 
                    VALUES (%s, %s, %s, %s) RETURNING id, email, full_name, user_type, created_at""",
@@ -119,13 +599,7 @@ def register_user(body: dict) -> dict:
             )
             user = cur.fetchone()
             
-            session_token = generate_session_token()
-            expires_at = datetime.now() + timedelta(days=30)
-            cur.execute(
-                """INSERT INTO user_sessions (user_id, session_token, expires_at) 
-                   VALUES (%s, %s, %s)""",
-                (user['id'], session_token, expires_at)
-            )
+            session_token = issue_signed_token(user) if SESSION_SIGNING_KEY else create_session(cur, user['id'])
             
             conn.commit()
             
@@ -145,7 +619,7 @@ def register_user(body: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def login_user(body: dict) -> dict:
     """Вход пользователя"""
@@ -163,15 +637,22 @@ def login_user(body: dict) -> dict:
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            password_hash = hash_password(password)
             cur.execute(
-                """SELECT id, email, full_name, user_type 
-                   FROM users WHERE email = %s AND password_hash = %s""",
-                (email, password_hash)
+                """SELECT id, email, full_name, user_type, password_hash 
+                   FROM users WHERE email = %s""",
+                (email,)
             )
             user = cur.fetchone()
+            # Транзакция чтения закрывается до PBKDF2; запись (перехеширование, сессия) идёт в новой
+            conn.rollback()
+            
+            if user:
+                password_ok, needs_rehash = run_password_task(check_password, password, user['password_hash'])
+            else:
+                run_password_task(check_password, password, DUMMY_PASSWORD_HASH)
+                password_ok, needs_rehash = False, False
             
-            if not user:
+            if not password_ok:
                 return {
                     'statusCode': 401,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -179,13 +660,15 @@ def login_user(body: dict) -> dict:
                     'isBase64Encoded': False
                 }
             
-            session_token = generate_session_token()
-            expires_at = datetime.now() + timedelta(days=30)
-            cur.execute(
-                """INSERT INTO user_sessions (user_id, session_token, expires_at) 
-                   VALUES (%s, %s, %s)""",
-                (user['id'], session_token, expires_at)
-            )
+            if needs_rehash:
+                new_hash = run_password_task(hash_password, password)
+                # Пароль, сменённый за время проверки, не перезаписывается
+                cur.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                    (new_hash, user['id'], user['password_hash'])
+                )
+            
+            session_token = issue_signed_token(user) if SESSION_SIGNING_KEY else create_session(cur, user['id'])
             
             conn.commit()
             
@@ -205,7 +688,27 @@ def login_user(body: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def find_session(cur, token: str):
+    """Пользователь и срок действия сессии по токену (подписанному или из user_sessions)"""
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(token)
+        if not claims:
+            return None
+        execute_prepared(cur, 'user_by_id', (claims['uid'],))
+        result = cur.fetchone()
+        if result:
+            result['expires_at'] = datetime.fromtimestamp(claims['exp'])
+        return result
+    cur.execute(
+        """SELECT u.id, u.email, u.full_name, u.user_type, s.expires_at
+           FROM user_sessions s
+           JOIN users u ON s.user_id = u.id
+           WHERE s.session_token = %s""",
+        (token,)
+    )
+    return cur.fetchone()
 
 def verify_session(event: dict) -> dict:
     """Проверка сессии"""
@@ -220,50 +723,53 @@ def verify_session(event: dict) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """SELECT u.id, u.email, u.full_name, u.user_type, s.expires_at
-                   FROM user_sessions s
-                   JOIN users u ON s.user_id = u.id
-                   WHERE s.session_token = %s""",
-                (token,)
-            )
-            result = cur.fetchone()
-            
-            if not result:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Неверный токен'}),
-                    'isBase64Encoded': False
-                }
-            
-            if result['expires_at'] < datetime.now():
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Сессия истекла'}),
-                    'isBase64Encoded': False
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'user': {
-                        'id': result['id'],
-                        'email': result['email'],
-                        'full_name': result['full_name'],
-                        'user_type': result['user_type']
-                    }
-                }),
-                'isBase64Encoded': False
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection(recently_wrote=client_wrote_recently(event))
+    while True:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                result = find_session(cur, token)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            result = None
+        finally:
+            release_db_connection(conn)
+        if result or conn is _db_conn:
+            break
+        conn = get_db_connection()
+    
+    if not result:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверный токен'}),
+            'isBase64Encoded': False
+        }
+    
+    if result['expires_at'] < datetime.now():
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Сессия истекла'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'user': {
+                'id': result['id'],
+                'email': result['email'],
+                'full_name': result['full_name'],
+                'user_type': result['user_type']
             }
-    finally:
-        conn.close()
+        }),
+        'isBase64Encoded': False
+    }
 
 def logout_user(event: dict) -> dict:
     """Выход пользователя"""
@@ -281,7 +787,18 @@ def logout_user(event: dict) -> dict:
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("UPDATE user_sessions SET expires_at = NOW() WHERE session_token = %s", (token,))
+            if token.startswith(SIGNED_TOKEN_PREFIX):
+                claims = decode_signed_token(token)
+                if claims:
+                    cur.execute(
+                        """INSERT INTO revoked_sessions (jti, expires_at)
+                           VALUES (%s, to_timestamp(%s)::timestamp)
+                           ON CONFLICT (jti) DO NOTHING""",
+                        (claims['jti'], claims['exp'])
+                    )
+                    _revocations['jtis'].add(claims['jti'])
+            else:
+                cur.execute("DELETE FROM user_sessions WHERE session_token = %s", (token,))
             conn.commit()
             
             return {
@@ -291,23 +808,38 @@ def logout_user(event: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
 
-def get_user_from_session(session_token: str):
+def lookup_session_user(cur, session_token: str, with_password_hash: bool = False):
+    """Пользователь по токену сессии на переданном курсоре (в текущей транзакции)"""
+    suffix = '_with_password' if with_password_hash else ''
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        if not claims:
+            return None
+        execute_prepared(cur, 'user_by_id' + suffix, (claims['uid'],))
+    else:
+        execute_prepared(cur, 'user_by_session' + suffix, (session_token,))
+    return cur.fetchone()
+
+def get_user_from_session(session_token: str, recently_wrote: bool = False):
     """Получение пользователя по токену сессии"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """SELECT u.id, u.email, u.full_name, u.user_type, u.created_at
-                   FROM user_sessions s
-                   JOIN users u ON s.user_id = u.id
-                   WHERE s.session_token = %s AND s.expires_at > NOW()""",
-                (session_token,)
-            )
-            return cur.fetchone()
-    finally:
-        conn.close()
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection(session_token, recently_wrote)
+    while True:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                user = lookup_session_user(cur, session_token)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            user = None
+        finally:
+            release_db_connection(conn)
+        if user or conn is _db_conn:
+            return user
+        conn = get_db_connection()
 
 def get_profile(event: dict) -> dict:
     """Получение данных профиля пользователя"""
@@ -322,7 +854,7 @@ def get_profile(event: dict) -> dict:
             'isBase64Encoded': False
         }
     
-    user = get_user_from_session(session_token)
+    user = get_user_from_session(session_token, client_wrote_recently(event))
     if not user:
         return {
             'statusCode': 401,
@@ -348,7 +880,7 @@ def get_profile(event: dict) -> dict:
     }
 
 def update_profile(event: dict) -> dict:
-    """Обновление данных профиля пользователя"""
+    """Обновление данных профиля пользователя: поиск сессии и один UPDATE ... RETURNING"""
     auth_header = event.get('headers', {}).get('X-Authorization', '')
     session_token = auth_header.replace('Bearer ', '') if auth_header else ''
     
@@ -360,15 +892,6 @@ def update_profile(event: dict) -> dict:
             'isBase64Encoded': False
         }
     
-    user = get_user_from_session(session_token)
-    if not user:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Сессия истекла'}),
-            'isBase64Encoded': False
-        }
-    
     try:
         body = json.loads(event.get('body', '{}'))
         full_name = body.get('full_name', '').strip()
@@ -376,27 +899,27 @@ def update_profile(event: dict) -> dict:
         current_password = body.get('current_password', '')
         new_password = body.get('new_password', '')
         
-        if not full_name and not email and not new_password:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Нет данных для обновления'}),
-                'isBase64Encoded': False
-            }
-        
         conn = get_db_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                if email and email != user['email']:
-                    cur.execute("SELECT id FROM users WHERE email = %s AND id != %s", (email, user['id']))
-                    if cur.fetchone():
-                        return {
-                            'statusCode': 400,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Email уже используется'}),
-                            'isBase64Encoded': False
-                        }
+                user = lookup_session_user(cur, session_token, with_password_hash=True)
+                if not user:
+                    return {
+                        'statusCode': 401,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Сессия истекла'}),
+                        'isBase64Encoded': False
+                    }
+                
+                if not full_name and not email and not new_password:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Нет данных для обновления'}),
+                        'isBase64Encoded': False
+                    }
                 
+                password_hash = None
                 if new_password:
                     if not current_password:
                         return {
@@ -406,9 +929,10 @@ def update_profile(event: dict) -> dict:
                             'isBase64Encoded': False
                         }
                     
-                    cur.execute("SELECT password_hash FROM users WHERE id = %s", (user['id'],))
-                    result = cur.fetchone()
-                    if hash_password(current_password) != result['password_hash']:
+                    # Транзакция поиска сессии закрывается до PBKDF2, UPDATE идёт в новой
+                    conn.rollback()
+                    password_ok, _ = run_password_task(check_password, current_password, user['password_hash'])
+                    if not password_ok:
                         return {
                             'statusCode': 400,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -416,39 +940,34 @@ def update_profile(event: dict) -> dict:
                             'isBase64Encoded': False
                         }
                     
-                    password_hash = hash_password(new_password)
-                    cur.execute(
-                        "UPDATE users SET password_hash = %s, updated_at = NOW() WHERE id = %s",
-                        (password_hash, user['id'])
-                    )
-                
-                update_parts = []
-                params = []
+                    password_hash = run_password_task(hash_password, new_password)
                 
-                if full_name:
-                    update_parts.append("full_name = %s")
-                    params.append(full_name)
+                new_email = email if email and email != user['email'] else None
+                updated_user = user
                 
-                if email and email != user['email']:
-                    update_parts.append("email = %s")
-                    params.append(email)
-                
-                if update_parts:
-                    update_parts.append("updated_at = NOW()")
-                    params.append(user['id'])
-                    cur.execute(
-                        f"UPDATE users SET {', '.join(update_parts)} WHERE id = %s RETURNING id, email, full_name, user_type",
-                        params
-                    )
-                    updated_user = cur.fetchone()
-                else:
-                    cur.execute(
-                        "SELECT id, email, full_name, user_type FROM users WHERE id = %s",
-                        (user['id'],)
-                    )
+                if full_name or new_email or password_hash:
+                    try:
+                        cur.execute(
+                            """UPDATE users SET
+                                   full_name = COALESCE(%s, full_name),
+                                   email = COALESCE(%s, email),
+                                   password_hash = COALESCE(%s, password_hash),
+                                   updated_at = NOW()
+                               WHERE id = %s
+                               RETURNING id, email, full_name, user_type""",
+                            (full_name or None, new_email, password_hash, user['id'])
+                        )
+                    except psycopg2.errors.UniqueViolation:
+                        conn.rollback()
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': 'Email уже используется'}),
+                            'isBase64Encoded': False
+                        }
                     updated_user = cur.fetchone()
-                
-                conn.commit()
+                    conn.commit()
+                    mark_write(session_token)
                 
                 return {
                     'statusCode': 200,
@@ -466,7 +985,15 @@ def update_profile(event: dict) -> dict:
                     'isBase64Encoded': False
                 }
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    except PasswordHasherBusy:
+        return {
+            'statusCode': 503,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+            'body': json.dumps({'error': 'Сервер перегружен, повторите попытку позже'}),
+            'isBase64Encoded': False
+        }
     
     except Exception as e:
         return {
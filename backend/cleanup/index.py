@@ -0,0 +1,241 @@
+"""Фоновая пакетная очистка устаревших строк (истёкшие сессии, отозванные токены, журнал лимитов, подсказки без вакансий,
+старые оповещения, ключи идемпотентности, дочерние строки удалённых резюме), архивация истёкших вакансий
+и сопоставление новых вакансий с сохранёнными поисками"""
+import argparse
+import hmac
+import json
+import os
+import time
+import psycopg2
+
+BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', '1000'))
+PAUSE_SECONDS = float(os.environ.get('CLEANUP_PAUSE_SECONDS', '0.05'))
+MAX_SECONDS = float(os.environ.get('CLEANUP_MAX_SECONDS', '25'))
+MAINTENANCE_TOKEN = os.environ.get('MAINTENANCE_TOKEN', '')
+# Вакансия с популярным тегом даёт тысячи совпадений — пачки сопоставления меньше, чтобы транзакции оставались короткими
+SWEEP_BATCH_LIMITS = {'saved_search_alerts': int(os.environ.get('ALERT_MATCH_BATCH_SIZE', '50'))}
+
+# Каждая задача: (запрос подсчёта для dry-run, обработка одной пачки с параметром LIMIT)
+SWEEPS = {
+    'vacancy_expiry': (
+        "SELECT COUNT(*) FROM vacancies WHERE status = 'active' AND expires_at < NOW()",
+        """
+            UPDATE vacancies SET status = 'expired', updated_at = NOW()
+            WHERE id IN (
+                SELECT id FROM vacancies
+                WHERE status = 'active' AND expires_at < NOW()
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    'saved_search_alerts': (
+        "SELECT COUNT(*) FROM saved_search_queue",
+        "SELECT * FROM match_saved_searches(%s)",
+    ),
+    'saved_search_outbox': (
+        "SELECT COUNT(*) FROM saved_search_outbox WHERE created_at < NOW() - INTERVAL '30 days'",
+        """
+            DELETE FROM saved_search_outbox
+            WHERE id IN (
+                SELECT id FROM saved_search_outbox
+                WHERE created_at < NOW() - INTERVAL '30 days'
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    # Опыт, образование и навыки мягко удалённых резюме; пачка считается в резюме, а не в дочерних строках.
+    # Единственное место, где удаляются дочерние строки существующих резюме: живые резюме (в том числе не текущие,
+    # к которым delete_resume может вернуть указатель) не трогаются
+    'resume_children': (
+        "SELECT COUNT(*) FROM resumes WHERE deleted_at IS NOT NULL AND children_purged_at IS NULL",
+        """
+            WITH batch AS (
+                SELECT id FROM resumes
+                WHERE deleted_at IS NOT NULL AND children_purged_at IS NULL
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ), experience AS (
+                DELETE FROM resume_experience WHERE resume_id IN (SELECT id FROM batch)
+            ), education AS (
+                DELETE FROM resume_education WHERE resume_id IN (SELECT id FROM batch)
+            ), skills AS (
+                DELETE FROM resume_skills WHERE resume_id IN (SELECT id FROM batch)
+            )
+            UPDATE resumes SET children_purged_at = NOW() WHERE id IN (SELECT id FROM batch)
+        """,
+    ),
+    'vacancy_suggestions': (
+        "SELECT COUNT(*) FROM vacancy_suggestions WHERE frequency <= 0",
+        """
+            DELETE FROM vacancy_suggestions
+            WHERE (field, value_norm) IN (
+                SELECT field, value_norm FROM vacancy_suggestions
+                WHERE frequency <= 0
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    'user_sessions': (
+        "SELECT COUNT(*) FROM user_sessions WHERE expires_at < NOW()",
+        """
+            DELETE FROM user_sessions
+            WHERE id IN (
+                SELECT id FROM user_sessions
+                WHERE expires_at < NOW()
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    'revoked_sessions': (
+        "SELECT COUNT(*) FROM revoked_sessions WHERE expires_at < NOW()",
+        """
+            DELETE FROM revoked_sessions
+            WHERE jti IN (
+                SELECT jti FROM revoked_sessions
+                WHERE expires_at < NOW()
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    'idempotency_keys': (
+        "SELECT COUNT(*) FROM idempotency_keys WHERE created_at < NOW() - INTERVAL '1 day'",
+        """
+            DELETE FROM idempotency_keys
+            WHERE (user_id, key) IN (
+                SELECT user_id, key FROM idempotency_keys
+                WHERE created_at < NOW() - INTERVAL '1 day'
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+    'rate_limit_log': (
+        "SELECT COUNT(*) FROM rate_limit_log WHERE created_at < NOW() - INTERVAL '10 minutes'",
+        """
+            DELETE FROM rate_limit_log
+            WHERE id IN (
+                SELECT id FROM rate_limit_log
+                WHERE created_at < NOW() - INTERVAL '10 minutes'
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+        """,
+    ),
+}
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def sweep(conn, name: str, batch_size: int, pause: float, deadline: float, dry_run: bool = False) -> int:
+    """Обработка строк пачками, каждая пачка в своей короткой транзакции"""
+    count_sql, delete_sql = SWEEPS[name]
+    batch_size = min(batch_size, SWEEP_BATCH_LIMITS.get(name, batch_size))
+    with conn.cursor() as cur:
+        if dry_run:
+            cur.execute(count_sql)
+            total = cur.fetchone()[0]
+            conn.rollback()
+            return total
+
+        total = 0
+        while time.monotonic() < deadline:
+            cur.execute(delete_sql, (batch_size,))
+            deleted = cur.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+            time.sleep(pause)
+        return total
+
+def is_maintenance_call(event: dict) -> bool:
+    """Вызов по таймеру (событие без httpMethod) или HTTP-запрос с X-Maintenance-Token, равным MAINTENANCE_TOKEN;
+    пока токен не задан, HTTP-запуск закрыт"""
+    if 'httpMethod' not in event:
+        return True
+    headers = event.get('headers') or {}
+    token = headers.get('X-Maintenance-Token') or headers.get('x-maintenance-token') or ''
+    return bool(MAINTENANCE_TOKEN) and hmac.compare_digest(token.encode(), MAINTENANCE_TOKEN.encode())
+
+def run_cleanup(batch_size: int = BATCH_SIZE, pause: float = PAUSE_SECONDS,
+                max_seconds: float = MAX_SECONDS, dry_run: bool = False, names=None) -> dict:
+    """Прогон всех задач очистки в пределах бюджета времени. Каждая задача получает равную долю оставшегося времени:
+    с общим сроком задача с большим хвостом (сопоставление, архивация) съедала бы весь бюджет, и задачи в конце
+    списка (сессии, отозванные токены) не запускались бы никогда. Время, не израсходованное задачей, переходит к следующим"""
+    deadline = time.monotonic() + max_seconds
+    names = list(names or SWEEPS)
+    conn = get_db_connection()
+    try:
+        result = {}
+        for position, name in enumerate(names):
+            share = (deadline - time.monotonic()) / (len(names) - position)
+            result[name] = sweep(conn, name, batch_size, pause, time.monotonic() + share, dry_run)
+        return result
+    finally:
+        conn.close()
+
+def handler(event: dict, context) -> dict:
+    """Запуск очистки по таймеру или HTTP-запросу"""
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Maintenance-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    if not is_maintenance_call(event):
+        return {
+            'statusCode': 403,
+            'headers': headers,
+            'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    try:
+        deleted = run_cleanup()
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({'deleted': deleted}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пакетная очистка устаревших строк')
+    parser.add_argument('tables', nargs='*', help=f"задачи очистки: {', '.join(SWEEPS)} (по умолчанию все)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=PAUSE_SECONDS, help='пауза между пачками, сек')
+    parser.add_argument('--max-seconds', type=float, default=3600)
+    parser.add_argument('--dry-run', action='store_true', help='только посчитать строки к обработке')
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(SWEEPS)
+    if unknown:
+        parser.error(f"неизвестные задачи: {', '.join(sorted(unknown))}")
+    result = run_cleanup(args.batch_size, args.pause, args.max_seconds, args.dry_run, args.tables or None)
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,175 @@
+"""Обслуживание секций applications: создание секций наперёд и отсоединение старых"""
+import argparse
+import hmac
+import json
+import os
+import re
+import psycopg2
+
+PARTITION_SIZE = int(os.environ.get('APPLICATIONS_PARTITION_SIZE', '100000'))
+PARTITIONS_AHEAD = int(os.environ.get('APPLICATIONS_PARTITIONS_AHEAD', '2'))
+LOCK_TIMEOUT = os.environ.get('PARTITIONS_LOCK_TIMEOUT', '5s')
+MAINTENANCE_TOKEN = os.environ.get('MAINTENANCE_TOKEN', '')
+BOUND_RE = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def list_partitions(cur) -> list:
+    """Секции applications с границами по vacancy_id, оценкой строк и размером"""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'applications'::regclass
+    """)
+    partitions = []
+    for name, bound, rows, size in cur.fetchall():
+        match = BOUND_RE.search(bound)
+        partitions.append({
+            'name': name,
+            'from': int(match.group(1)) if match else None,
+            'to': int(match.group(2)) if match else None,
+            'rows': max(rows, 0),
+            'bytes': size,
+        })
+    return sorted(partitions, key=lambda p: (p['from'] is None, p['from'] or 0))
+
+def create_partition(cur, start: int, end: int) -> str:
+    """Новая секция [start, end); строки из DEFAULT-секции этого диапазона переносятся в неё"""
+    name = f'applications_v{start}'
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM applications_default WHERE vacancy_id >= %s AND vacancy_id < %s)",
+        (start, end)
+    )
+    if not cur.fetchone()[0]:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF applications FOR VALUES FROM ({start}) TO ({end})")
+        return name
+    
+    # ATTACH не примет диапазон, строки которого уже лежат в DEFAULT: сначала переносим их
+    cur.execute(f"CREATE TABLE {name} (LIKE applications INCLUDING DEFAULTS)")
+    cur.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK (vacancy_id >= {start} AND vacancy_id < {end})")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM applications_default WHERE vacancy_id >= %s AND vacancy_id < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (start, end))
+    cur.execute(f"ALTER TABLE applications ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})")
+    cur.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range")
+    return name
+
+def ensure_partitions(conn, ahead: int = PARTITIONS_AHEAD, size: int = PARTITION_SIZE) -> list:
+    """Секции до текущего максимума vacancies.id плюс ahead штук вперёд; возвращает созданные"""
+    created = []
+    with conn.cursor() as cur:
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        cur.execute("SELECT last_value FROM vacancies_id_seq")
+        target = (cur.fetchone()[0] // size + ahead + 1) * size
+        ranges = [p for p in list_partitions(cur) if p['from'] is not None]
+        start = max((p['to'] for p in ranges), default=0)
+        while start < target:
+            created.append(create_partition(cur, start, start + size))
+            conn.commit()
+            start += size
+    return created
+
+def detach_partitions(conn, before_vacancy_id: int, dry_run: bool = False) -> list:
+    """Отсоединение секций, целиком лежащих ниже before_vacancy_id; таблицы остаются как архив"""
+    detached = []
+    with conn.cursor() as cur:
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        for partition in list_partitions(cur):
+            if partition['to'] is None or partition['to'] > before_vacancy_id:
+                continue
+            if not dry_run:
+                cur.execute(f"ALTER TABLE applications DETACH PARTITION {partition['name']}")
+                conn.commit()
+            detached.append(partition['name'])
+    conn.rollback()
+    return detached
+
+def is_maintenance_call(event: dict) -> bool:
+    """Вызов по таймеру (событие без httpMethod) или HTTP-запрос с X-Maintenance-Token, равным MAINTENANCE_TOKEN;
+    пока токен не задан, HTTP-запуск закрыт"""
+    if 'httpMethod' not in event:
+        return True
+    headers = event.get('headers') or {}
+    token = headers.get('X-Maintenance-Token') or headers.get('x-maintenance-token') or ''
+    return bool(MAINTENANCE_TOKEN) and hmac.compare_digest(token.encode(), MAINTENANCE_TOKEN.encode())
+
+def handler(event: dict, context) -> dict:
+    """Запуск по таймеру: создание недостающих секций наперёд"""
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Maintenance-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    if not is_maintenance_call(event):
+        return {
+            'statusCode': 403,
+            'headers': headers,
+            'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    try:
+        conn = get_db_connection()
+        try:
+            created = ensure_partitions(conn)
+        finally:
+            conn.close()
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({'created': created}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Обслуживание секций applications')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='секции с границами и размерами')
+    create = commands.add_parser('create', help='создать секции наперёд')
+    create.add_argument('--ahead', type=int, default=PARTITIONS_AHEAD)
+    create.add_argument('--size', type=int, default=PARTITION_SIZE, help='вакансий в секции')
+    detach = commands.add_parser('detach', help='отсоединить старые секции')
+    detach.add_argument('--before-vacancy-id', type=int, required=True)
+    detach.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.command == 'list':
+            with conn.cursor() as cur:
+                result = list_partitions(cur)
+        elif args.command == 'create':
+            result = ensure_partitions(conn, args.ahead, args.size)
+        else:
+            result = detach_partitions(conn, args.before_vacancy_id, args.dry_run)
+    finally:
+        conn.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -1,12 +1,293 @@
 import json
 import os
-from datetime import datetime
+import base64
+import hashlib
+import hmac
+import itertools
+import re
+import time
+from functools import lru_cache
+from json.encoder import encode_basestring
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import NamedTupleCursor, RealDictCursor, execute_values
+from typing import Optional
+
+PREPARED_STATEMENTS = {
+    'user_by_session': """SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()""",
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
 
 def get_db_connection():
-    """Создание подключения к базе данных"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Подключение к базе данных, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_URLS = [
+    url for url in re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL', ''))
+    if url
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', '1'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+
+_replicas = {url: {'conn': None, 'lag': None, 'checked_at': float('-inf'), 'down_until': float('-inf')} for url in REPLICA_URLS}
+_replica_rotation = itertools.count()
+_recent_writers = {}
+
+def mark_write(user_id):
+    """Отметка о записи пользователя: следующие READ_YOUR_WRITES_SECONDS его чтения идут на primary"""
+    if not REPLICA_URLS or user_id is None:
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        for key, written_at in list(_recent_writers.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                del _recent_writers[key]
+
+def get_replica_connection(url: str):
+    """Подключение к реплике, если она доступна и отстаёт не больше REPLICA_MAX_LAG_SECONDS; иначе None"""
+    state = _replicas[url]
+    now = time.monotonic()
+    if now < state['down_until']:
+        return None
+    try:
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = psycopg2.connect(url, connect_timeout=2)
+            state['conn'].set_session(readonly=True)
+            _prepared_by_conn[id(state['conn'])] = set()
+            state['checked_at'] = float('-inf')
+        if now - state['checked_at'] >= REPLICA_CHECK_SECONDS:
+            # Догнавшая primary реплика на простое тоже имеет старый replay_timestamp, поэтому сначала сравниваем LSN
+            with state['conn'].cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+                """)
+                state['lag'] = float(cur.fetchone()[0])
+            state['conn'].rollback()
+            state['checked_at'] = now
+    except psycopg2.Error:
+        if state['conn'] is not None:
+            state['conn'].close()
+        state['down_until'] = now + REPLICA_RETRY_SECONDS
+        return None
+    return state['conn'] if state['lag'] <= REPLICA_MAX_LAG_SECONDS else None
+
+def get_read_connection(user_id=None, recently_wrote: bool = False):
+    """Подключение для чтения: реплики по кругу; primary, если реплик нет, все отстают или недоступны,
+    а также сразу после записи этого пользователя (по отметке клиента или этого инстанса)"""
+    recently_wrote = recently_wrote or \
+        time.monotonic() - _recent_writers.get(user_id, float('-inf')) <= READ_YOUR_WRITES_SECONDS
+    if REPLICA_URLS and not recently_wrote:
+        start = next(_replica_rotation)
+        for offset in range(len(REPLICA_URLS)):
+            conn = get_replica_connection(REPLICA_URLS[(start + offset) % len(REPLICA_URLS)])
+            if conn is not None:
+                return conn
+    return get_db_connection()
+
+def client_wrote_recently(event: dict) -> bool:
+    """Отметка о записи от клиента: X-Since-Last-Write — миллисекунды с его последней записи. Память инстанса
+    видит только записи, прошедшие через него, а отметка клиента работает при любом числе инстансов"""
+    headers = event.get('headers') or {}
+    value = headers.get('X-Since-Last-Write') or headers.get('x-since-last-write')
+    try:
+        return 0 <= float(value) <= READ_YOUR_WRITES_SECONDS * 1000
+    except (TypeError, ValueError):
+        return False
+
+def mark_replica_down(conn) -> bool:
+    """Сбой запроса на реплике: она пропускается REPLICA_RETRY_SECONDS, чтение повторяется на primary.
+    False — подключение не реплика, повторять негде"""
+    for state in _replicas.values():
+        if state['conn'] is conn:
+            conn.close()
+            state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+            return True
+    return False
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+# Дата и время приходят строкой из текстового протокола PostgreSQL, без разбора в datetime и обратно;
+# метка времени — в ISO 8601, как раньше отдавал isoformat()
+DATES_AS_TEXT = psycopg2.extensions.new_type((1082, 1114, 1184), 'DATES_AS_TEXT', lambda value, cur: value if value is None else value.replace(' ', 'T', 1))
+
+# Кодирование значения в JSON по OID типа колонки; остальные типы — через json.dumps(default=str)
+JSON_VALUE_ENCODERS = {
+    16: "('null' if {0} is None else 'true' if {0} else 'false')",
+    20: "('null' if {0} is None else str({0}))",
+    21: "('null' if {0} is None else str({0}))",
+    23: "('null' if {0} is None else str({0}))",
+    25: "('null' if {0} is None else escape({0}))",
+    1042: "('null' if {0} is None else escape({0}))",
+    1043: "('null' if {0} is None else escape({0}))",
+    1082: "('null' if {0} is None else escape({0}))",
+    1114: "('null' if {0} is None else escape({0}))",
+    1184: "('null' if {0} is None else escape({0}))",
+}
+
+def open_row_cursor(conn):
+    """Курсор для выдачи строк клиенту: строки — namedtuple вместо dict, даты — текстом"""
+    cur = conn.cursor(cursor_factory=NamedTupleCursor)
+    psycopg2.extensions.register_type(DATES_AS_TEXT, cur)
+    return cur
+
+@lru_cache(maxsize=None)
+def compile_row_serializer(columns: tuple):
+    """Сериализатор строки в JSON-объект для набора колонок (имя, OID): ключи закодированы заранее,
+    значения — без промежуточного dict; tail дописывается перед закрывающей скобкой"""
+    keys = ','.join(json.dumps(name, ensure_ascii=False).replace('%', '%%') + ':%s' for name, _ in columns)
+    values = ''.join(JSON_VALUE_ENCODERS.get(oid, 'dumps({0})').format(f'row[{i}]') + ', ' for i, (_, oid) in enumerate(columns))
+    source = f"def serialize(row, tail=''):\n    return TEMPLATE % ({values}tail)\n"
+    namespace = {
+        'TEMPLATE': '{' + keys + '%s}',
+        'escape': encode_basestring,
+        'dumps': lambda value: json.dumps(value, ensure_ascii=False, default=str),
+    }
+    exec(compile(source, '<row serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+def row_serializer(cur):
+    """Сериализатор для колонок последнего запроса курсора"""
+    return compile_row_serializer(tuple((column.name, column.type_code) for column in cur.description))
+
+def rows_to_json(cur, rows) -> str:
+    """JSON-массив строк результата"""
+    serialize = row_serializer(cur)
+    return '[' + ','.join(map(serialize, rows)) + ']'
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row[0] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
 
 def get_user_from_token(event: dict):
     """Получение пользователя по токену"""
@@ -16,19 +297,82 @@ def get_user_from_token(event: dict):
     if not token:
         return None
     
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """SELECT u.id, u.email, u.full_name, u.user_type
-                   FROM user_sessions s
-                   JOIN users u ON s.user_id = u.id
-                   WHERE s.session_token = %s AND s.expires_at > NOW()""",
-                (token,)
-            )
-            return cur.fetchone()
-    finally:
-        conn.close()
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection()
+    while True:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                execute_prepared(cur, 'user_by_session', (token,))
+                user = cur.fetchone()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            user = None
+        finally:
+            release_db_connection(conn)
+        if user or conn is _db_conn:
+            return user
+        conn = get_db_connection()
+
+def get_idempotency_key(event: dict) -> Optional[str]:
+    """Ключ идемпотентности из заголовка Idempotency-Key"""
+    headers = event.get('headers') or {}
+    return headers.get('Idempotency-Key') or headers.get('idempotency-key')
+
+def claim_idempotency_key(cur, user_id: int, key: str, endpoint: str, body: Optional[str]) -> Optional[dict]:
+    """Захват ключа в транзакции запроса: None — запрос новый и выполняется, иначе готовый ответ.
+    Параллельный повтор ждёт на первичном ключе, пока первый запрос не зафиксируется или не откатится"""
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key длиннее 255 символов'}),
+            'isBase64Encoded': False
+        }
+    request_hash = hashlib.sha256(f'{endpoint}\n{body or ""}'.encode()).hexdigest()
+    cur.execute("""
+        INSERT INTO idempotency_keys (user_id, key, request_hash) VALUES (%s, %s, %s)
+        ON CONFLICT (user_id, key) DO NOTHING
+        RETURNING user_id
+    """, (user_id, key, request_hash))
+    if cur.fetchone():
+        return None
+    cur.execute(
+        "SELECT request_hash, status_code, response_body FROM idempotency_keys WHERE user_id = %s AND key = %s",
+        (user_id, key)
+    )
+    saved = cur.fetchone()
+    if not saved:
+        return claim_idempotency_key(cur, user_id, key, endpoint, body)
+    if saved['request_hash'] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key уже использован для другого запроса'}),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': saved['status_code'],
+        'headers': dict(headers, **{'Idempotent-Replayed': 'true'}),
+        'body': saved['response_body'],
+        'isBase64Encoded': False
+    }
+
+def save_idempotent_response(cur, user_id: int, key: str, response: dict):
+    """Ответ сохраняется в той же транзакции, что и запись в основные таблицы"""
+    cur.execute(
+        "UPDATE idempotency_keys SET status_code = %s, response_body = %s WHERE user_id = %s AND key = %s",
+        (response['statusCode'], response['body'], user_id, key)
+    )
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
 
 def handler(event: dict, context) -> dict:
     """API для управления резюме"""
@@ -39,8 +383,8 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, Idempotency-Key, X-Since-Last-Write'
             },
             'body': '',
             'isBase64Encoded': False
@@ -57,13 +401,16 @@ def handler(event: dict, context) -> dict:
     
     try:
         if method == 'GET':
-            return get_resume(user)
+            return get_resume(user, client_wrote_recently(event))
         elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            return create_resume(user, body)
+            raw_body = event.get('body') or '{}'
+            return create_resume(user, json.loads(raw_body), get_idempotency_key(event), raw_body)
         elif method == 'PUT':
             body = json.loads(event.get('body', '{}'))
             return update_resume(user, body)
+        elif method == 'PATCH':
+            body = json.loads(event.get('body', '{}'))
+            return patch_resume(user, body)
         elif method == 'DELETE':
             body = json.loads(event.get('body', '{}'))
             return delete_resume(user, body)
@@ -83,13 +430,16 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-def get_resume(user: dict) -> dict:
+def get_resume(user: dict, recently_wrote: bool = False) -> dict:
     """Получение резюме пользователя"""
-    conn = get_db_connection()
+    conn = get_read_connection(user['id'], recently_wrote)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with open_row_cursor(conn) as cur:
+            # Текущее резюме — по указателю в users: два чтения по первичному ключу вместо сортировки резюме
             cur.execute(
-                """SELECT * FROM resumes WHERE user_id = %s ORDER BY created_at DESC LIMIT 1""",
+                """SELECT r.* FROM users u
+                   JOIN resumes r ON r.id = u.current_resume_id
+                   WHERE u.id = %s AND r.deleted_at IS NULL""",
                 (user['id'],)
             )
             resume = cur.fetchone()
@@ -102,59 +452,58 @@ def get_resume(user: dict) -> dict:
                     'isBase64Encoded': False
                 }
             
-            resume_id = resume['id']
+            serialize_resume = row_serializer(cur)
+            resume_id = resume.id
             
             cur.execute(
                 """SELECT * FROM resume_experience WHERE resume_id = %s ORDER BY start_date DESC""",
                 (resume_id,)
             )
-            experience = cur.fetchall()
+            experience = rows_to_json(cur, cur.fetchall())
             
             cur.execute(
                 """SELECT * FROM resume_education WHERE resume_id = %s ORDER BY start_date DESC""",
                 (resume_id,)
             )
-            education = cur.fetchall()
+            education = rows_to_json(cur, cur.fetchall())
             
             cur.execute(
                 """SELECT * FROM resume_skills WHERE resume_id = %s""",
                 (resume_id,)
             )
-            skills = cur.fetchall()
-            
-            resume_data = dict(resume)
-            resume_data['experience'] = [dict(exp) for exp in experience]
-            resume_data['education'] = [dict(edu) for edu in education]
-            resume_data['skills'] = [dict(skill) for skill in skills]
-            
-            for key, value in resume_data.items():
-                if isinstance(value, datetime):
-                    resume_data[key] = value.isoformat()
+            skills = rows_to_json(cur, cur.fetchall())
             
-            for exp in resume_data['experience']:
-                for key, value in exp.items():
-                    if isinstance(value, datetime):
-                        exp[key] = value.isoformat()
-            
-            for edu in resume_data['education']:
-                for key, value in edu.items():
-                    if isinstance(value, datetime):
-                        edu[key] = value.isoformat()
+            resume_data = serialize_resume(resume, f',"experience":{experience},"education":{education},"skills":{skills}')
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'resume': resume_data}),
+                'body': '{"success":true,"resume":' + resume_data + '}',
                 'isBase64Encoded': False
             }
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Реплика отказала посреди запроса: она пропускается, чтение повторяется на primary
+        if not mark_replica_down(conn):
+            raise
+        return get_resume(user, recently_wrote=True)
     finally:
-        conn.close()
+        release_db_connection(conn)
 
-def create_resume(user: dict, body: dict) -> dict:
-    """Создание нового резюме"""
+def create_resume(user: dict, body: dict, idempotency_key: Optional[str] = None, raw_body: Optional[str] = None) -> dict:
+    """Создание нового резюме; с ключом идемпотентности повтор запроса возвращает то же резюме"""
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if idempotency_key:
+                replay = claim_idempotency_key(cur, user['id'], idempotency_key, 'POST resumes', raw_body)
+                if replay:
+                    conn.rollback()
+                    return replay
+            
+            if 'full_name' not in user:
+                cur.execute("SELECT full_name, email FROM users WHERE id = %s", (user['id'],))
+                user = dict(user, **cur.fetchone())
+            
             cur.execute(
                 """INSERT INTO resumes (
                     user_id, title, full_name, email, phone, location, 
@@ -217,16 +566,22 @@ def create_resume(user: dict, body: dict) -> dict:
                     (resume_id, skill.get('skill_name'), skill.get('skill_level'))
                 )
             
-            conn.commit()
+            cur.execute("UPDATE users SET current_resume_id = %s WHERE id = %s", (resume_id, user['id']))
             
-            return {
+            response = {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'success': True, 'resume_id': resume_id}),
                 'isBase64Encoded': False
             }
+            if idempotency_key:
+                save_idempotent_response(cur, user['id'], idempotency_key, response)
+            conn.commit()
+            mark_write(user['id'])
+            
+            return response
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 def update_resume(user: dict, body: dict) -> dict:
     """Обновление резюме"""
@@ -242,7 +597,9 @@ def update_resume(user: dict, body: dict) -> dict:
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id FROM resumes WHERE id = %s AND user_id = %s", (resume_id, user['id']))
+            cur.execute(
+                "SELECT id FROM resumes WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (resume_id, user['id'])
+            )
             if not cur.fetchone():
                 return {
                     'statusCode': 403,
@@ -255,7 +612,7 @@ def update_resume(user: dict, body: dict) -> dict:
                 """UPDATE resumes SET 
                     title = %s, full_name = %s, email = %s, phone = %s, location = %s,
                     position = %s, salary_min = %s, salary_max = %s, about_me = %s,
-                    photo_url = %s, is_published = %s, updated_at = NOW()
+                    photo_url = %s, is_published = %s, version = version + 1, updated_at = NOW()
                 WHERE id = %s""",
                 (
                     body.get('title'),
@@ -317,6 +674,7 @@ def update_resume(user: dict, body: dict) -> dict:
                 )
             
             conn.commit()
+            mark_write(user['id'])
             
             return {
                 'statusCode': 200,
@@ -325,10 +683,106 @@ def update_resume(user: dict, body: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+RESUME_PATCHABLE_FIELDS = (
+    'title', 'full_name', 'email', 'phone', 'location', 'position',
+    'salary_min', 'salary_max', 'about_me', 'photo_url', 'is_published'
+)
+
+# Дочерние коллекции: (таблица, колонки); переданная коллекция заменяется целиком, остальные не трогаются
+RESUME_CHILDREN = {
+    'experience': ('resume_experience', ('company', 'position', 'start_date', 'end_date', 'is_current', 'description')),
+    'education': ('resume_education', ('institution', 'degree', 'field_of_study', 'start_date', 'end_date', 'is_current')),
+    'skills': ('resume_skills', ('skill_name', 'skill_level')),
+}
+
+@lru_cache(maxsize=256)
+def build_resume_patch(fields: tuple) -> str:
+    """UPDATE только переданных полей резюме; текст запроса кешируется по набору полей"""
+    assignments = ''.join(f'{field} = %s, ' for field in fields)
+    return f"""UPDATE resumes SET {assignments}version = version + 1, updated_at = NOW()
+        WHERE id = %s AND user_id = %s AND deleted_at IS NULL AND (%s::integer IS NULL OR version = %s::integer)
+        RETURNING version"""
+
+def patch_resume(user: dict, body: dict) -> dict:
+    """Частичное обновление резюме: только переданные поля и коллекции, с проверкой версии"""
+    resume_id = body.get('id')
+    if not resume_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'ID резюме обязателен'}),
+            'isBase64Encoded': False
+        }
+    
+    # Коллекции проверяются до UPDATE: иначе null или список не из объектов падал бы посреди замены строк
+    for key in RESUME_CHILDREN:
+        if key in body and not (isinstance(body[key], list) and all(isinstance(item, dict) for item in body[key])):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'{key}: ожидается список объектов'}),
+                'isBase64Encoded': False
+            }
+    
+    expected_version = body.get('version')
+    fields = tuple(field for field in RESUME_PATCHABLE_FIELDS if field in body)
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                build_resume_patch(fields),
+                tuple(body[field] for field in fields) + (resume_id, user['id'], expected_version, expected_version)
+            )
+            updated = cur.fetchone()
+            
+            if not updated:
+                cur.execute(
+                    "SELECT version FROM resumes WHERE id = %s AND user_id = %s AND deleted_at IS NULL",
+                    (resume_id, user['id'])
+                )
+                current = cur.fetchone()
+                if current:
+                    return {
+                        'statusCode': 409,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Резюме уже изменено, обновите данные', 'version': current['version']}),
+                        'isBase64Encoded': False
+                    }
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Нет доступа к этому резюме'}),
+                    'isBase64Encoded': False
+                }
+            
+            for key, (table, columns) in RESUME_CHILDREN.items():
+                if key not in body:
+                    continue
+                cur.execute(f"DELETE FROM {table} WHERE resume_id = %s", (resume_id,))
+                rows = [
+                    (resume_id,) + tuple(item.get(column, False if column == 'is_current' else None) for column in columns)
+                    for item in body[key]
+                ]
+                if rows:
+                    execute_values(cur, f"INSERT INTO {table} (resume_id, {', '.join(columns)}) VALUES %s", rows)
+            
+            conn.commit()
+            mark_write(user['id'])
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'version': updated['version']}),
+                'isBase64Encoded': False
+            }
+    finally:
+        release_db_connection(conn)
 
 def delete_resume(user: dict, body: dict) -> dict:
-    """Удаление резюме"""
+    """Мягкое удаление резюме: дочерние строки позже удаляет очистка, текущим становится предыдущее резюме"""
     resume_id = body.get('id')
     if not resume_id:
         return {
@@ -341,7 +795,24 @@ def delete_resume(user: dict, body: dict) -> dict:
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id FROM resumes WHERE id = %s AND user_id = %s", (resume_id, user['id']))
+            # Подзапрос указателя видит резюме до удаления, поэтому удаляемое исключается явно
+            cur.execute(
+                """WITH deleted AS (
+                    UPDATE resumes SET deleted_at = NOW(), version = version + 1, updated_at = NOW()
+                    WHERE id = %s AND user_id = %s AND deleted_at IS NULL
+                    RETURNING id
+                ), repointed AS (
+                    UPDATE users SET current_resume_id = (
+                        SELECT r.id FROM resumes r
+                        WHERE r.user_id = %s AND r.deleted_at IS NULL AND r.id NOT IN (SELECT id FROM deleted)
+                        ORDER BY r.created_at DESC, r.id DESC
+                        LIMIT 1
+                    )
+                    WHERE id = %s AND current_resume_id IN (SELECT id FROM deleted)
+                )
+                SELECT id FROM deleted""",
+                (resume_id, user['id'], user['id'], user['id'])
+            )
             if not cur.fetchone():
                 return {
                     'statusCode': 403,
@@ -350,8 +821,8 @@ def delete_resume(user: dict, body: dict) -> dict:
                     'isBase64Encoded': False
                 }
             
-            cur.execute("UPDATE resumes SET updated_at = NOW() WHERE id = %s", (resume_id,))
             conn.commit()
+            mark_write(user['id'])
             
             return {
                 'statusCode': 200,
@@ -360,4 +831,4 @@ def delete_resume(user: dict, body: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
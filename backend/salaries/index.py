@@ -0,0 +1,157 @@
+"""API аналитики зарплат по должности, городу и типу занятости"""
+import hmac
+import json
+import os
+import re
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+PERCENTILES = ('p10', 'p25', 'p50', 'p75', 'p90')
+REFRESH_MIN_INTERVAL_SECONDS = int(os.environ.get('SALARY_STATS_MIN_REFRESH_SECONDS', '3600'))
+REFRESH_LOCK_ID = 33001
+MAINTENANCE_TOKEN = os.environ.get('MAINTENANCE_TOKEN', '')
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+
+def normalize(value: str) -> str:
+    """Та же нормализация, что и в salary_stats: нижний регистр, схлопнутые пробелы"""
+    return re.sub(r'\s+', ' ', (value or '').strip()).lower()
+
+def is_maintenance_call(event: dict) -> bool:
+    """Вызов по таймеру (событие без httpMethod) или HTTP-запрос с X-Maintenance-Token, равным MAINTENANCE_TOKEN;
+    пока токен не задан, HTTP-запуск закрыт"""
+    if 'httpMethod' not in event:
+        return True
+    headers = event.get('headers') or {}
+    token = headers.get('X-Maintenance-Token') or headers.get('x-maintenance-token') or ''
+    return bool(MAINTENANCE_TOKEN) and hmac.compare_digest(token.encode(), MAINTENANCE_TOKEN.encode())
+
+def refresh_salary_stats(force: bool = False) -> dict:
+    """REFRESH MATERIALIZED VIEW CONCURRENTLY, не чаще REFRESH_MIN_INTERVAL_SECONDS"""
+    conn = get_db_connection()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (REFRESH_LOCK_ID,))
+            if not cur.fetchone()['locked']:
+                return {'refreshed': False, 'reason': 'already_running'}
+            try:
+                cur.execute(
+                    """SELECT EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - refreshed_at) AS age
+                       FROM salary_stats LIMIT 1"""
+                )
+                row = cur.fetchone()
+                if not force and row and row['age'] < REFRESH_MIN_INTERVAL_SECONDS:
+                    return {'refreshed': False, 'reason': 'fresh', 'age_seconds': int(row['age'])}
+                cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY salary_stats")
+                return {'refreshed': True}
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (REFRESH_LOCK_ID,))
+    finally:
+        conn.close()
+
+def handler(event: dict, context) -> dict:
+    """API endpoint для аналитики зарплат"""
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Maintenance-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    try:
+        if method == 'POST':
+            if not is_maintenance_call(event):
+                return {
+                    'statusCode': 403,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(refresh_salary_stats(), ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+
+        if method != 'GET':
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+
+        params = event.get('queryStringParameters') or {}
+        title = normalize(params.get('title'))
+        if not title:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Укажите должность'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+
+        # NULL — агрегат по всем значениям; уровень агрегата однозначно задаёт, какие поля свёрнуты
+        location = normalize(params.get('location')) or None
+        employment_type = params.get('employment_type') or None
+        grouping_level = (2 if location is None else 0) | (1 if employment_type is None else 0)
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT source, samples, percentiles, salary_min, salary_max, refreshed_at
+                    FROM salary_stats
+                    WHERE title_norm = %s AND grouping_level = %s
+                      AND location_norm IS NOT DISTINCT FROM %s AND employment_type IS NOT DISTINCT FROM %s
+                """, (title, grouping_level, location, employment_type))
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+
+        result = {
+            'title': title,
+            'location': location,
+            'employment_type': employment_type,
+            'refreshed_at': rows[0]['refreshed_at'].isoformat() if rows else None,
+        }
+        for row in rows:
+            result[row['source']] = {
+                'samples': row['samples'],
+                'min': float(row['salary_min']),
+                'max': float(row['salary_max']),
+                **{name: round(value) for name, value in zip(PERCENTILES, row['percentiles'])},
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(result, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
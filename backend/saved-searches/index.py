@@ -0,0 +1,528 @@
+"""API сохранённых поисков и оповещений о новых подходящих вакансиях"""
+import json
+import os
+import base64
+import hashlib
+import hmac
+import itertools
+import re
+import time
+from functools import lru_cache
+from json.encoder import encode_basestring
+import psycopg2
+from psycopg2.extras import NamedTupleCursor, RealDictCursor
+from typing import Optional
+
+PREPARED_STATEMENTS = {
+    'user_by_session': """
+        SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """,
+    'saved_searches_by_user': """
+        SELECT id, name, tags, location, place_id, salary_min, salary_max, created_at
+        FROM saved_searches
+        WHERE user_id = %s
+        ORDER BY created_at DESC
+    """,
+    'alerts_by_user': """
+        SELECT o.id as alert_id, o.search_id, o.created_at as matched_at, o.sent_at,
+               v.id, v.title, v.company, v.location, v.salary_min, v.salary_max, v.tags, v.created_at
+        FROM saved_search_outbox o
+        JOIN saved_searches s ON o.search_id = s.id
+        JOIN vacancies v ON o.vacancy_id = v.id
+        WHERE o.user_id = %s
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT %s
+    """,
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+MAX_SAVED_SEARCHES = 20
+MAX_SEARCH_TAGS = 10
+ALERTS_LIMIT = 100
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
+
+def get_db_connection():
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        dsn = os.environ.get('DATABASE_URL')
+        conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_URLS = [
+    url for url in re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL', ''))
+    if url
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', '1'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+
+_replicas = {url: {'conn': None, 'lag': None, 'checked_at': float('-inf'), 'down_until': float('-inf')} for url in REPLICA_URLS}
+_replica_rotation = itertools.count()
+_recent_writers = {}
+
+def mark_write(user_id):
+    """Отметка о записи пользователя: следующие READ_YOUR_WRITES_SECONDS его чтения идут на primary"""
+    if not REPLICA_URLS or user_id is None:
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        for key, written_at in list(_recent_writers.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                del _recent_writers[key]
+
+def get_replica_connection(url: str):
+    """Подключение к реплике, если она доступна и отстаёт не больше REPLICA_MAX_LAG_SECONDS; иначе None"""
+    state = _replicas[url]
+    now = time.monotonic()
+    if now < state['down_until']:
+        return None
+    try:
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = psycopg2.connect(url, connect_timeout=2, cursor_factory=RealDictCursor)
+            state['conn'].set_session(readonly=True)
+            _prepared_by_conn[id(state['conn'])] = set()
+            state['checked_at'] = float('-inf')
+        if now - state['checked_at'] >= REPLICA_CHECK_SECONDS:
+            # Догнавшая primary реплика на простое тоже имеет старый replay_timestamp, поэтому сначала сравниваем LSN
+            with state['conn'].cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+                """)
+                state['lag'] = float(cur.fetchone()[0])
+            state['conn'].rollback()
+            state['checked_at'] = now
+    except psycopg2.Error:
+        if state['conn'] is not None:
+            state['conn'].close()
+        state['down_until'] = now + REPLICA_RETRY_SECONDS
+        return None
+    return state['conn'] if state['lag'] <= REPLICA_MAX_LAG_SECONDS else None
+
+def get_read_connection(user_id=None, recently_wrote: bool = False):
+    """Подключение для чтения: реплики по кругу; primary, если реплик нет, все отстают или недоступны,
+    а также сразу после записи этого пользователя (по отметке клиента или этого инстанса)"""
+    recently_wrote = recently_wrote or \
+        time.monotonic() - _recent_writers.get(user_id, float('-inf')) <= READ_YOUR_WRITES_SECONDS
+    if REPLICA_URLS and not recently_wrote:
+        start = next(_replica_rotation)
+        for offset in range(len(REPLICA_URLS)):
+            conn = get_replica_connection(REPLICA_URLS[(start + offset) % len(REPLICA_URLS)])
+            if conn is not None:
+                return conn
+    return get_db_connection()
+
+def client_wrote_recently(event: dict) -> bool:
+    """Отметка о записи от клиента: X-Since-Last-Write — миллисекунды с его последней записи. Память инстанса
+    видит только записи, прошедшие через него, а отметка клиента работает при любом числе инстансов"""
+    headers = event.get('headers') or {}
+    value = headers.get('X-Since-Last-Write') or headers.get('x-since-last-write')
+    try:
+        return 0 <= float(value) <= READ_YOUR_WRITES_SECONDS * 1000
+    except (TypeError, ValueError):
+        return False
+
+def mark_replica_down(conn) -> bool:
+    """Сбой запроса на реплике: она пропускается REPLICA_RETRY_SECONDS, чтение повторяется на primary.
+    False — подключение не реплика, повторять негде"""
+    for state in _replicas.values():
+        if state['conn'] is conn:
+            conn.close()
+            state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+            return True
+    return False
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+# Дата и время приходят строкой из текстового протокола PostgreSQL, без разбора в datetime и обратно
+DATES_AS_TEXT = psycopg2.extensions.new_type((1082, 1114, 1184), 'DATES_AS_TEXT', lambda value, cur: value)
+
+# Кодирование значения в JSON по OID типа колонки; остальные типы — через json.dumps(default=str)
+JSON_VALUE_ENCODERS = {
+    16: "('null' if {0} is None else 'true' if {0} else 'false')",
+    20: "('null' if {0} is None else str({0}))",
+    21: "('null' if {0} is None else str({0}))",
+    23: "('null' if {0} is None else str({0}))",
+    25: "('null' if {0} is None else escape({0}))",
+    1042: "('null' if {0} is None else escape({0}))",
+    1043: "('null' if {0} is None else escape({0}))",
+    1082: "('null' if {0} is None else escape({0}))",
+    1114: "('null' if {0} is None else escape({0}))",
+    1184: "('null' if {0} is None else escape({0}))",
+}
+
+def open_row_cursor(conn):
+    """Курсор для выдачи строк клиенту: строки — namedtuple вместо dict, даты — текстом"""
+    cur = conn.cursor(cursor_factory=NamedTupleCursor)
+    psycopg2.extensions.register_type(DATES_AS_TEXT, cur)
+    return cur
+
+@lru_cache(maxsize=None)
+def compile_row_serializer(columns: tuple):
+    """Сериализатор строки в JSON-объект для набора колонок (имя, OID): ключи закодированы заранее,
+    значения — без промежуточного dict; tail дописывается перед закрывающей скобкой"""
+    keys = ','.join(json.dumps(name, ensure_ascii=False).replace('%', '%%') + ':%s' for name, _ in columns)
+    values = ''.join(JSON_VALUE_ENCODERS.get(oid, 'dumps({0})').format(f'row[{i}]') + ', ' for i, (_, oid) in enumerate(columns))
+    source = f"def serialize(row, tail=''):\n    return TEMPLATE % ({values}tail)\n"
+    namespace = {
+        'TEMPLATE': '{' + keys + '%s}',
+        'escape': encode_basestring,
+        'dumps': lambda value: json.dumps(value, ensure_ascii=False, default=str),
+    }
+    exec(compile(source, '<row serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+def row_serializer(cur):
+    """Сериализатор для колонок последнего запроса курсора"""
+    return compile_row_serializer(tuple((column.name, column.type_code) for column in cur.description))
+
+def rows_to_json(cur, rows) -> str:
+    """JSON-массив строк результата"""
+    serialize = row_serializer(cur)
+    return '[' + ','.join(map(serialize, rows)) + ']'
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row['jti'] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
+
+def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
+    """Получение пользователя по токену сессии"""
+    if not session_token:
+        return None
+    
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection()
+    while True:
+        try:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'user_by_session', (session_token,))
+                user = cur.fetchone()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            user = None
+        finally:
+            release_db_connection(conn)
+        if user or conn is _db_conn:
+            return user
+        conn = get_db_connection()
+
+def parse_search(data: dict):
+    """Условия поиска из тела запроса: (поля, None) или (None, текст ошибки)"""
+    tags = data.get('tags') or []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return None, 'tags должен быть списком строк'
+    tags = sorted({tag.strip().lower() for tag in tags if tag.strip()})
+    location = (data.get('location') or '').strip() or None
+    if not tags and not location:
+        return None, 'Укажите хотя бы теги или город'
+    if len(tags) > MAX_SEARCH_TAGS:
+        return None, f'Не больше {MAX_SEARCH_TAGS} тегов'
+    salaries = []
+    for key in ('salary_min', 'salary_max'):
+        value = data.get(key)
+        if value in (None, ''):
+            salaries.append(None)
+            continue
+        try:
+            salaries.append(int(value))
+        except (TypeError, ValueError):
+            return None, f'{key} должен быть числом'
+    name = (data.get('name') or '').strip()[:255] or None
+    return (name, tags, location, *salaries), None
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
+
+def parse_int_param(params: dict, name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    """Целый параметр запроса в пределах [low, high]; ValueError с текстом для ответа 400"""
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name}: ожидается целое число')
+    if not low <= number <= high:
+        raise ValueError(f'{name}: от {low} до {high}')
+    return number
+
+def handler(event: dict, context) -> dict:
+    """API endpoint сохранённых поисков: GET — список (?alerts=1 — найденные вакансии), POST — создать, DELETE ?id= — удалить"""
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token, X-Since-Last-Write',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    
+    session_token = event.get('headers', {}).get('X-Session-Token') or event.get('headers', {}).get('x-session-token')
+    user = get_user_from_session(session_token)
+    
+    if not user:
+        return {
+            'statusCode': 401,
+            'headers': headers,
+            'body': json.dumps({'error': 'Требуется авторизация'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    conn = get_read_connection(user['id'], client_wrote_recently(event)) if method == 'GET' else get_db_connection()
+    try:
+        with (open_row_cursor(conn) if method == 'GET' else conn.cursor()) as cur:
+            if method == 'GET':
+                params = event.get('queryStringParameters') or {}
+                if params.get('alerts'):
+                    execute_prepared(cur, 'alerts_by_user', (user['id'], ALERTS_LIMIT))
+                else:
+                    execute_prepared(cur, 'saved_searches_by_user', (user['id'],))
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': rows_to_json(cur, cur.fetchall()),
+                    'isBase64Encoded': False
+                }
+            
+            elif method == 'POST':
+                search, error = parse_search(json.loads(event.get('body') or '{}'))
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': error}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                # Лимит на пользователя: блокировка строки пользователя сериализует параллельные создания
+                cur.execute("SELECT id FROM users WHERE id = %s FOR UPDATE", (user['id'],))
+                cur.execute("SELECT COUNT(*) AS total FROM saved_searches WHERE user_id = %s", (user['id'],))
+                if cur.fetchone()['total'] >= MAX_SAVED_SEARCHES:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': f'Не больше {MAX_SAVED_SEARCHES} сохранённых поисков'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                name, tags, location, salary_min, salary_max = search
+                cur.execute("""
+                    INSERT INTO saved_searches (user_id, name, tags, location, place_id, salary_min, salary_max)
+                    VALUES (%s, %s, %s, %s, (SELECT place_id FROM geocode_place(%s)), %s, %s)
+                    RETURNING id
+                """, (user['id'], name, tags, location, location, salary_min, salary_max))
+                
+                search_id = cur.fetchone()['id']
+                conn.commit()
+                mark_write(user['id'])
+                
+                return {
+                    'statusCode': 201,
+                    'headers': headers,
+                    'body': json.dumps({'id': search_id, 'message': 'Поиск сохранён'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            elif method == 'DELETE':
+                params = event.get('queryStringParameters') or {}
+                try:
+                    search_id = parse_int_param(params, 'id', None, 1, 2 ** 31 - 1)
+                    if search_id is None:
+                        raise ValueError('id: обязательный параметр')
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                cur.execute("""
+                    DELETE FROM saved_searches
+                    WHERE id = %s AND user_id = %s
+                """, (search_id, user['id']))
+                
+                if cur.rowcount == 0:
+                    conn.rollback()
+                    return {
+                        'statusCode': 404,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Поиск не найден'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                conn.commit()
+                mark_write(user['id'])
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'message': 'Поиск удалён'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            else:
+                return {
+                    'statusCode': 405,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+    
+    except Exception as e:
+        if method == 'GET' and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) \
+                and mark_replica_down(conn):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            return handler(dict(event, headers=dict(event.get('headers') or {}, **{'X-Since-Last-Write': '0'})), context)
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    finally:
+        release_db_connection(conn)
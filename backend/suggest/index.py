@@ -0,0 +1,137 @@
+"""API подсказок для строк поиска вакансий: название, компания, город, тег"""
+import json
+import os
+import re
+import psycopg2
+
+FIELDS = ('title', 'company', 'location', 'tag')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+MAX_QUERY_LENGTH = 100
+# С этой длины добираем совпадения в середине строки по триграммам
+MIN_INFIX_LENGTH = 3
+
+# Запросы не подготавливаются: по конкретному значению планировщик выбирает между диапазоном
+# первичного ключа, обходом индекса частот и триграммами — общий план подходил бы только одному случаю
+SUGGEST_PREFIX = """
+    SELECT value, frequency
+    FROM vacancy_suggestions
+    WHERE field = %(field)s AND value_norm >= lower(%(query)s) AND value_norm < lower(%(query)s) || chr(1114111)
+      AND frequency > 0
+    ORDER BY frequency DESC, value_norm
+    LIMIT %(limit)s
+"""
+
+SUGGEST_INFIX = """
+    SELECT value, frequency
+    FROM vacancy_suggestions
+    WHERE field = %(field)s AND value_norm LIKE '%%' || lower(%(pattern)s) || '%%'
+      AND NOT starts_with(value_norm, lower(%(query)s)) AND frequency > 0
+    ORDER BY frequency DESC, value_norm
+    LIMIT %(limit)s
+"""
+
+_db_conn = None
+
+def get_db_connection():
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        _db_conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+        _db_conn.autocommit = True
+    return _db_conn
+
+def escape_like(value: str) -> str:
+    """Экранирование спецсимволов LIKE"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def suggest(field: str, query: str, limit: int = DEFAULT_LIMIT) -> list:
+    """Подсказки по частоте среди активных вакансий: сначала по префиксу, затем совпадения в середине строки"""
+    conn = get_db_connection()
+    params = {'field': field, 'query': query, 'pattern': escape_like(query), 'limit': limit}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SUGGEST_PREFIX, params)
+            rows = cur.fetchall()
+            if len(rows) < limit and len(query) >= MIN_INFIX_LENGTH:
+                cur.execute(SUGGEST_INFIX, dict(params, limit=limit - len(rows)))
+                rows += cur.fetchall()
+    except psycopg2.Error:
+        conn.close()
+        raise
+    return [{'value': value, 'count': frequency} for value, frequency in rows]
+
+def handler(event: dict, context) -> dict:
+    """API endpoint подсказок: GET ?field=title&q=разр&limit=10"""
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    field = params.get('field', 'title')
+    query = re.sub(r'\s+', ' ', params.get('q') or '').strip()[:MAX_QUERY_LENGTH]
+
+    if field not in FIELDS:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'Поле подсказок: {", ".join(FIELDS)}'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    if not query:
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': '[]',
+            'isBase64Encoded': False
+        }
+
+    try:
+        limit = min(max(int(params.get('limit') or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'limit должен быть числом'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+    try:
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(suggest(field, query, limit), ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,551 @@
+"""Массовый импорт, синхронизация по external_id и экспорт вакансий работодателя (NDJSON/CSV) через COPY"""
+import argparse
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import sys
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from typing import Optional
+
+PREPARED_STATEMENTS = {
+    'user_by_session': """
+        SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """,
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session',)
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
+
+def get_db_connection():
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        dsn = os.environ.get('DATABASE_URL')
+        conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row['jti'] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
+
+def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
+    """Получение пользователя по токену сессии"""
+    if not session_token:
+        return None
+    
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'user_by_session', (session_token,))
+            return cur.fetchone()
+    finally:
+        release_db_connection(conn)
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
+
+FIELDS = (
+    'title', 'company', 'location', 'salary_min', 'salary_max',
+    'employment_type', 'experience', 'description', 'requirements', 'tags'
+)
+SYNC_FIELDS = FIELDS + ('status',)
+STAGING_COLUMNS = ('line_no', 'external_id', 'content_hash') + SYNC_FIELDS
+MAX_LENGTHS = {'title': 255, 'company': 255, 'location': 255, 'employment_type': 50, 'experience': 50}
+STATUSES = ('active', 'closed')
+COPY_CHUNK_ROWS = int(os.environ.get('BULK_COPY_CHUNK_ROWS', '5000'))
+MAX_IMPORT_ROWS = int(os.environ.get('BULK_MAX_IMPORT_ROWS', '20000'))
+MAX_REPORTED_ERRORS = int(os.environ.get('BULK_MAX_REPORTED_ERRORS', '100'))
+EXPORT_FETCH_SIZE = 2000
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+# Вакансия, которую синхронизация снова делает активной (закрытая или уже истёкшая), получает новый срок
+# публикации, как и при PUT/PATCH в backend/vacancies; более поздний срок не сокращается
+REACTIVATED_EXPIRES_AT = """CASE
+    WHEN EXCLUDED.status = 'active' AND (vacancies.status <> 'active' OR vacancies.expires_at <= NOW())
+    THEN GREATEST(vacancies.expires_at, NOW() + INTERVAL '30 days')
+    ELSE vacancies.expires_at
+END"""
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+class ImportLimitExceeded(Exception):
+    """В запросе больше строк, чем MAX_IMPORT_ROWS"""
+
+def iter_records(lines, fmt: str):
+    """Построчный разбор входа: (номер строки, словарь полей или текст ошибки)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, 'Некорректный JSON'
+            continue
+        yield line_no, record if isinstance(record, dict) else 'Ожидается JSON-объект'
+
+def parse_int(value, field: str):
+    """Целое в диапазоне INTEGER: значение вне его отклоняется строкой, а не ошибкой всего COPY"""
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field}: ожидается целое число')
+    if not INT_MIN <= number <= INT_MAX:
+        raise ValueError(f'{field}: вне диапазона от {INT_MIN} до {INT_MAX}')
+    return number
+
+def validate_record(record: dict) -> tuple:
+    """Проверка одной вакансии; возвращает значения в порядке FIELDS"""
+    values = {field: None if record.get(field) in ('', None) else record.get(field) for field in FIELDS}
+    for field in ('title', 'company'):
+        if not isinstance(values[field], str) or not values[field].strip():
+            raise ValueError(f'{field}: обязательное поле')
+    for field, limit in MAX_LENGTHS.items():
+        if values[field] is not None and len(str(values[field])) > limit:
+            raise ValueError(f'{field}: длиннее {limit} символов')
+    # Символ NUL не допускается в TEXT и JSONB: такая строка сорвала бы COPY всей пачки
+    for field in FIELDS:
+        if isinstance(values[field], str) and '\x00' in values[field]:
+            raise ValueError(f'{field}: содержит символ NUL')
+    
+    values['salary_min'] = parse_int(values['salary_min'], 'salary_min')
+    values['salary_max'] = parse_int(values['salary_max'], 'salary_max')
+    if values['salary_min'] is not None and values['salary_max'] is not None \
+            and values['salary_min'] > values['salary_max']:
+        raise ValueError('salary_min больше salary_max')
+    
+    tags = values['tags'] or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(';') if tag.strip()]
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError('tags: ожидается список строк')
+    if any('\x00' in tag for tag in tags):
+        raise ValueError('tags: содержит символ NUL')
+    values['tags'] = json.dumps(tags, ensure_ascii=False)
+    return tuple(values[field] for field in FIELDS)
+
+def validate_sync_record(record: dict) -> tuple:
+    """Проверка вакансии для синхронизации: поля, external_id и статус; хеш считается по нормализованным значениям"""
+    external_id = str(record.get('external_id') or '').strip()
+    if not external_id:
+        raise ValueError('external_id: обязательное поле')
+    if len(external_id) > 100:
+        raise ValueError('external_id: длиннее 100 символов')
+    if '\x00' in external_id:
+        raise ValueError('external_id: содержит символ NUL')
+    status = record.get('status') or 'active'
+    if status not in STATUSES:
+        raise ValueError(f"status: одно из {', '.join(STATUSES)}")
+    
+    values = validate_record(record) + (status,)
+    content_hash = hashlib.sha256(json.dumps(values, ensure_ascii=False).encode()).hexdigest()
+    return (external_id, content_hash) + values
+
+def copy_chunk(cur, buffer: io.StringIO):
+    """Загрузка накопленной пачки в staging-таблицу одним COPY"""
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY vacancy_import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def load_staging(conn, lines, fmt: str, sync: bool = False,
+                 max_rows: Optional[int] = None, chunk_rows: int = COPY_CHUNK_ROWS) -> dict:
+    """Потоковая проверка строк и COPY пачками во временную staging-таблицу текущей транзакции"""
+    errors = []
+    rejected = 0
+    accepted = 0
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE vacancy_import_staging (
+                line_no INTEGER, external_id TEXT, content_hash TEXT,
+                title TEXT, company TEXT, location TEXT,
+                salary_min INTEGER, salary_max INTEGER, employment_type TEXT, experience TEXT,
+                description TEXT, requirements TEXT, tags JSONB, status TEXT
+            ) ON COMMIT DROP
+        """)
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        pending = 0
+        for line_no, record in iter_records(lines, fmt):
+            if max_rows is not None and accepted + rejected >= max_rows:
+                conn.rollback()
+                raise ImportLimitExceeded(f'Не больше {max_rows} строк за один запрос')
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                row = validate_sync_record(record) if sync else (None, None) + validate_record(record) + ('active',)
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_no, 'error': str(e)})
+                continue
+            
+            # В CSV-формате COPY пустое поле без кавычек — NULL, поэтому None пишем как есть
+            writer.writerow((line_no,) + row)
+            accepted += 1
+            pending += 1
+            if pending >= chunk_rows:
+                copy_chunk(cur, buffer)
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            copy_chunk(cur, buffer)
+    
+    return {'accepted': accepted, 'rejected': rejected, 'errors': errors}
+
+def import_vacancies(conn, employer_id: int, lines, fmt: str = 'ndjson',
+                     max_rows: Optional[int] = None, chunk_rows: int = COPY_CHUNK_ROWS) -> dict:
+    """Потоковая проверка строк, COPY пачками в staging и одна вставка в vacancies"""
+    staged = load_staging(conn, lines, fmt, max_rows=max_rows, chunk_rows=chunk_rows)
+    with conn.cursor() as cur:
+        if staged['accepted']:
+            cur.execute(f"""
+                INSERT INTO vacancies (employer_id, {', '.join(FIELDS)})
+                SELECT %s, {', '.join(FIELDS[:-1])}, ARRAY(SELECT jsonb_array_elements_text(tags))
+                FROM vacancy_import_staging
+                ORDER BY line_no
+            """, (employer_id,))
+        conn.commit()
+    
+    return {'imported': staged['accepted'], 'rejected': staged['rejected'], 'errors': staged['errors']}
+
+def sync_vacancies(conn, employer_id: int, lines, fmt: str = 'ndjson',
+                   max_rows: Optional[int] = None, chunk_rows: int = COPY_CHUNK_ROWS) -> dict:
+    """Идемпотентная синхронизация по external_id: один upsert на пачку, строки с тем же хешем не трогаются"""
+    staged = load_staging(conn, lines, fmt, sync=True, max_rows=max_rows, chunk_rows=chunk_rows)
+    created = updated = distinct = 0
+    with conn.cursor() as cur:
+        if staged['accepted']:
+            cur.execute("SELECT COUNT(DISTINCT external_id) AS distinct FROM vacancy_import_staging")
+            distinct = cur.fetchone()['distinct']
+            # Неизменённые строки отсекаются до upsert, чтобы не брать на них блокировку и не писать WAL;
+            # при повторе external_id в одной пачке побеждает последняя строка
+            cur.execute(f"""
+                INSERT INTO vacancies (employer_id, external_id, content_hash, {', '.join(SYNC_FIELDS)})
+                SELECT %(employer_id)s, s.external_id, s.content_hash, {', '.join('s.' + f for f in FIELDS[:-1])},
+                       ARRAY(SELECT jsonb_array_elements_text(s.tags)), s.status
+                FROM (
+                    SELECT DISTINCT ON (external_id) * FROM vacancy_import_staging
+                    ORDER BY external_id, line_no DESC
+                ) s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM vacancies v
+                    WHERE v.employer_id = %(employer_id)s
+                      AND v.external_id = s.external_id
+                      AND v.content_hash = s.content_hash
+                      AND v.status = s.status
+                )
+                ON CONFLICT (employer_id, external_id) DO UPDATE SET
+                    {', '.join(f'{f} = EXCLUDED.{f}' for f in SYNC_FIELDS)},
+                    content_hash = EXCLUDED.content_hash,
+                    expires_at = {REACTIVATED_EXPIRES_AT},
+                    version = vacancies.version + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE vacancies.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                   OR vacancies.status IS DISTINCT FROM EXCLUDED.status
+                RETURNING (xmax = 0) AS created
+            """, {'employer_id': employer_id})
+            for row in cur.fetchall():
+                if row['created']:
+                    created += 1
+                else:
+                    updated += 1
+        conn.commit()
+    
+    return {
+        'created': created,
+        'updated': updated,
+        'unchanged': distinct - created - updated,
+        'rejected': staged['rejected'],
+        'errors': staged['errors']
+    }
+
+def export_vacancies(conn, employer_id: int, out, fmt: str = 'ndjson') -> None:
+    """Потоковая выгрузка вакансий работодателя в out без загрузки всех строк в память"""
+    with conn.cursor() as cur:
+        if fmt == 'csv':
+            query = cur.mogrify(f"""
+                SELECT id, external_id, {', '.join(FIELDS[:-1])}, array_to_string(tags, ';') AS tags, status, created_at
+                FROM vacancies WHERE employer_id = %s ORDER BY id
+            """, (employer_id,)).decode()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+            return
+    
+    with conn.cursor(name='vacancy_export') as cur:
+        cur.itersize = EXPORT_FETCH_SIZE
+        cur.execute(f"""
+            SELECT row_to_json(v)::text AS line FROM (
+                SELECT id, external_id, {', '.join(FIELDS)}, status, created_at
+                FROM vacancies WHERE employer_id = %s ORDER BY id
+            ) v
+        """, (employer_id,))
+        for row in cur:
+            out.write(row['line'])
+            out.write('\n')
+
+def get_format(event: dict) -> str:
+    """Формат из ?format=, иначе по Content-Type; по умолчанию NDJSON"""
+    params = event.get('queryStringParameters') or {}
+    if params.get('format') in CONTENT_TYPES:
+        return params['format']
+    headers = event.get('headers') or {}
+    content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+    return 'csv' if 'csv' in content_type else 'ndjson'
+
+def handler(event: dict, context) -> dict:
+    """API endpoint для массового импорта (POST), синхронизации (PUT) и экспорта (GET) вакансий"""
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    
+    try:
+        session_token = event.get('headers', {}).get('X-Session-Token') or event.get('headers', {}).get('x-session-token')
+        user = get_user_from_session(session_token)
+        
+        if not user or user['user_type'] != 'employer':
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        fmt = get_format(event)
+        
+        if method == 'GET':
+            # Ответ функции отдаётся платформе целиком, поэтому здесь тело собирается в памяти;
+            # потоковый экспорт без этого ограничения — только в CLI (python index.py export)
+            out = io.StringIO()
+            conn = get_db_connection()
+            try:
+                export_vacancies(conn, user['id'], out, fmt)
+            finally:
+                release_db_connection(conn)
+            return {
+                'statusCode': 200,
+                'headers': {**headers, 'Content-Type': CONTENT_TYPES[fmt]},
+                'body': out.getvalue(),
+                'isBase64Encoded': False
+            }
+        
+        if method not in ('POST', 'PUT'):
+            return {
+                'statusCode': 405,
+                'headers': headers,
+                'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        
+        conn = get_db_connection()
+        try:
+            load = sync_vacancies if method == 'PUT' else import_vacancies
+            result = load(conn, user['id'], io.StringIO(body), fmt, max_rows=MAX_IMPORT_ROWS)
+        except ImportLimitExceeded as e:
+            return {
+                'statusCode': 413,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        finally:
+            release_db_connection(conn)
+        
+        accepted = sum(result.get(key, 0) for key in ('imported', 'created', 'updated', 'unchanged'))
+        return {
+            'statusCode': 400 if result['rejected'] and not accepted else 200,
+            'headers': headers,
+            'body': json.dumps(result, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Массовый импорт, синхронизация и экспорт вакансий')
+    parser.add_argument('command', choices=('import', 'sync', 'export'))
+    parser.add_argument('path', nargs='?', default='-', help='файл NDJSON/CSV, по умолчанию stdin/stdout')
+    parser.add_argument('--employer-id', type=int, required=True)
+    parser.add_argument('--format', choices=tuple(CONTENT_TYPES), help='по умолчанию по расширению файла, иначе ndjson')
+    parser.add_argument('--chunk-rows', type=int, default=COPY_CHUNK_ROWS)
+    args = parser.parse_args()
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'ndjson')
+    
+    conn = get_db_connection()
+    if args.command in ('import', 'sync'):
+        load = sync_vacancies if args.command == 'sync' else import_vacancies
+        with (sys.stdin if args.path == '-' else open(args.path, encoding='utf-8', newline='')) as source:
+            result = load(conn, args.employer_id, source, fmt, chunk_rows=args.chunk_rows)
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        with (sys.stdout if args.path == '-' else open(args.path, 'w', encoding='utf-8', newline='')) as target:
+            export_vacancies(conn, args.employer_id, target, fmt)
+        release_db_connection(conn)
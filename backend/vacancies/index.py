@@ -1,32 +1,645 @@
 """API для управления вакансиями"""
 import json
 import os
+import base64
+import hashlib
+import hmac
+import itertools
+import math
+import re
+import sys
+import time
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from json.encoder import encode_basestring
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import NamedTupleCursor, RealDictCursor
 from typing import Optional
 
+PREPARED_STATEMENTS = {
+    'user_by_session': """
+        SELECT u.id, u.email, u.full_name, u.user_type
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """,
+    'vacancy_detail': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancies v
+        JOIN users u ON v.employer_id = u.id
+        WHERE v.id = %s
+    """,
+    'vacancy_list': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancies v
+        JOIN users u ON v.employer_id = u.id
+        WHERE v.status = %s
+        ORDER BY v.created_at DESC
+    """,
+    'vacancy_list_active': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancies v
+        JOIN users u ON v.employer_id = u.id
+        WHERE v.status = 'active' AND (v.expires_at IS NULL OR v.expires_at > NOW())
+        ORDER BY v.created_at DESC
+    """,
+    'vacancy_list_active_by_employer': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancies v
+        JOIN users u ON v.employer_id = u.id
+        WHERE v.status = 'active' AND (v.expires_at IS NULL OR v.expires_at > NOW()) AND v.employer_id = %s
+        ORDER BY v.created_at DESC
+    """,
+    'vacancy_list_by_employer': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancies v
+        JOIN users u ON v.employer_id = u.id
+        WHERE v.status = %s AND v.employer_id = %s
+        ORDER BY v.created_at DESC
+    """,
+    # Ближайшие места — по GiST-индексу справочника (earth_box отсекает, earth_distance уточняет),
+    # в каждом месте — свежие активные вакансии по индексу (place_id, created_at)
+    'vacancy_list_nearby': """
+        SELECT v.*, u.full_name as employer_name, round((p.distance / 1000)::numeric, 1)::float8 AS distance_km
+        FROM (
+            SELECT gp.id, earth_distance(c.point, ll_to_earth(gp.latitude, gp.longitude)) AS distance
+            FROM (SELECT ll_to_earth(%s, %s) AS point, %s::float8 AS radius) c
+            JOIN geo_places gp ON earth_box(c.point, c.radius) @> ll_to_earth(gp.latitude, gp.longitude)
+            WHERE earth_distance(c.point, ll_to_earth(gp.latitude, gp.longitude)) <= c.radius
+        ) p
+        CROSS JOIN LATERAL (
+            SELECT * FROM vacancies
+            WHERE place_id = p.id AND status = 'active' AND (expires_at IS NULL OR expires_at > NOW())
+            ORDER BY created_at DESC
+            LIMIT %s
+        ) v
+        JOIN users u ON v.employer_id = u.id
+        ORDER BY p.distance, v.created_at DESC
+        LIMIT %s
+    """,
+    'place_coordinates': """SELECT latitude, longitude FROM geocode_place(%s)""",
+    # Соседи и лента «для вас» посчитаны заранее (scripts/build_recommendations.py): чтение по первичному ключу,
+    # закрытые с момента пересчёта вакансии и уже отмеченные пользователем отбрасываются здесь
+    'vacancy_list_similar': """
+        SELECT v.*, u.full_name as employer_name
+        FROM vacancy_neighbors n
+        JOIN vacancies v ON v.id = n.neighbor_id
+        JOIN users u ON v.employer_id = u.id
+        WHERE n.vacancy_id = %s AND v.status = 'active' AND (v.expires_at IS NULL OR v.expires_at > NOW())
+        ORDER BY n.rank
+        LIMIT %s
+    """,
+    'vacancy_list_for_user': """
+        SELECT v.*, u.full_name as employer_name
+        FROM user_recommendations r
+        JOIN vacancies v ON v.id = r.vacancy_id
+        JOIN users u ON v.employer_id = u.id
+        WHERE r.user_id = %s AND v.status = 'active' AND (v.expires_at IS NULL OR v.expires_at > NOW())
+          AND NOT EXISTS (SELECT 1 FROM applications a WHERE a.vacancy_id = r.vacancy_id AND a.applicant_id = r.user_id)
+          AND NOT EXISTS (SELECT 1 FROM favorites f WHERE f.user_id = r.user_id AND f.vacancy_id = r.vacancy_id)
+        ORDER BY r.rank
+        LIMIT %s
+    """,
+    # Кандидаты в дубли — активные вакансии, совпавшие с подписью хотя бы в одной LSH-полосе. Без LIMIT и соединений:
+    # статистики по элементам уникальных хешей нет, и с ними планировщик выбирает полный просмотр вместо GIN
+    'vacancy_duplicate_candidates': """
+        SELECT vacancy_id, employer_id, minhash FROM vacancy_signatures WHERE bands && %s::bigint[]
+    """,
+    'revoked_session_ids': """SELECT jti FROM revoked_sessions WHERE expires_at > NOW()""",
+}
+
+WARM_STATEMENTS = ('user_by_session', 'vacancy_list_active', 'vacancy_detail')
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+SESSION_SIGNING_KEY = os.environ.get('SESSION_SIGNING_KEY', '')
+SIGNED_TOKEN_PREFIX = 'v1.'
+REVOCATION_CHECK = os.environ.get('SESSION_REVOCATION_CHECK', '1') != '0'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '30'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+DEFAULT_RADIUS_KM = 30
+MAX_RADIUS_KM = 1000
+NEARBY_LIMIT = 500
+RECOMMENDATIONS_LIMIT = 20
+DUPLICATE_CHECK = os.environ.get('VACANCY_DUPLICATE_CHECK', '1') != '0'
+DUPLICATE_SIMILARITY = float(os.environ.get('VACANCY_DUPLICATE_SIMILARITY', '0.8'))
+EMPLOYER_DUPLICATE_SIMILARITY = float(os.environ.get('VACANCY_EMPLOYER_DUPLICATE_SIMILARITY', '0.6'))
+MINHASH_BINS = 64
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+
+_prepared_by_conn = {}
+statement_stats = {}
+_revocations = {'jtis': set(), 'loaded_at': float('-inf')}
+
+_db_conn = None
+
 def get_db_connection():
-    """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    """Подключение к БД, переиспользуемое между вызовами тёплого инстанса"""
+    global _db_conn
+    if _db_conn is None or _db_conn.closed:
+        dsn = os.environ.get('DATABASE_URL')
+        conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+        _prepared_by_conn[id(conn)] = set()
+        prepare_statements(conn, WARM_STATEMENTS)
+        _db_conn = conn
+    return _db_conn
+
+def release_db_connection(conn):
+    """Завершение работы с подключением: откат незакрытой транзакции вместо закрытия"""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_URLS = [
+    url for url in re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL', ''))
+    if url
+]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', '1'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+
+_replicas = {url: {'conn': None, 'lag': None, 'checked_at': float('-inf'), 'down_until': float('-inf')} for url in REPLICA_URLS}
+_replica_rotation = itertools.count()
+_recent_writers = {}
+
+def mark_write(user_id):
+    """Отметка о записи пользователя: следующие READ_YOUR_WRITES_SECONDS его чтения идут на primary"""
+    if not REPLICA_URLS or user_id is None:
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    if len(_recent_writers) > 10000:
+        for key, written_at in list(_recent_writers.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                del _recent_writers[key]
+
+def get_replica_connection(url: str):
+    """Подключение к реплике, если она доступна и отстаёт не больше REPLICA_MAX_LAG_SECONDS; иначе None"""
+    state = _replicas[url]
+    now = time.monotonic()
+    if now < state['down_until']:
+        return None
+    try:
+        if state['conn'] is None or state['conn'].closed:
+            state['conn'] = psycopg2.connect(url, connect_timeout=2, cursor_factory=RealDictCursor)
+            state['conn'].set_session(readonly=True)
+            _prepared_by_conn[id(state['conn'])] = set()
+            state['checked_at'] = float('-inf')
+        if now - state['checked_at'] >= REPLICA_CHECK_SECONDS:
+            # Догнавшая primary реплика на простое тоже имеет старый replay_timestamp, поэтому сначала сравниваем LSN
+            with state['conn'].cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+                """)
+                state['lag'] = float(cur.fetchone()[0])
+            state['conn'].rollback()
+            state['checked_at'] = now
+    except psycopg2.Error:
+        if state['conn'] is not None:
+            state['conn'].close()
+        state['down_until'] = now + REPLICA_RETRY_SECONDS
+        return None
+    return state['conn'] if state['lag'] <= REPLICA_MAX_LAG_SECONDS else None
+
+def get_read_connection(user_id=None, recently_wrote: bool = False):
+    """Подключение для чтения: реплики по кругу; primary, если реплик нет, все отстают или недоступны,
+    а также сразу после записи этого пользователя (по отметке клиента или этого инстанса)"""
+    recently_wrote = recently_wrote or \
+        time.monotonic() - _recent_writers.get(user_id, float('-inf')) <= READ_YOUR_WRITES_SECONDS
+    if REPLICA_URLS and not recently_wrote:
+        start = next(_replica_rotation)
+        for offset in range(len(REPLICA_URLS)):
+            conn = get_replica_connection(REPLICA_URLS[(start + offset) % len(REPLICA_URLS)])
+            if conn is not None:
+                return conn
+    return get_db_connection()
+
+def client_wrote_recently(event: dict) -> bool:
+    """Отметка о записи от клиента: X-Since-Last-Write — миллисекунды с его последней записи. Память инстанса
+    видит только записи, прошедшие через него, а отметка клиента работает при любом числе инстансов"""
+    headers = event.get('headers') or {}
+    value = headers.get('X-Since-Last-Write') or headers.get('x-since-last-write')
+    try:
+        return 0 <= float(value) <= READ_YOUR_WRITES_SECONDS * 1000
+    except (TypeError, ValueError):
+        return False
+
+def mark_replica_down(conn) -> bool:
+    """Сбой запроса на реплике: она пропускается REPLICA_RETRY_SECONDS, чтение повторяется на primary.
+    False — подключение не реплика, повторять негде"""
+    for state in _replicas.values():
+        if state['conn'] is conn:
+            conn.close()
+            state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+            return True
+    return False
+
+def to_positional(sql: str) -> str:
+    """Замена плейсхолдеров %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql)
+
+def prepare_statement(cur, name: str):
+    """PREPARE запроса из реестра на текущем подключении с учётом времени разбора"""
+    stats = statement_stats.setdefault(name, {'prepares': 0, 'executions': 0, 'prepare_ms': 0.0})
+    started = time.perf_counter()
+    cur.execute(f"PREPARE {name} AS {to_positional(PREPARED_STATEMENTS[name])}")
+    stats['prepare_ms'] += (time.perf_counter() - started) * 1000
+    stats['prepares'] += 1
+    _prepared_by_conn.setdefault(id(cur.connection), set()).add(name)
+
+def prepare_statements(conn, names):
+    """PREPARE набора запросов сразу после подключения"""
+    if not USE_PREPARED_STATEMENTS:
+        return
+    with conn.cursor() as cur:
+        for name in names:
+            prepare_statement(cur, name)
+    conn.commit()
+
+def execute_prepared(cur, name: str, params: tuple = ()):
+    """Выполнение запроса из реестра: PREPARE один раз на подключение, далее EXECUTE"""
+    if not USE_PREPARED_STATEMENTS:
+        cur.execute(PREPARED_STATEMENTS[name], params)
+        return
+    if name not in _prepared_by_conn.get(id(cur.connection), ()):
+        prepare_statement(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    starts_transaction = cur.connection.status == psycopg2.extensions.STATUS_READY
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.FeatureNotSupported:
+        # После миграции, добавившей столбцы, план запроса с * больше не совпадает по типу результата
+        # ("cached plan must not change result type"): все запросы подключения готовятся заново. Первый запрос
+        # транзакции повторяется сразу, в середине транзакции ошибка отдаётся вызывающему, но подключение уже исправно
+        cur.connection.rollback()
+        cur.execute("DEALLOCATE ALL")
+        _prepared_by_conn[id(cur.connection)] = set()
+        if not starts_transaction:
+            raise
+        prepare_statement(cur, name)
+        cur.execute(sql, params)
+    statement_stats[name]['executions'] += 1
+
+def get_statement_stats() -> dict:
+    """Статистика реестра: число PREPARE/EXECUTE и оценка сэкономленного времени разбора"""
+    report = {}
+    for name, stats in statement_stats.items():
+        avg_prepare_ms = stats['prepare_ms'] / stats['prepares'] if stats['prepares'] else 0.0
+        report[name] = dict(stats, saved_ms=round(avg_prepare_ms * max(stats['executions'] - stats['prepares'], 0), 3))
+    return report
+
+# Дата и время приходят строкой из текстового протокола PostgreSQL, без разбора в datetime и обратно
+DATES_AS_TEXT = psycopg2.extensions.new_type((1082, 1114, 1184), 'DATES_AS_TEXT', lambda value, cur: value)
+
+# Кодирование значения в JSON по OID типа колонки; остальные типы — через json.dumps(default=str)
+JSON_VALUE_ENCODERS = {
+    16: "('null' if {0} is None else 'true' if {0} else 'false')",
+    20: "('null' if {0} is None else str({0}))",
+    21: "('null' if {0} is None else str({0}))",
+    23: "('null' if {0} is None else str({0}))",
+    25: "('null' if {0} is None else escape({0}))",
+    1042: "('null' if {0} is None else escape({0}))",
+    1043: "('null' if {0} is None else escape({0}))",
+    1082: "('null' if {0} is None else escape({0}))",
+    1114: "('null' if {0} is None else escape({0}))",
+    1184: "('null' if {0} is None else escape({0}))",
+}
+
+def open_row_cursor(conn):
+    """Курсор для выдачи строк клиенту: строки — namedtuple вместо dict, даты — текстом"""
+    cur = conn.cursor(cursor_factory=NamedTupleCursor)
+    psycopg2.extensions.register_type(DATES_AS_TEXT, cur)
+    return cur
+
+@lru_cache(maxsize=None)
+def compile_row_serializer(columns: tuple):
+    """Сериализатор строки в JSON-объект для набора колонок (имя, OID): ключи закодированы заранее,
+    значения — без промежуточного dict; tail дописывается перед закрывающей скобкой"""
+    keys = ','.join(json.dumps(name, ensure_ascii=False).replace('%', '%%') + ':%s' for name, _ in columns)
+    values = ''.join(JSON_VALUE_ENCODERS.get(oid, 'dumps({0})').format(f'row[{i}]') + ', ' for i, (_, oid) in enumerate(columns))
+    source = f"def serialize(row, tail=''):\n    return TEMPLATE % ({values}tail)\n"
+    namespace = {
+        'TEMPLATE': '{' + keys + '%s}',
+        'escape': encode_basestring,
+        'dumps': lambda value: json.dumps(value, ensure_ascii=False, default=str),
+    }
+    exec(compile(source, '<row serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+def row_serializer(cur):
+    """Сериализатор для колонок последнего запроса курсора"""
+    return compile_row_serializer(tuple((column.name, column.type_code) for column in cur.description))
+
+def rows_to_json(cur, rows) -> str:
+    """JSON-массив строк результата"""
+    serialize = row_serializer(cur)
+    return '[' + ','.join(map(serialize, rows)) + ']'
+
+def warm_up():
+    """Прогрев при старте: подключение и подготовка запросов до первого запроса"""
+    try:
+        get_db_connection()
+    except psycopg2.Error:
+        pass
+
+def b64url_decode(value: str) -> bytes:
+    """Декодирование base64url без выравнивания"""
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def get_revoked_session_ids() -> set:
+    """Список отозванных подписанных токенов в памяти, обновляется раз в REVOCATION_REFRESH_SECONDS"""
+    now = time.monotonic()
+    if now - _revocations['loaded_at'] < REVOCATION_REFRESH_SECONDS:
+        return _revocations['jtis']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'revoked_session_ids')
+            _revocations['jtis'] = {row['jti'] for row in cur.fetchall()}
+            _revocations['loaded_at'] = now
+    except psycopg2.Error:
+        pass
+    finally:
+        release_db_connection(conn)
+    return _revocations['jtis']
+
+def decode_signed_token(token: str) -> Optional[dict]:
+    """Проверка подписанного токена без обращения к user_sessions"""
+    if not SESSION_SIGNING_KEY or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        _, payload, signature = token.split('.')
+        expected = hmac.new(SESSION_SIGNING_KEY.encode(), f'{SIGNED_TOKEN_PREFIX}{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims['exp'] <= time.time():
+        return None
+    if REVOCATION_CHECK and claims['jti'] in get_revoked_session_ids():
+        return None
+    return claims
 
 def get_user_from_session(session_token: Optional[str]) -> Optional[dict]:
     """Получение пользователя по токену сессии"""
     if not session_token:
         return None
     
-    conn = get_db_connection()
+    if session_token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(session_token)
+        return {'id': claims['uid'], 'user_type': claims['typ']} if claims else None
+    
+    # Сессия, созданная только что, может ещё не дойти до реплики: промах перепроверяется на primary
+    conn = get_read_connection()
+    while True:
+        try:
+            with conn.cursor() as cur:
+                execute_prepared(cur, 'user_by_session', (session_token,))
+                user = cur.fetchone()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            if not mark_replica_down(conn):
+                raise
+            user = None
+        finally:
+            release_db_connection(conn)
+        if user or conn is _db_conn:
+            return user
+        conn = get_db_connection()
+
+def get_idempotency_key(event: dict) -> Optional[str]:
+    """Ключ идемпотентности из заголовка Idempotency-Key"""
+    headers = event.get('headers') or {}
+    return headers.get('Idempotency-Key') or headers.get('idempotency-key')
+
+def claim_idempotency_key(cur, user_id: int, key: str, endpoint: str, body: Optional[str]) -> Optional[dict]:
+    """Захват ключа в транзакции запроса: None — запрос новый и выполняется, иначе готовый ответ.
+    Параллельный повтор ждёт на первичном ключе, пока первый запрос не зафиксируется или не откатится"""
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key длиннее 255 символов'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    request_hash = hashlib.sha256(f'{endpoint}\n{body or ""}'.encode()).hexdigest()
+    cur.execute("""
+        INSERT INTO idempotency_keys (user_id, key, request_hash) VALUES (%s, %s, %s)
+        ON CONFLICT (user_id, key) DO NOTHING
+        RETURNING user_id
+    """, (user_id, key, request_hash))
+    if cur.fetchone():
+        return None
+    cur.execute(
+        "SELECT request_hash, status_code, response_body FROM idempotency_keys WHERE user_id = %s AND key = %s",
+        (user_id, key)
+    )
+    saved = cur.fetchone()
+    if not saved:
+        return claim_idempotency_key(cur, user_id, key, endpoint, body)
+    if saved['request_hash'] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': headers,
+            'body': json.dumps({'error': 'Idempotency-Key уже использован для другого запроса'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': saved['status_code'],
+        'headers': dict(headers, **{'Idempotent-Replayed': 'true'}),
+        'body': saved['response_body'],
+        'isBase64Encoded': False
+    }
+
+def save_idempotent_response(cur, user_id: int, key: str, response: dict):
+    """Ответ сохраняется в той же транзакции, что и запись в основные таблицы"""
+    cur.execute(
+        "UPDATE idempotency_keys SET status_code = %s, response_body = %s WHERE user_id = %s AND key = %s",
+        (response['statusCode'], response['body'], user_id, key)
+    )
+
+if os.environ.get('DB_WARMUP') == '1':
+    warm_up()
+
+PATCHABLE_FIELDS = (
+    'title', 'company', 'location', 'salary_min', 'salary_max', 'employment_type',
+    'experience', 'description', 'requirements', 'tags', 'status', 'expires_at'
+)
+
+VACANCY_STATUSES = ('active', 'closed')
+# Текстовые поля PATCH и их длина по схеме (None — TEXT без ограничения); title, company и status не бывают NULL
+PATCH_TEXT_LIMITS = {
+    'title': 255, 'company': 255, 'location': 255, 'employment_type': 50, 'experience': 50,
+    'description': None, 'requirements': None
+}
+REQUIRED_PATCH_FIELDS = ('title', 'company', 'status')
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+def is_int(value) -> bool:
+    """Целое JSON-значение в диапазоне INTEGER (bool — не число)"""
+    return isinstance(value, int) and not isinstance(value, bool) and INT_MIN <= value <= INT_MAX
+
+def parse_int_param(params: dict, name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    """Целый параметр запроса в пределах [low, high]; ValueError с текстом для ответа 400"""
+    value = params.get(name)
+    if value in (None, ''):
+        return default
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT u.id, u.email, u.full_name, u.user_type
-                FROM user_sessions s
-                JOIN users u ON s.user_id = u.id
-                WHERE s.session_token = %s AND s.expires_at > NOW()
-            """, (session_token,))
-            return cur.fetchone()
-    finally:
-        conn.close()
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name}: ожидается целое число')
+    if not low <= number <= high:
+        raise ValueError(f'{name}: от {low} до {high}')
+    return number
+
+def validate_vacancy_patch(data) -> Optional[str]:
+    """Проверка тела PATCH до обращения к БД: текст ошибки для ответа 400 или None"""
+    if not isinstance(data, dict):
+        return 'Ожидается JSON-объект'
+    if not is_int(data.get('id')):
+        return 'id: ожидается целое число'
+    if data.get('version') is not None and not is_int(data['version']):
+        return 'version: ожидается целое число'
+    fields = [field for field in PATCHABLE_FIELDS if field in data]
+    if not fields:
+        return 'Нет полей для обновления'
+    for field in fields:
+        value = data[field]
+        if value is None:
+            if field in REQUIRED_PATCH_FIELDS:
+                return f'{field}: обязательное поле'
+        elif field in PATCH_TEXT_LIMITS:
+            limit = PATCH_TEXT_LIMITS[field]
+            if not isinstance(value, str) or '\x00' in value:
+                return f'{field}: ожидается строка'
+            if field in REQUIRED_PATCH_FIELDS and not value.strip():
+                return f'{field}: обязательное поле'
+            if limit and len(value) > limit:
+                return f'{field}: длиннее {limit} символов'
+        elif field in ('salary_min', 'salary_max'):
+            if not is_int(value):
+                return f'{field}: ожидается целое число'
+        elif field == 'tags':
+            if not isinstance(value, list) or not all(isinstance(tag, str) and '\x00' not in tag for tag in value):
+                return 'tags: ожидается список строк'
+        elif field == 'status':
+            if value not in VACANCY_STATUSES:
+                return f"status: одно из {', '.join(VACANCY_STATUSES)}"
+        elif field == 'expires_at':
+            try:
+                datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return 'expires_at: ожидается дата и время в формате ISO 8601'
+    return None
+
+# Вакансия, которая снова становится активной (из закрытой или уже истёкшей), получает новый срок публикации,
+# иначе очистка (vacancy_expiry) сразу вернула бы её в expired; более поздний срок не сокращается
+REACTIVATED_EXPIRES_AT = """CASE
+    WHEN {status} = 'active' AND (status <> 'active' OR expires_at <= NOW())
+    THEN GREATEST(expires_at, NOW() + INTERVAL '30 days')
+    ELSE expires_at
+END"""
+
+def extends_expiry(fields: tuple) -> bool:
+    """Меняется статус, а срок публикации клиент не передал — срок пересчитывается при активации"""
+    return 'status' in fields and 'expires_at' not in fields
+
+@lru_cache(maxsize=256)
+def build_vacancy_patch(fields: tuple) -> str:
+    """UPDATE только переданных полей; текст запроса кешируется по набору полей"""
+    assignments = ''.join(f'{field} = %s, ' for field in fields)
+    if extends_expiry(fields):
+        assignments += f"expires_at = {REACTIVATED_EXPIRES_AT.format(status='%s')}, "
+    # content_hash сбрасывается, чтобы следующая синхронизация по external_id перезаписала ручную правку
+    return f"""
+        UPDATE vacancies SET {assignments}version = version + 1, content_hash = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND employer_id = %s AND (%s::integer IS NULL OR version = %s::integer)
+        RETURNING version
+    """
+
+_WORD_RE = re.compile(r'\w+')
+_EMPTY_BIN = 1 << 64
+
+def vacancy_shingles(title: Optional[str], company: Optional[str], description: Optional[str]) -> set:
+    """Шинглы текста вакансии: все последовательности из SHINGLE_WORDS слов в нижнем регистре"""
+    words = _WORD_RE.findall(' '.join(filter(None, (title, company, description))).lower().replace('ё', 'е'))
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))} if words else set()
+
+def minhash_signature(title: Optional[str], company: Optional[str], description: Optional[str]) -> Optional[bytes]:
+    """MinHash с одной перестановкой: один 64-битный хеш на шингл, младшие биты выбирают корзину, в корзине
+    остаётся минимум. Пустая корзина берёт значение ближайшей непустой справа с пометкой расстояния.
+    Доля совпавших корзин двух подписей оценивает коэффициент Жаккара их шинглов"""
+    bins = [_EMPTY_BIN] * MINHASH_BINS
+    for shingle in vacancy_shingles(title, company, description):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        index, value = value % MINHASH_BINS, value // MINHASH_BINS
+        if value < bins[index]:
+            bins[index] = value
+    if all(value == _EMPTY_BIN for value in bins):
+        return None
+    signature = array('I')
+    for index in range(MINHASH_BINS):
+        distance = 0
+        while bins[(index + distance) % MINHASH_BINS] == _EMPTY_BIN:
+            distance += 1
+        signature.append(distance << 26 | bins[(index + distance) % MINHASH_BINS] >> 32)
+    return signature.tobytes()
+
+def lsh_bands(signature: bytes) -> list:
+    """Хеши LSH_BANDS полос подписи: похожие на 0.8 вакансии совпадают хотя бы в одной почти наверняка"""
+    width = len(signature) // LSH_BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + signature[band * width:(band + 1) * width], digest_size=8).digest(),
+                       'big', signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+def signature_similarity(first: bytes, second: bytes) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших корзин"""
+    return sum(a == b for a, b in zip(array('I', first), array('I', second))) / MINHASH_BINS
+
+def find_duplicates(cur, employer_id: int, signature: bytes, bands: list) -> list:
+    """Похожие активные вакансии, самые похожие первыми; для своих вакансий работодателя порог ниже —
+    перепубликация обычно с правками"""
+    execute_prepared(cur, 'vacancy_duplicate_candidates', (bands,))
+    duplicates = []
+    for row in cur.fetchall():
+        similarity = signature_similarity(signature, bytes(row['minhash']))
+        same_employer = row['employer_id'] == employer_id
+        if similarity >= (EMPLOYER_DUPLICATE_SIMILARITY if same_employer else DUPLICATE_SIMILARITY):
+            duplicates.append({'id': row['vacancy_id'], 'similarity': similarity, 'same_employer': same_employer})
+    duplicates.sort(key=lambda duplicate: (-duplicate['similarity'], duplicate['id']))
+    return duplicates
+
+def record_view(vacancy_id):
+    """Счётчик просмотров и событие 'view': запись всегда на primary, даже если вакансия прочитана с реплики.
+    Сбой записи только логируется: иначе он провалил бы чтение, а ошибку primary приняли бы за сбой реплики
+    и повторили весь GET, засчитав просмотр дважды"""
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    WITH viewed AS (
+                        UPDATE vacancies SET views_count = views_count + 1 WHERE id = %s RETURNING id
+                    )
+                    INSERT INTO vacancy_events (vacancy_id, event_type)
+                    SELECT id, 'view' FROM viewed
+                """, (vacancy_id,))
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+    except psycopg2.Error as e:
+        print(f'record_view {vacancy_id}: {e}', file=sys.stderr, flush=True)
 
 def handler(event: dict, context) -> dict:
     """API endpoint для работы с вакансиями"""
@@ -37,8 +650,8 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token, Idempotency-Key, X-Since-Last-Write',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -53,32 +666,36 @@ def handler(event: dict, context) -> dict:
     session_token = event.get('headers', {}).get('X-Session-Token') or event.get('headers', {}).get('x-session-token')
     user = get_user_from_session(session_token)
     
-    conn = get_db_connection()
+    conn = get_read_connection(user['id'] if user else None, client_wrote_recently(event)) if method == 'GET' else get_db_connection()
     try:
-        with conn.cursor() as cur:
+        with (open_row_cursor(conn) if method == 'GET' else conn.cursor()) as cur:
             if method == 'GET':
                 params = event.get('queryStringParameters') or {}
-                vacancy_id = params.get('id')
-                employer_id = params.get('employer_id')
                 status = params.get('status', 'active')
+                # Идентификаторы передаются в подготовленные запросы как integer: нечисловое значение — 400, а не 500
+                try:
+                    vacancy_id = parse_int_param(params, 'id', None, 1, INT_MAX)
+                    employer_id = parse_int_param(params, 'employer_id', None, 1, INT_MAX)
+                    similar_to = parse_int_param(params, 'similar_to', None, 1, INT_MAX)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
                 
                 if vacancy_id:
-                    cur.execute("""
-                        SELECT v.*, u.full_name as employer_name
-                        FROM vacancies v
-                        JOIN users u ON v.employer_id = u.id
-                        WHERE v.id = %s
-                    """, (vacancy_id,))
+                    execute_prepared(cur, 'vacancy_detail', (vacancy_id,))
                     vacancy = cur.fetchone()
                     
                     if vacancy:
-                        cur.execute("UPDATE vacancies SET views_count = views_count + 1 WHERE id = %s", (vacancy_id,))
-                        conn.commit()
+                        record_view(vacancy_id)
                         
                         return {
                             'statusCode': 200,
                             'headers': headers,
-                            'body': json.dumps(dict(vacancy), ensure_ascii=False),
+                            'body': row_serializer(cur)(vacancy),
                             'isBase64Encoded': False
                         }
                     else:
@@ -89,27 +706,88 @@ def handler(event: dict, context) -> dict:
                             'isBase64Encoded': False
                         }
                 
-                query = """
-                    SELECT v.*, u.full_name as employer_name
-                    FROM vacancies v
-                    JOIN users u ON v.employer_id = u.id
-                    WHERE v.status = %s
-                """
-                query_params = [status]
+                if similar_to:
+                    execute_prepared(cur, 'vacancy_list_similar', (similar_to, RECOMMENDATIONS_LIMIT))
+                    return {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': rows_to_json(cur, cur.fetchall()),
+                        'isBase64Encoded': False
+                    }
                 
-                if employer_id:
-                    query += " AND v.employer_id = %s"
-                    query_params.append(employer_id)
+                if params.get('for_you'):
+                    if not user:
+                        return {
+                            'statusCode': 401,
+                            'headers': headers,
+                            'body': json.dumps({'error': 'Требуется авторизация'}, ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
+                    execute_prepared(cur, 'vacancy_list_for_user', (user['id'], RECOMMENDATIONS_LIMIT))
+                    return {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': rows_to_json(cur, cur.fetchall()),
+                        'isBase64Encoded': False
+                    }
                 
-                query += " ORDER BY v.created_at DESC"
+                if params.get('near') or params.get('lat'):
+                    try:
+                        # float() принимает 'nan' и 'inf': такие значения и координаты вне диапазона — 400
+                        radius_km = float(params.get('radius_km') or DEFAULT_RADIUS_KM)
+                        if not math.isfinite(radius_km):
+                            raise ValueError('radius_km')
+                        radius_km = min(max(radius_km, 0.1), MAX_RADIUS_KM)
+                        if params.get('near'):
+                            execute_prepared(cur, 'place_coordinates', (params['near'],))
+                            place = cur.fetchone()
+                            if not place:
+                                return {
+                                    'statusCode': 400,
+                                    'headers': headers,
+                                    'body': json.dumps({'error': 'Город не найден'}, ensure_ascii=False),
+                                    'isBase64Encoded': False
+                                }
+                            latitude, longitude = place
+                        else:
+                            latitude, longitude = float(params['lat']), float(params.get('lon', ''))
+                            if not (math.isfinite(latitude) and math.isfinite(longitude)
+                                    and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+                                raise ValueError('lat, lon')
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': headers,
+                            'body': json.dumps({'error': 'lat (от -90 до 90), lon (от -180 до 180) и radius_km должны быть числами'},
+                                               ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
+                    
+                    # Только активные вакансии с распознанным городом: ближайшие первыми, в одном городе — свежие
+                    execute_prepared(cur, 'vacancy_list_nearby', (latitude, longitude, radius_km * 1000, NEARBY_LIMIT, NEARBY_LIMIT))
+                    return {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': rows_to_json(cur, cur.fetchall()),
+                        'isBase64Encoded': False
+                    }
                 
-                cur.execute(query, query_params)
+                # Для активных — отдельные запросы с литералом status, чтобы и общий план
+                # подготовленного запроса использовал частичные индексы по живым вакансиям
+                if status == 'active' and employer_id:
+                    execute_prepared(cur, 'vacancy_list_active_by_employer', (employer_id,))
+                elif status == 'active':
+                    execute_prepared(cur, 'vacancy_list_active')
+                elif employer_id:
+                    execute_prepared(cur, 'vacancy_list_by_employer', (status, employer_id))
+                else:
+                    execute_prepared(cur, 'vacancy_list', (status,))
                 vacancies = cur.fetchall()
                 
                 return {
                     'statusCode': 200,
                     'headers': headers,
-                    'body': json.dumps([dict(v) for v in vacancies], ensure_ascii=False, default=str),
+                    'body': rows_to_json(cur, vacancies),
                     'isBase64Encoded': False
                 }
             
@@ -122,14 +800,31 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                data = json.loads(event.get('body', '{}'))
+                raw_body = event.get('body') or '{}'
+                data = json.loads(raw_body)
+                
+                idempotency_key = get_idempotency_key(event)
+                if idempotency_key:
+                    replay = claim_idempotency_key(cur, user['id'], idempotency_key, 'POST vacancies', raw_body)
+                    if replay:
+                        conn.rollback()
+                        return replay
+                
+                # Дубль публикуется, но помечается ссылкой на исходную вакансию
+                signature = minhash_signature(data.get('title'), data.get('company'), data.get('description')) if DUPLICATE_CHECK else None
+                bands = lsh_bands(signature) if signature else None
+                duplicates = find_duplicates(cur, user['id'], signature, bands) if signature else []
                 
                 cur.execute("""
                     INSERT INTO vacancies (
                         employer_id, title, company, location, salary_min, salary_max,
-                        employment_type, experience, description, requirements, tags
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
+                        employment_type, experience, description, requirements, tags, expires_at, duplicate_of
+                    ) VALUES (
+                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                        COALESCE(%s::timestamp, CURRENT_TIMESTAMP + INTERVAL '30 days'),
+                        (SELECT COALESCE(duplicate_of, id) FROM vacancies WHERE id = %s)
+                    )
+                    RETURNING id, duplicate_of
                 """, (
                     user['id'],
                     data.get('title'),
@@ -141,18 +836,39 @@ def handler(event: dict, context) -> dict:
                     data.get('experience'),
                     data.get('description'),
                     data.get('requirements'),
-                    data.get('tags', [])
+                    data.get('tags', []),
+                    data.get('expires_at'),
+                    duplicates[0]['id'] if duplicates else None
                 ))
                 
-                vacancy_id = cur.fetchone()['id']
-                conn.commit()
+                created = cur.fetchone()
+                vacancy_id = created['id']
+                if signature:
+                    cur.execute(
+                        "INSERT INTO vacancy_signatures (vacancy_id, employer_id, minhash, bands) VALUES (%s, %s, %s, %s)",
+                        (vacancy_id, user['id'], signature, bands)
+                    )
                 
-                return {
+                response = {
                     'statusCode': 201,
                     'headers': headers,
-                    'body': json.dumps({'id': vacancy_id, 'message': 'Вакансия создана'}, ensure_ascii=False),
+                    'body': json.dumps({
+                        'id': vacancy_id,
+                        'message': 'Вакансия создана',
+                        'duplicate_of': created['duplicate_of'],
+                        'duplicates': [
+                            {'id': d['id'], 'similarity': round(d['similarity'], 2), 'same_employer': d['same_employer']}
+                            for d in duplicates[:10]
+                        ]
+                    }, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
+                if idempotency_key:
+                    save_idempotent_response(cur, user['id'], idempotency_key, response)
+                conn.commit()
+                mark_write(user['id'])
+                
+                return response
             
             elif method == 'PUT':
                 if not user or user['user_type'] != 'employer':
@@ -177,11 +893,14 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute("""
+                # Без status в теле статус не меняется
+                cur.execute(f"""
                     UPDATE vacancies SET
                         title = %s, company = %s, location = %s, salary_min = %s, salary_max = %s,
                         employment_type = %s, experience = %s, description = %s, requirements = %s,
-                        tags = %s, status = %s, updated_at = CURRENT_TIMESTAMP
+                        tags = %s, status = COALESCE(%s, status),
+                        expires_at = {REACTIVATED_EXPIRES_AT.format(status='COALESCE(%s, status)')},
+                        version = version + 1, content_hash = NULL, updated_at = CURRENT_TIMESTAMP
                     WHERE id = %s
                 """, (
                     data.get('title'),
@@ -194,11 +913,13 @@ def handler(event: dict, context) -> dict:
                     data.get('description'),
                     data.get('requirements'),
                     data.get('tags', []),
-                    data.get('status', 'active'),
+                    data.get('status'),
+                    data.get('status'),
                     vacancy_id
                 ))
                 
                 conn.commit()
+                mark_write(user['id'])
                 
                 return {
                     'statusCode': 200,
@@ -207,6 +928,65 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
+            elif method == 'PATCH':
+                if not user or user['user_type'] != 'employer':
+                    return {
+                        'statusCode': 403,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                data = json.loads(event.get('body', '{}'))
+                error = validate_vacancy_patch(data)
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': error}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                vacancy_id = data['id']
+                expected_version = data.get('version')
+                fields = tuple(field for field in PATCHABLE_FIELDS if field in data)
+                
+                cur.execute(
+                    build_vacancy_patch(fields),
+                    tuple(data[field] for field in fields) + ((data['status'],) if extends_expiry(fields) else ())
+                    + (vacancy_id, user['id'], expected_version, expected_version)
+                )
+                updated = cur.fetchone()
+                
+                if not updated:
+                    cur.execute("SELECT employer_id, version FROM vacancies WHERE id = %s", (vacancy_id,))
+                    vacancy = cur.fetchone()
+                    if vacancy and vacancy['employer_id'] == user['id']:
+                        return {
+                            'statusCode': 409,
+                            'headers': headers,
+                            'body': json.dumps({
+                                'error': 'Вакансия уже изменена, обновите данные',
+                                'version': vacancy['version']
+                            }, ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
+                    return {
+                        'statusCode': 403,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Доступ запрещен'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                conn.commit()
+                mark_write(user['id'])
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'message': 'Вакансия обновлена', 'version': updated['version']}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
             else:
                 return {
                     'statusCode': 405,
@@ -216,6 +996,10 @@ def handler(event: dict, context) -> dict:
                 }
     
     except Exception as e:
+        if method == 'GET' and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) \
+                and mark_replica_down(conn):
+            # Реплика отказала посреди запроса: она пропускается, запрос повторяется на primary
+            return handler(dict(event, headers=dict(event.get('headers') or {}, **{'X-Since-Last-Write': '0'})), context)
         return {
             'statusCode': 500,
             'headers': headers,
@@ -223,4 +1007,4 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     finally:
-        conn.close()
+        release_db_connection(conn)
@@ -0,0 +1,9 @@
+-- UNIQUE(session_token) уже создаёт индекс, отдельный idx_sessions_token его дублирует
+DROP INDEX IF EXISTS idx_sessions_token;
+
+-- Пакетное удаление истёкших сессий идёт по диапазону expires_at
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON user_sessions(expires_at);
+
+-- Ограничение числа сессий пользователя выбирает самые новые сессии
+DROP INDEX IF EXISTS idx_sessions_user_id;
+CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON user_sessions(user_id, created_at DESC);
@@ -0,0 +1,8 @@
+-- Отозванные подписанные токены (выход из системы); хранятся до истечения срока токена
+CREATE TABLE IF NOT EXISTS revoked_sessions (
+    jti VARCHAR(32) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_sessions_expires_at ON revoked_sessions(expires_at);
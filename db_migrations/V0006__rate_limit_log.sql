@@ -0,0 +1,10 @@
+-- Журнал расхода токенов ограничителя частоты для синхронизации между инстансами функций
+CREATE TABLE IF NOT EXISTS rate_limit_log (
+    id BIGSERIAL PRIMARY KEY,
+    instance_id VARCHAR(32) NOT NULL,
+    bucket_key VARCHAR(320) NOT NULL,
+    amount REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_log_created_at ON rate_limit_log(created_at);
@@ -0,0 +1,25 @@
+-- Журнал событий по вакансиям: просмотр, отклик, смена статуса отклика (только вставка)
+CREATE TABLE IF NOT EXISTS vacancy_events (
+    id BIGSERIAL PRIMARY KEY,
+    vacancy_id INTEGER NOT NULL,
+    event_type VARCHAR(40) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Почасовые и посуточные агрегаты событий, пополняются инкрементально по водяному знаку
+CREATE TABLE IF NOT EXISTS vacancy_event_rollups (
+    vacancy_id INTEGER NOT NULL,
+    granularity VARCHAR(5) NOT NULL CHECK (granularity IN ('hour', 'day')),
+    bucket TIMESTAMP NOT NULL,
+    event_type VARCHAR(40) NOT NULL,
+    events INTEGER NOT NULL,
+    PRIMARY KEY (vacancy_id, granularity, bucket, event_type)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO rollup_watermarks (name, last_id) VALUES ('vacancy_events', 0) ON CONFLICT (name) DO NOTHING;
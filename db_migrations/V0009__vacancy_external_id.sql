@@ -0,0 +1,6 @@
+-- Идентификатор вакансии во внешней системе работодателя и хеш содержимого для синхронизации
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS external_id VARCHAR(100);
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- Ключ upsert при синхронизации; NULL в external_id не конфликтуют друг с другом
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vacancies_employer_external ON vacancies(employer_id, external_id);
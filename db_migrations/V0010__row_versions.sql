@@ -0,0 +1,3 @@
+-- Номер версии строки для оптимистичной блокировки при частичных обновлениях (PATCH)
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,13 @@
+-- Срок публикации вакансии; истёкшие переводятся в статус 'expired' фоновой задачей cleanup
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+ALTER TABLE vacancies ALTER COLUMN expires_at SET DEFAULT CURRENT_TIMESTAMP + INTERVAL '30 days';
+
+-- Существующим активным вакансиям — 30 дней от публикации, но не меньше недели от выкатки
+UPDATE vacancies
+SET expires_at = GREATEST(created_at + INTERVAL '30 days', CURRENT_TIMESTAMP + INTERVAL '7 days')
+WHERE status = 'active' AND expires_at IS NULL;
+
+-- Частичные индексы только по живым вакансиям: горячий список и поиск не читают архив
+CREATE INDEX IF NOT EXISTS idx_vacancies_active_created ON vacancies(created_at DESC) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_vacancies_active_employer ON vacancies(employer_id, created_at DESC) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_vacancies_active_expires ON vacancies(expires_at) WHERE status = 'active';
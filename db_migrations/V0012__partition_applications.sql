@@ -0,0 +1,50 @@
+-- Отклики секционируются по диапазонам vacancy_id (по 100000 вакансий в секции):
+-- запросы по вакансии и работодателю читают только свои секции, старые секции можно отсоединить.
+-- Ключ секционирования входит в PK и UNIQUE(vacancy_id, applicant_id), повторный отклик по-прежнему запрещён.
+DO $$
+DECLARE
+    partition_size CONSTANT BIGINT := 100000;
+    last_start BIGINT;
+    start_id BIGINT := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE relname = 'applications' AND relkind = 'r') THEN
+        RETURN;
+    END IF;
+
+    CREATE TABLE applications_new (
+        id INTEGER NOT NULL DEFAULT nextval('applications_id_seq'),
+        vacancy_id INTEGER NOT NULL REFERENCES vacancies(id),
+        applicant_id INTEGER NOT NULL REFERENCES users(id),
+        resume_id INTEGER REFERENCES resumes(id),
+        cover_letter TEXT,
+        status VARCHAR(20) DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, vacancy_id),
+        UNIQUE (vacancy_id, applicant_id)
+    ) PARTITION BY RANGE (vacancy_id);
+
+    -- Секции с запасом на две вперёд; дальше их создаёт функция partitions по таймеру
+    SELECT (COALESCE(MAX(id), 0) / partition_size + 2) * partition_size INTO last_start FROM vacancies;
+    WHILE start_id <= last_start LOOP
+        EXECUTE format(
+            'CREATE TABLE applications_v%s PARTITION OF applications_new FOR VALUES FROM (%s) TO (%s)',
+            start_id, start_id, start_id + partition_size
+        );
+        start_id := start_id + partition_size;
+    END LOOP;
+    -- Страховка на случай, если таймер не успел создать секцию: отклик не теряется
+    CREATE TABLE applications_default PARTITION OF applications_new DEFAULT;
+
+    INSERT INTO applications_new SELECT * FROM applications;
+    ALTER SEQUENCE applications_id_seq OWNED BY applications_new.id;
+    DROP TABLE applications;
+
+    ALTER TABLE applications_new RENAME TO applications;
+    ALTER TABLE applications RENAME CONSTRAINT applications_new_pkey TO applications_pkey;
+    ALTER TABLE applications RENAME CONSTRAINT applications_new_vacancy_id_applicant_id_key TO applications_vacancy_id_applicant_id_key;
+    ALTER TABLE applications RENAME CONSTRAINT applications_new_vacancy_id_fkey TO applications_vacancy_id_fkey;
+    ALTER TABLE applications RENAME CONSTRAINT applications_new_applicant_id_fkey TO applications_applicant_id_fkey;
+    ALTER TABLE applications RENAME CONSTRAINT applications_new_resume_id_fkey TO applications_resume_id_fkey;
+    CREATE INDEX idx_applications_applicant ON applications(applicant_id);
+END $$;
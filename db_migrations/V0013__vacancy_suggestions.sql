@@ -0,0 +1,101 @@
+-- Подсказки для строк поиска: значения названий, компаний, городов и тегов активных вакансий с частотой
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- value_norm в побайтовой сортировке "C": первичный ключ сразу служит индексом для поиска по префиксу
+CREATE TABLE IF NOT EXISTS vacancy_suggestions (
+    field VARCHAR(20) NOT NULL CHECK (field IN ('title', 'company', 'location', 'tag')),
+    value_norm TEXT COLLATE "C" NOT NULL,
+    value TEXT NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (field, value_norm)
+);
+
+-- Самые частые значения поля: короткий префикс или частая подстрока находят первые 10 совпадений
+-- в начале индекса, не сортируя тысячи строк; value_norm и value в индексе — проверка без чтения таблицы
+CREATE INDEX IF NOT EXISTS idx_vacancy_suggestions_top ON vacancy_suggestions (field, frequency DESC)
+    INCLUDE (value_norm, value) WHERE frequency > 0;
+
+-- Редкие подстроки ("разработчик" -> "Python-разработчик") — по триграммам; отдельный индекс на поле,
+-- чтобы списки совпадений по частым триграммам не включали значения остальных полей
+CREATE INDEX IF NOT EXISTS idx_vacancy_suggestions_trgm_title ON vacancy_suggestions
+    USING gin (value_norm gin_trgm_ops) WHERE field = 'title';
+CREATE INDEX IF NOT EXISTS idx_vacancy_suggestions_trgm_company ON vacancy_suggestions
+    USING gin (value_norm gin_trgm_ops) WHERE field = 'company';
+CREATE INDEX IF NOT EXISTS idx_vacancy_suggestions_trgm_location ON vacancy_suggestions
+    USING gin (value_norm gin_trgm_ops) WHERE field = 'location';
+CREATE INDEX IF NOT EXISTS idx_vacancy_suggestions_trgm_tag ON vacancy_suggestions
+    USING gin (value_norm gin_trgm_ops) WHERE field = 'tag';
+
+-- Значения одной вакансии, попадающие в подсказки
+CREATE OR REPLACE FUNCTION vacancy_suggestion_terms(v vacancies)
+RETURNS TABLE (field TEXT, value TEXT) AS $$
+    SELECT t.field, btrim(t.value)
+    FROM (
+        SELECT 'title', v.title
+        UNION ALL SELECT 'company', v.company
+        UNION ALL SELECT 'location', v.location
+        UNION ALL SELECT 'tag', unnest(v.tags)
+    ) AS t (field, value)
+    WHERE v.status = 'active' AND btrim(t.value) <> '' AND length(t.value) <= 200
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Частоты меняются одной вставкой на оператор; ключи упорядочены, чтобы параллельные вставки не ловили взаимоблокировку
+CREATE OR REPLACE FUNCTION track_vacancy_suggestions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO vacancy_suggestions AS s (field, value_norm, value, frequency)
+        SELECT t.field, lower(t.value), MIN(t.value), COUNT(*)
+        FROM new_rows n CROSS JOIN LATERAL vacancy_suggestion_terms(n) t
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (field, value_norm) DO UPDATE SET frequency = s.frequency + EXCLUDED.frequency;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO vacancy_suggestions AS s (field, value_norm, value, frequency)
+        SELECT t.field, lower(t.value), MIN(t.value), -COUNT(*)
+        FROM old_rows o CROSS JOIN LATERAL vacancy_suggestion_terms(o) t
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (field, value_norm) DO UPDATE SET frequency = s.frequency + EXCLUDED.frequency;
+    ELSE
+        INSERT INTO vacancy_suggestions AS s (field, value_norm, value, frequency)
+        SELECT field, lower(value), MIN(value), SUM(delta)
+        FROM (
+            SELECT field, value, -1 AS delta FROM vacancy_suggestion_terms(OLD)
+            UNION ALL
+            SELECT field, value, 1 FROM vacancy_suggestion_terms(NEW)
+        ) AS changes
+        GROUP BY 1, 2
+        HAVING SUM(delta) <> 0
+        ORDER BY 1, 2
+        ON CONFLICT (field, value_norm) DO UPDATE SET frequency = s.frequency + EXCLUDED.frequency;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Вставки и удаления — на оператор целиком (массовый импорт); изменения — построчно и только
+-- при смене полей подсказок, чтобы счётчик просмотров не вызывал триггер
+DROP TRIGGER IF EXISTS vacancy_suggestions_insert ON vacancies;
+CREATE TRIGGER vacancy_suggestions_insert AFTER INSERT ON vacancies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_vacancy_suggestions();
+
+DROP TRIGGER IF EXISTS vacancy_suggestions_delete ON vacancies;
+CREATE TRIGGER vacancy_suggestions_delete AFTER DELETE ON vacancies
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION track_vacancy_suggestions();
+
+DROP TRIGGER IF EXISTS vacancy_suggestions_update ON vacancies;
+CREATE TRIGGER vacancy_suggestions_update AFTER UPDATE OF title, company, location, tags, status ON vacancies
+    FOR EACH ROW
+    WHEN (OLD.title IS DISTINCT FROM NEW.title OR OLD.company IS DISTINCT FROM NEW.company
+          OR OLD.location IS DISTINCT FROM NEW.location OR OLD.tags IS DISTINCT FROM NEW.tags
+          OR OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION track_vacancy_suggestions();
+
+-- Заполнение по уже опубликованным вакансиям
+INSERT INTO vacancy_suggestions AS s (field, value_norm, value, frequency)
+SELECT t.field, lower(t.value), MIN(t.value), COUNT(*)
+FROM vacancies v CROSS JOIN LATERAL vacancy_suggestion_terms(v) t
+GROUP BY 1, 2
+ON CONFLICT (field, value_norm) DO UPDATE SET frequency = EXCLUDED.frequency;
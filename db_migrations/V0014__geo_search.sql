@@ -0,0 +1,165 @@
+-- Поиск вакансий по расстоянию: локальный справочник населённых пунктов и координаты вакансий и резюме
+CREATE EXTENSION IF NOT EXISTS cube;
+CREATE EXTENSION IF NOT EXISTS earthdistance;
+
+-- Справочник населённых пунктов; полный список загружается из выгрузки GeoNames скриптом scripts/load_gazetteer.py
+CREATE TABLE IF NOT EXISTS geo_places (
+    id SERIAL PRIMARY KEY,
+    geoname_id INTEGER UNIQUE,
+    name VARCHAR(200) NOT NULL,
+    country_code CHAR(2) NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    population INTEGER NOT NULL DEFAULT 0
+);
+
+-- Все написания названия (официальное, сокращения, разговорные) -> место; при совпадении — самое населённое
+CREATE TABLE IF NOT EXISTS geo_place_names (
+    name_norm VARCHAR(200) PRIMARY KEY,
+    place_id INTEGER NOT NULL REFERENCES geo_places(id) ON DELETE CASCADE
+);
+
+-- "г. Санкт-Петербург, Невский пр." -> "санкт петербург": часть до запятой, скобки или косой черты,
+-- без "г."/"город", ё -> е, дефисы -> пробелы
+CREATE OR REPLACE FUNCTION normalize_place_name(value TEXT) RETURNS TEXT AS $$
+    SELECT NULLIF(btrim(regexp_replace(
+        regexp_replace(translate(lower(substring(value from '^[^,(/;]*')), 'ё', 'е'), '^\s*(г\.|город\s)\s*', ''),
+        '[\s\-]+', ' ', 'g'
+    )), '')
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Пространственный индекс по справочнику: ближайшие места находятся по кубам earthdistance в GiST
+CREATE INDEX IF NOT EXISTS idx_geo_places_earth ON geo_places USING gist (ll_to_earth(latitude, longitude));
+
+CREATE OR REPLACE FUNCTION geocode_place(place TEXT)
+RETURNS TABLE (place_id INTEGER, latitude DOUBLE PRECISION, longitude DOUBLE PRECISION) AS $$
+    SELECT p.id, p.latitude, p.longitude
+    FROM geo_place_names n
+    JOIN geo_places p ON p.id = n.place_id
+    WHERE n.name_norm = normalize_place_name(place)
+$$ LANGUAGE sql STABLE;
+
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS place_id INTEGER REFERENCES geo_places(id) ON DELETE SET NULL;
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS place_id INTEGER REFERENCES geo_places(id) ON DELETE SET NULL;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+-- Место и координаты проставляются из справочника при вставке и смене location; не найдено — NULL
+CREATE OR REPLACE FUNCTION geocode_row_location() RETURNS trigger AS $$
+BEGIN
+    SELECT g.place_id, g.latitude, g.longitude INTO NEW.place_id, NEW.latitude, NEW.longitude
+    FROM geocode_place(NEW.location) g;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS vacancies_geocode ON vacancies;
+CREATE TRIGGER vacancies_geocode BEFORE INSERT OR UPDATE OF location ON vacancies
+    FOR EACH ROW EXECUTE FUNCTION geocode_row_location();
+
+DROP TRIGGER IF EXISTS resumes_geocode ON resumes;
+CREATE TRIGGER resumes_geocode BEFORE INSERT OR UPDATE OF location ON resumes
+    FOR EACH ROW EXECUTE FUNCTION geocode_row_location();
+
+-- Координаты вакансии — координаты её места, поэтому у всех вакансий города одна точка: поиск в радиусе
+-- берёт ближайшие места по индексу справочника, а в каждом — свежие вакансии по этому индексу
+CREATE INDEX IF NOT EXISTS idx_vacancies_active_place ON vacancies (place_id, created_at DESC)
+    WHERE status = 'active' AND place_id IS NOT NULL;
+
+-- Крупнейшие города, чтобы поиск работал сразу после выкатки
+INSERT INTO geo_places (name, country_code, latitude, longitude, population) VALUES
+    ('Москва', 'RU', 55.7558, 37.6173, 13010000),
+    ('Санкт-Петербург', 'RU', 59.9386, 30.3141, 5600000),
+    ('Новосибирск', 'RU', 55.0084, 82.9357, 1630000),
+    ('Екатеринбург', 'RU', 56.8389, 60.6057, 1540000),
+    ('Казань', 'RU', 55.7961, 49.1064, 1310000),
+    ('Нижний Новгород', 'RU', 56.3269, 44.0059, 1210000),
+    ('Красноярск', 'RU', 56.0153, 92.8932, 1190000),
+    ('Челябинск', 'RU', 55.1644, 61.4368, 1180000),
+    ('Самара', 'RU', 53.1959, 50.1002, 1160000),
+    ('Уфа', 'RU', 54.7388, 55.9721, 1160000),
+    ('Ростов-на-Дону', 'RU', 47.2357, 39.7015, 1140000),
+    ('Краснодар', 'RU', 45.0355, 38.9753, 1140000),
+    ('Омск', 'RU', 54.9885, 73.3242, 1100000),
+    ('Воронеж', 'RU', 51.6720, 39.1843, 1050000),
+    ('Пермь', 'RU', 58.0105, 56.2502, 1030000),
+    ('Волгоград', 'RU', 48.7080, 44.5133, 1020000),
+    ('Саратов', 'RU', 51.5336, 46.0343, 900000),
+    ('Тюмень', 'RU', 57.1522, 65.5272, 850000),
+    ('Тольятти', 'RU', 53.5078, 49.4204, 680000),
+    ('Ижевск', 'RU', 56.8526, 53.2045, 640000),
+    ('Барнаул', 'RU', 53.3474, 83.7784, 630000),
+    ('Ульяновск', 'RU', 54.3142, 48.4031, 620000),
+    ('Иркутск', 'RU', 52.2870, 104.3050, 610000),
+    ('Хабаровск', 'RU', 48.4802, 135.0719, 620000),
+    ('Махачкала', 'RU', 42.9849, 47.5047, 620000),
+    ('Владивосток', 'RU', 43.1155, 131.8855, 600000),
+    ('Ярославль', 'RU', 57.6261, 39.8845, 570000),
+    ('Оренбург', 'RU', 51.7682, 55.0969, 550000),
+    ('Томск', 'RU', 56.4846, 84.9476, 570000),
+    ('Кемерово', 'RU', 55.3547, 86.0873, 550000),
+    ('Новокузнецк', 'RU', 53.7557, 87.1099, 540000),
+    ('Рязань', 'RU', 54.6269, 39.6916, 530000),
+    ('Набережные Челны', 'RU', 55.7436, 52.3958, 550000),
+    ('Астрахань', 'RU', 46.3479, 48.0336, 470000),
+    ('Пенза', 'RU', 53.1959, 45.0183, 500000),
+    ('Киров', 'RU', 58.6036, 49.6680, 500000),
+    ('Липецк', 'RU', 52.6031, 39.5708, 500000),
+    ('Чебоксары', 'RU', 56.1439, 47.2489, 500000),
+    ('Калининград', 'RU', 54.7104, 20.4522, 490000),
+    ('Тула', 'RU', 54.1961, 37.6182, 470000),
+    ('Курск', 'RU', 51.7373, 36.1874, 440000),
+    ('Ставрополь', 'RU', 45.0428, 41.9734, 450000),
+    ('Сочи', 'RU', 43.5855, 39.7231, 440000),
+    ('Улан-Удэ', 'RU', 51.8335, 107.5841, 430000),
+    ('Тверь', 'RU', 56.8587, 35.9176, 420000),
+    ('Магнитогорск', 'RU', 53.4072, 58.9791, 410000),
+    ('Иваново', 'RU', 57.0004, 40.9739, 400000),
+    ('Брянск', 'RU', 53.2434, 34.3634, 380000),
+    ('Белгород', 'RU', 50.5997, 36.5983, 340000),
+    ('Сургут', 'RU', 61.2540, 73.3962, 400000),
+    ('Владимир', 'RU', 56.1290, 40.4066, 350000),
+    ('Архангельск', 'RU', 64.5393, 40.5170, 300000),
+    ('Калуга', 'RU', 54.5293, 36.2754, 330000),
+    ('Смоленск', 'RU', 54.7826, 32.0453, 320000),
+    ('Якутск', 'RU', 62.0281, 129.7326, 330000),
+    ('Мурманск', 'RU', 68.9585, 33.0827, 270000),
+    ('Балашиха', 'RU', 55.7963, 37.9382, 520000),
+    ('Химки', 'RU', 55.8970, 37.4297, 260000),
+    ('Подольск', 'RU', 55.4312, 37.5446, 310000),
+    ('Мытищи', 'RU', 55.9116, 37.7308, 240000),
+    ('Королёв', 'RU', 55.9142, 37.8256, 230000),
+    ('Люберцы', 'RU', 55.6783, 37.8936, 210000),
+    ('Красногорск', 'RU', 55.8204, 37.3302, 180000),
+    ('Зеленоград', 'RU', 55.9825, 37.1814, 250000),
+    ('Гатчина', 'RU', 59.5764, 30.1283, 90000),
+    ('Минск', 'BY', 53.9045, 27.5615, 1990000),
+    ('Алматы', 'KZ', 43.2220, 76.8512, 2200000),
+    ('Астана', 'KZ', 51.1694, 71.4491, 1350000)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO geo_place_names (name_norm, place_id)
+SELECT normalize_place_name(name), id FROM geo_places
+ON CONFLICT (name_norm) DO NOTHING;
+
+INSERT INTO geo_place_names (name_norm, place_id)
+SELECT alias, p.id
+FROM (VALUES
+    ('мск', 'Москва'), ('moscow', 'Москва'),
+    ('спб', 'Санкт-Петербург'), ('питер', 'Санкт-Петербург'), ('петербург', 'Санкт-Петербург'),
+    ('saint petersburg', 'Санкт-Петербург'),
+    ('екб', 'Екатеринбург'), ('нск', 'Новосибирск'), ('нижний', 'Нижний Новгород'),
+    ('ростов', 'Ростов-на-Дону'), ('челны', 'Набережные Челны'),
+    ('нур султан', 'Астана'), ('алма ата', 'Алматы')
+) AS a (alias, name)
+JOIN geo_places p ON p.name = a.name
+ON CONFLICT (name_norm) DO NOTHING;
+
+-- Координаты уже опубликованных вакансий и резюме
+UPDATE vacancies SET (place_id, latitude, longitude) = (SELECT g.place_id, g.latitude, g.longitude FROM geocode_place(location) g)
+WHERE location IS NOT NULL AND place_id IS NULL;
+
+UPDATE resumes SET (place_id, latitude, longitude) = (SELECT g.place_id, g.latitude, g.longitude FROM geocode_place(location) g)
+WHERE location IS NOT NULL AND place_id IS NULL;
@@ -0,0 +1,169 @@
+-- Сохранённые поиски и оповещения о новых подходящих вакансиях
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name VARCHAR(255),
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    location VARCHAR(255),
+    place_id INTEGER REFERENCES geo_places(id) ON DELETE SET NULL,
+    salary_min INTEGER,
+    salary_max INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (cardinality(tags) > 0 OR location IS NOT NULL)
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches (user_id, created_at DESC);
+
+-- Инвертированный индекс: поиск записан под одним, самым редким своим термом ('tag:python', 'place:1', 'loc:урюпинск').
+-- Новая вакансия находит кандидатов по своим термам, остальные условия проверяются только для них
+CREATE TABLE IF NOT EXISTS saved_search_terms (
+    term TEXT COLLATE "C" NOT NULL,
+    search_id INTEGER NOT NULL REFERENCES saved_searches(id) ON DELETE CASCADE,
+    PRIMARY KEY (term, search_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_search_terms_search ON saved_search_terms (search_id);
+
+-- Вакансии, ещё не сопоставленные с сохранёнными поисками
+CREATE TABLE IF NOT EXISTS saved_search_queue (
+    vacancy_id INTEGER PRIMARY KEY REFERENCES vacancies(id) ON DELETE CASCADE
+);
+
+-- Найденные совпадения для отправки оповещений; sent_at проставляет отправитель.
+-- Без внешних ключей: на популярный тег одна вакансия даёт тысячи строк, и проверки ключей занимали треть
+-- времени сопоставления. Строки удалённых поисков и вакансий отбрасываются при чтении; все строки старше
+-- 30 дней удаляет очистка
+CREATE TABLE IF NOT EXISTS saved_search_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    search_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    vacancy_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP,
+    UNIQUE (search_id, vacancy_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_search_outbox_unsent ON saved_search_outbox (id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_saved_search_outbox_user ON saved_search_outbox (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_saved_search_outbox_created ON saved_search_outbox (created_at);
+
+-- Вакансия в виде, удобном для сопоставления: теги в нижнем регистре и нормализованный город
+CREATE OR REPLACE FUNCTION vacancy_alert_fields(v vacancies)
+RETURNS TABLE (tags TEXT[], location_norm TEXT) AS $$
+    SELECT ARRAY(SELECT DISTINCT lower(btrim(t)) FROM unnest(v.tags) AS t WHERE btrim(t) <> ''),
+           normalize_place_name(v.location)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Полная проверка кандидата; без подзапросов, чтобы планировщик встраивал её в запрос, а не вызывал на каждую пару
+CREATE OR REPLACE FUNCTION saved_search_matches(s saved_searches, v vacancies, tags TEXT[], location_norm TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT s.tags <@ tags
+       AND (s.location IS NULL
+            OR (s.place_id IS NOT NULL AND s.place_id = v.place_id)
+            OR (s.place_id IS NULL AND normalize_place_name(s.location) = location_norm))
+       AND (s.salary_min IS NULL OR COALESCE(v.salary_max, v.salary_min) >= s.salary_min)
+       AND (s.salary_max IS NULL OR COALESCE(v.salary_min, v.salary_max) <= s.salary_max)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION index_saved_searches() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM saved_search_terms WHERE search_id IN (SELECT id FROM new_rows);
+    END IF;
+    -- Терм поиска: самый редкий из его тегов и города по частотам подсказок
+    INSERT INTO saved_search_terms (term, search_id)
+    SELECT a.term, n.id
+    FROM new_rows n
+    CROSS JOIN LATERAL (
+        SELECT c.term
+        FROM (
+            SELECT 'tag:' || t.tag,
+                   (SELECT frequency FROM vacancy_suggestions WHERE field = 'tag' AND value_norm = t.tag COLLATE "C")
+            FROM unnest(n.tags) AS t (tag)
+            UNION ALL
+            SELECT COALESCE('place:' || n.place_id, 'loc:' || normalize_place_name(n.location)),
+                   (SELECT frequency FROM vacancy_suggestions
+                    WHERE field = 'location' AND value_norm = lower(btrim(n.location)) COLLATE "C")
+            WHERE n.location IS NOT NULL
+        ) AS c (term, frequency)
+        WHERE c.term IS NOT NULL
+        ORDER BY COALESCE(c.frequency, 0), c.term
+        LIMIT 1
+    ) AS a
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS saved_searches_index_insert ON saved_searches;
+CREATE TRIGGER saved_searches_index_insert AFTER INSERT ON saved_searches
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION index_saved_searches();
+
+DROP TRIGGER IF EXISTS saved_searches_index_update ON saved_searches;
+CREATE TRIGGER saved_searches_index_update AFTER UPDATE ON saved_searches
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION index_saved_searches();
+
+-- Новые и заново опубликованные вакансии (POST, массовый импорт, смена статуса) встают в очередь сопоставления
+CREATE OR REPLACE FUNCTION enqueue_saved_search_matching() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO saved_search_queue (vacancy_id)
+        SELECT id FROM new_rows WHERE status = 'active'
+        ON CONFLICT DO NOTHING;
+    ELSE
+        INSERT INTO saved_search_queue (vacancy_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS saved_search_queue_insert ON vacancies;
+CREATE TRIGGER saved_search_queue_insert AFTER INSERT ON vacancies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION enqueue_saved_search_matching();
+
+DROP TRIGGER IF EXISTS saved_search_queue_activate ON vacancies;
+CREATE TRIGGER saved_search_queue_activate AFTER UPDATE OF status ON vacancies
+    FOR EACH ROW
+    WHEN (NEW.status = 'active' AND OLD.status IS DISTINCT FROM 'active')
+    EXECUTE FUNCTION enqueue_saved_search_matching();
+
+-- Сопоставление одной пачки очереди со всеми поисками одним запросом; возвращает обработанные вакансии.
+-- SKIP LOCKED позволяет запускать несколько обработчиков параллельно
+CREATE OR REPLACE FUNCTION match_saved_searches(batch_size INTEGER) RETURNS SETOF INTEGER AS $$
+    WITH batch AS (
+        DELETE FROM saved_search_queue
+        WHERE vacancy_id IN (
+            SELECT vacancy_id FROM saved_search_queue
+            ORDER BY vacancy_id
+            LIMIT batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING vacancy_id
+    ),
+    -- Поля вакансии считаются один раз, а не для каждого поиска-кандидата
+    fresh AS MATERIALIZED (
+        SELECT v, f.tags, f.location_norm
+        FROM batch b
+        JOIN vacancies v ON v.id = b.vacancy_id AND v.status = 'active'
+        CROSS JOIN LATERAL vacancy_alert_fields(v) AS f
+    ),
+    -- Пачки разных обработчиков не пересекаются, поэтому вставка без сортировки не ловит взаимоблокировок
+    matched AS (
+        INSERT INTO saved_search_outbox (search_id, user_id, vacancy_id)
+        SELECT s.id, s.user_id, (n.v).id
+        FROM fresh n
+        CROSS JOIN LATERAL (
+            SELECT 'tag:' || tag FROM unnest(n.tags) AS tag
+            UNION ALL SELECT 'place:' || (n.v).place_id WHERE (n.v).place_id IS NOT NULL
+            UNION ALL SELECT 'loc:' || n.location_norm WHERE n.location_norm IS NOT NULL
+        ) AS vt (term)
+        JOIN saved_search_terms st ON st.term = vt.term
+        JOIN saved_searches s ON s.id = st.search_id
+        WHERE s.user_id <> (n.v).employer_id AND saved_search_matches(s, n.v, n.tags, n.location_norm)
+        ON CONFLICT (search_id, vacancy_id) DO NOTHING
+    )
+    SELECT vacancy_id FROM batch
+$$ LANGUAGE sql;
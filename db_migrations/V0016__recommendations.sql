@@ -0,0 +1,19 @@
+-- Рекомендации по совместной активности: похожие вакансии и лента «для вас».
+-- Таблицы целиком пересчитывает офлайн-задача scripts/build_recommendations.py, функции только читают их.
+-- Без внешних ключей: пересчёт переписывает миллионы строк, а закрытые и удалённые вакансии
+-- отбрасываются при чтении соединением с vacancies
+CREATE TABLE IF NOT EXISTS vacancy_neighbors (
+    vacancy_id INTEGER NOT NULL,
+    rank SMALLINT NOT NULL,
+    neighbor_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (vacancy_id, rank)
+);
+
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id INTEGER NOT NULL,
+    rank SMALLINT NOT NULL,
+    vacancy_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (user_id, rank)
+);
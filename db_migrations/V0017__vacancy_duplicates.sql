@@ -0,0 +1,32 @@
+-- Почти одинаковые вакансии: MinHash-подписи текста и LSH-полосы для поиска кандидатов
+ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS duplicate_of INTEGER REFERENCES vacancies(id) ON DELETE SET NULL;
+
+-- Подписи только активных вакансий (64 корзины по 4 байта) считает функция vacancies при публикации;
+-- полосы — хеши групп по 4 корзины, GIN по ним находит вакансии, совпадающие хотя бы в одной полосе.
+-- Подписи вакансий из массового импорта, после правки текста и повторной публикации досчитывает
+-- scripts/dedupe_vacancies.py
+CREATE TABLE IF NOT EXISTS vacancy_signatures (
+    vacancy_id INTEGER PRIMARY KEY REFERENCES vacancies(id) ON DELETE CASCADE,
+    employer_id INTEGER NOT NULL,
+    minhash BYTEA NOT NULL,
+    bands BIGINT[] NOT NULL
+);
+
+-- Без отложенного списка вставок: его каждый поиск просматривает целиком, а публикация по одной вакансии
+-- и так дешёво пишет прямо в индекс
+CREATE INDEX IF NOT EXISTS idx_vacancy_signatures_bands ON vacancy_signatures USING gin (bands) WITH (fastupdate = off);
+
+-- Подпись изменённого текста больше не верна, а закрытая вакансия больше не кандидат в оригиналы
+CREATE OR REPLACE FUNCTION drop_vacancy_signature() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM vacancy_signatures WHERE vacancy_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS vacancies_signature_stale ON vacancies;
+CREATE TRIGGER vacancies_signature_stale AFTER UPDATE OF title, company, description, status ON vacancies
+    FOR EACH ROW
+    WHEN (OLD.title IS DISTINCT FROM NEW.title OR OLD.company IS DISTINCT FROM NEW.company
+          OR OLD.description IS DISTINCT FROM NEW.description OR NEW.status IS DISTINCT FROM 'active')
+    EXECUTE FUNCTION drop_vacancy_signature();
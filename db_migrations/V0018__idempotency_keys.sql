@@ -0,0 +1,14 @@
+-- Ответы на POST с заголовком Idempotency-Key: повтор запроса (ретрай мобильного клиента) получает сохранённый ответ
+-- без повторной записи в основные таблицы. Строка вставляется и заполняется в транзакции самого запроса,
+-- поэтому незавершённых ключей другие запросы не видят. Через сутки ключи удаляет очистка
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code SMALLINT,
+    response_body TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at);
@@ -0,0 +1,25 @@
+-- Контрольные точки задач scripts/maintenance.py: последний обработанный id фиксируется вместе с пачкой,
+-- прерванная задача продолжается с него. Параметры запуска сохраняются, чтобы не продолжить с другими
+CREATE TABLE IF NOT EXISTS maintenance_checkpoints (
+    job VARCHAR(50) PRIMARY KEY,
+    params JSONB NOT NULL DEFAULT '{}',
+    last_id BIGINT NOT NULL DEFAULT 0,
+    scanned BIGINT NOT NULL DEFAULT 0,
+    changed BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Теги без пробелов по краям, пустых и повторов без учёта регистра; порядок и написание — по первому вхождению
+CREATE OR REPLACE FUNCTION normalized_vacancy_tags(tags TEXT[]) RETURNS TEXT[] AS $$
+    SELECT ARRAY(
+        SELECT tag FROM (
+            SELECT DISTINCT ON (lower(btrim(t))) btrim(t) AS tag, position
+            FROM unnest(tags) WITH ORDINALITY AS u (t, position)
+            WHERE btrim(t) <> ''
+            ORDER BY lower(btrim(t)), position
+        ) first_spelling
+        ORDER BY position
+    )
+$$ LANGUAGE sql IMMUTABLE STRICT;
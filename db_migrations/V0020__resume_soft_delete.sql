@@ -0,0 +1,22 @@
+-- Мягкое удаление резюме: строка остаётся для откликов, которые на неё ссылаются, а опыт, образование и навыки
+-- удалённого резюме пачками удаляет очистка (children_purged_at — отметка, что они уже удалены)
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS children_purged_at TIMESTAMP;
+
+-- Выбор нового текущего резюме после удаления — только среди живых
+CREATE INDEX IF NOT EXISTS idx_resumes_user_live ON resumes (user_id, created_at DESC, id DESC) WHERE deleted_at IS NULL;
+-- Очередь очистки: удалённые резюме, дочерние строки которых ещё не удалены
+CREATE INDEX IF NOT EXISTS idx_resumes_children_pending ON resumes (id)
+    WHERE deleted_at IS NOT NULL AND children_purged_at IS NULL;
+
+-- Текущее резюме пользователя (последнее созданное из неудалённых): get_resume читает его по первичному ключу
+ALTER TABLE users ADD COLUMN IF NOT EXISTS current_resume_id INTEGER REFERENCES resumes(id) ON DELETE SET NULL;
+
+UPDATE users u
+SET current_resume_id = (
+    SELECT r.id FROM resumes r
+    WHERE r.user_id = u.id AND r.deleted_at IS NULL
+    ORDER BY r.created_at DESC, r.id DESC
+    LIMIT 1
+)
+WHERE u.current_resume_id IS NULL AND EXISTS (SELECT 1 FROM resumes r WHERE r.user_id = u.id);
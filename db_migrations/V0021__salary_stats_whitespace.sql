@@ -0,0 +1,53 @@
+-- salary_stats с той же нормализацией, что и normalize() в backend/salaries: пробельные символы схлопываются
+-- в один пробел и по краям обрезаются и в должности, и в городе (в V0007 город только обрезался, поэтому
+-- «Санкт-Петербург» с двойным пробелом не находился). Мягко удалённые резюме в выборку не входят
+DROP MATERIALIZED VIEW IF EXISTS salary_stats;
+
+CREATE MATERIALIZED VIEW salary_stats AS
+WITH salaries AS (
+    SELECT
+        'vacancy' AS source,
+        lower(trim(regexp_replace(title, '\s+', ' ', 'g'))) AS title_norm,
+        lower(trim(regexp_replace(COALESCE(location, ''), '\s+', ' ', 'g'))) AS location_norm,
+        COALESCE(employment_type, '') AS employment_type,
+        CASE
+            WHEN salary_min IS NOT NULL AND salary_max IS NOT NULL THEN (salary_min + salary_max) / 2.0
+            ELSE COALESCE(salary_min, salary_max)
+        END AS salary
+    FROM vacancies
+    WHERE COALESCE(salary_min, salary_max) IS NOT NULL
+      AND created_at > CURRENT_TIMESTAMP - INTERVAL '365 days'
+    UNION ALL
+    SELECT
+        'resume',
+        lower(trim(regexp_replace(position, '\s+', ' ', 'g'))),
+        lower(trim(regexp_replace(COALESCE(location, ''), '\s+', ' ', 'g'))),
+        '',
+        CASE
+            WHEN salary_min IS NOT NULL AND salary_max IS NOT NULL THEN (salary_min + salary_max) / 2.0
+            ELSE COALESCE(salary_min, salary_max)
+        END
+    FROM resumes
+    WHERE is_published AND deleted_at IS NULL AND position IS NOT NULL
+      AND COALESCE(salary_min, salary_max) IS NOT NULL
+)
+SELECT
+    source,
+    title_norm,
+    COALESCE(location_norm, '*') AS location_norm,
+    COALESCE(employment_type, '*') AS employment_type,
+    COUNT(*) AS samples,
+    percentile_cont(ARRAY[0.1, 0.25, 0.5, 0.75, 0.9]) WITHIN GROUP (ORDER BY salary) AS percentiles,
+    MIN(salary) AS salary_min,
+    MAX(salary) AS salary_max,
+    CURRENT_TIMESTAMP AS refreshed_at
+FROM salaries
+GROUP BY GROUPING SETS (
+    (source, title_norm, location_norm, employment_type),
+    (source, title_norm, location_norm),
+    (source, title_norm, employment_type),
+    (source, title_norm)
+);
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY и служит для поиска
+CREATE UNIQUE INDEX IF NOT EXISTS idx_salary_stats_key ON salary_stats(title_norm, location_norm, employment_type, source);
@@ -0,0 +1,130 @@
+"""Секционированная applications против обычной таблицы на запросах обработчика (только для отдельной тестовой БД!)"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import time
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+VACANCIES_PER_EMPLOYER = 20
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed(conn, rows: int, vacancies: int, applicants: int) -> dict:
+    """Пользователи, вакансии блоками по работодателям, rows откликов и их копия в обычной таблице;
+    у каждой вакансии разные соискатели, а отклики соискателя разбросаны по всем секциям"""
+    with conn.cursor() as cur:
+        employers = vacancies // VACANCIES_PER_EMPLOYER
+        cur.execute("""
+            INSERT INTO users (email, password_hash, full_name, user_type)
+            SELECT 'bench-part-' || g || '@example.com', '-', 'Bench ' || g, 'company'
+            FROM generate_series(1, %s) g
+            RETURNING id
+        """, (max(applicants, employers),))
+        user_ids = [row[0] for row in cur.fetchall()]
+        user_base = min(user_ids)
+        cur.execute("""
+            INSERT INTO vacancies (employer_id, title, company)
+            SELECT %s + (g - 1) / %s, 'Bench', 'Bench Co' FROM generate_series(1, %s) g
+            RETURNING id
+        """, (user_base, VACANCIES_PER_EMPLOYER, vacancies))
+        vacancy_base = min(row[0] for row in cur.fetchall())
+    conn.commit()
+
+    load('partitions').ensure_partitions(conn)
+
+    with conn.cursor() as cur:
+        started = time.perf_counter()
+        cur.execute("""
+            INSERT INTO applications (vacancy_id, applicant_id, status, created_at)
+            SELECT %(vacancy_base)s + g %% %(vacancies)s,
+                   %(user_base)s + (g / %(vacancies)s + (g %% %(vacancies)s) * 7) %% %(applicants)s,
+                   'pending', NOW() - (g %% 100000) * INTERVAL '1 minute'
+            FROM generate_series(0, %(rows)s - 1) g
+        """, {'vacancy_base': vacancy_base, 'vacancies': vacancies, 'user_base': user_base,
+              'applicants': applicants, 'rows': rows})
+        conn.commit()
+        print(f'applications (секции): {time.perf_counter() - started:8.1f} s')
+
+        started = time.perf_counter()
+        cur.execute('CREATE TABLE applications_heap (LIKE applications INCLUDING DEFAULTS)')
+        cur.execute('INSERT INTO applications_heap SELECT * FROM applications')
+        cur.execute('ALTER TABLE applications_heap ADD PRIMARY KEY (id)')
+        cur.execute('ALTER TABLE applications_heap ADD UNIQUE (vacancy_id, applicant_id)')
+        cur.execute('CREATE INDEX ON applications_heap (applicant_id)')
+        conn.commit()
+        print(f'applications_heap:     {time.perf_counter() - started:8.1f} s')
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute('VACUUM ANALYZE applications')
+        cur.execute('VACUUM ANALYZE applications_heap')
+    conn.autocommit = False
+    return {'user_base': user_base, 'vacancy_base': vacancy_base, 'employers': employers}
+
+
+def run(cur, name: str, sql: str, params_list: list) -> float:
+    """Медиана времени запроса в мс на общем (generic) плане подготовленного запроса"""
+    cur.execute(f'PREPARE {name} AS {sql}')
+    timings = []
+    for params in params_list:
+        started = time.perf_counter()
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    cur.execute(f'DEALLOCATE {name}')
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000000)
+    parser.add_argument('--vacancies', type=int, default=500000)
+    parser.add_argument('--applicants', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+    if args.rows > args.vacancies * args.applicants:
+        parser.error('rows не больше vacancies * applicants: пара (вакансия, соискатель) уникальна')
+
+    applications = load('applications')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    ids = seed(conn, args.rows, args.vacancies, args.applicants)
+
+    rnd = random.Random(39)
+    employer_ids = [ids['user_base'] + rnd.randrange(ids['employers']) for _ in range(args.samples)]
+    vacancy_params = [
+        (ids['vacancy_base'] + (employer - ids['user_base']) * VACANCIES_PER_EMPLOYER, employer)
+        for employer in employer_ids
+    ]
+    applicant_ids = [(ids['user_base'] + rnd.randrange(args.applicants),) for _ in range(args.samples)]
+    cases = (
+        ('applications_by_vacancy', vacancy_params),
+        ('applications_by_employer', [(employer,) for employer in employer_ids]),
+        ('applications_by_applicant', applicant_ids),
+    )
+
+    with conn.cursor() as cur:
+        cur.execute('SET plan_cache_mode = force_generic_plan')
+        print(f"{'запрос':28}{'секции, мс':>12}{'heap, мс':>12}")
+        for name, params_list in cases:
+            sql = applications.to_positional(applications.PREPARED_STATEMENTS[name])
+            partitioned = run(cur, 'bench_partitioned', sql, params_list)
+            heap = run(cur, 'bench_heap', sql.replace('FROM applications a', 'FROM applications_heap a'), params_list)
+            print(f'{name:28}{partitioned:12.2f}{heap:12.2f}')
+    conn.rollback()
+
+    with conn.cursor() as cur:
+        cur.execute('DROP TABLE applications_heap')
+    conn.commit()
+
+
+if __name__ == '__main__':
+    main()
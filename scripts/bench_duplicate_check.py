@@ -0,0 +1,147 @@
+"""Проверка дублей при публикации на большом каталоге: подпись MinHash и поиск кандидатов по LSH-полосам против
+сравнения подписи со всеми вакансиями; полнота на подмешанных перепубликациях и время пакетного режима.
+Всё выполняется в одной транзакции и откатывается, но запускать только на отдельной тестовой БД!"""
+import argparse
+import importlib.util
+import itertools
+import os
+import random
+import statistics
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+EMPLOYERS = 5000
+
+
+def load(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT_DIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vacancies', type=int, default=200_000, help='размер каталога')
+    parser.add_argument('--posts', type=int, default=2000, help='новых публикаций для проверки')
+    parser.add_argument('--scan-posts', type=int, default=20, help='публикаций для полного сравнения')
+    args = parser.parse_args()
+
+    vacancies = load('backend/vacancies/index.py', 'bench_vacancies')
+    dedupe = load('scripts/dedupe_vacancies.py', 'bench_dedupe')
+    rng = random.Random(1)
+    vocabulary = [f'слово{i}' for i in range(20_000)]
+    word_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    titles = [f'Должность {i}' for i in range(500)]
+
+    def fresh_vacancy(employer: int) -> tuple:
+        words = rng.choices(vocabulary, cum_weights=word_weights, k=rng.randint(60, 300))
+        return employer, rng.choice(titles), f'Компания {employer}', ' '.join(words)
+
+    def repost(source: tuple, employer: int) -> tuple:
+        """Перепубликация с правками: замена до 10% слов"""
+        words = source[3].split()
+        for _ in range(rng.randint(0, len(words) // 10)):
+            words[rng.randrange(len(words))] = rng.choices(vocabulary, cum_weights=word_weights)[0]
+        return employer, source[1], source[2], ' '.join(words)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        SELECT 'bench-dup-' || g || '@example.com', '-', 'Bench', 'company' FROM generate_series(1, %s) g
+        RETURNING id
+    """, (EMPLOYERS,))
+    employer_ids = [row['id'] for row in cur.fetchall()]
+
+    # Каталог: каждая десятая вакансия — перепубликация своей же, каждая пятидесятая — чужой (кадровое агентство)
+    catalogue = []
+    for i in range(args.vacancies):
+        if catalogue and i % 10 == 0:
+            source = rng.choice(catalogue)
+            catalogue.append(repost(source, source[0]))
+        elif catalogue and i % 50 == 1:
+            catalogue.append(repost(rng.choice(catalogue), rng.choice(employer_ids)))
+        else:
+            catalogue.append(fresh_vacancy(rng.choice(employer_ids)))
+    started = time.perf_counter()
+    signatures = [vacancies.minhash_signature(*vacancy[1:]) for vacancy in catalogue]
+    signature_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for offset in range(0, len(catalogue), 10_000):
+        chunk = catalogue[offset:offset + 10_000]
+        ids = execute_values(cur, """
+            INSERT INTO vacancies (employer_id, title, company, description) VALUES %s RETURNING id
+        """, chunk, page_size=len(chunk), fetch=True)
+        execute_values(cur, "INSERT INTO vacancy_signatures (vacancy_id, employer_id, minhash, bands) VALUES %s", [
+            (row['id'], vacancy[0], signature, vacancies.lsh_bands(signature))
+            for row, vacancy, signature in zip(ids, chunk, signatures[offset:offset + 10_000])
+        ], page_size=len(chunk))
+    cur.execute('ANALYZE vacancies')
+    cur.execute('ANALYZE vacancy_signatures')
+    print(f'каталог: {args.vacancies} вакансий, загрузка {time.perf_counter() - started:.1f} с; '
+          f'подпись {signature_seconds * 1e6 / args.vacancies:.0f} мкс на вакансию')
+
+    # Поток публикаций: половина — перепубликации из каталога
+    posts = []
+    for i in range(args.posts):
+        if i % 2:
+            source = rng.choice(catalogue)
+            posts.append((repost(source, source[0]), source))
+        else:
+            posts.append((fresh_vacancy(rng.choice(employer_ids)), None))
+
+    timings, found = [], []
+    for post, _ in posts:
+        employer, title, company, description = post
+        started = time.perf_counter()
+        signature = vacancies.minhash_signature(title, company, description)
+        duplicates = vacancies.find_duplicates(cur, employer, signature, vacancies.lsh_bands(signature))
+        timings.append((time.perf_counter() - started) * 1000)
+        found.append(bool(duplicates))
+
+    # Полнота против точного коэффициента Жаккара с исходной вакансией
+    expected = hits = false_alarms = 0
+    for (post, source), flagged in zip(posts, found):
+        if source is None:
+            false_alarms += flagged
+            continue
+        first, second = vacancies.vacancy_shingles(*post[1:]), vacancies.vacancy_shingles(*source[1:])
+        if len(first & second) / len(first | second) >= vacancies.EMPLOYER_DUPLICATE_SIMILARITY:
+            expected += 1
+            hits += flagged
+    print(f'подпись + LSH: p50 {statistics.median(timings):.2f} мс, p95 {percentile(timings, 0.95):.2f} мс; '
+          f'найдено {hits} из {expected} перепубликаций с J >= {vacancies.EMPLOYER_DUPLICATE_SIMILARITY}, '
+          f'ложных срабатываний {false_alarms} из {args.posts - args.posts // 2}')
+
+    # Без LSH: подпись сравнивается с подписями всех активных вакансий
+    timings = []
+    for post, _ in posts[:args.scan_posts]:
+        started = time.perf_counter()
+        signature = vacancies.minhash_signature(*post[1:])
+        cur.execute("SELECT vacancy_id, minhash FROM vacancy_signatures")
+        [row for row in cur.fetchall()
+         if vacancies.signature_similarity(signature, bytes(row['minhash'])) >= vacancies.EMPLOYER_DUPLICATE_SIMILARITY]
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f'сравнение со всеми подписями: p50 {statistics.median(timings):.0f} мс')
+
+    started = time.perf_counter()
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as plain:
+        originals = dedupe.find_groups(plain, vacancies)
+    print(f'пакетный режим: {len(originals)} дублей в {len(set(originals.values()))} группах '
+          f'за {time.perf_counter() - started:.1f} с')
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Поиск вакансий в радиусе на большом каталоге: полный перебор с earth_distance против запроса vacancies
+(ближайшие места по GiST-индексу справочника + свежие вакансии каждого места), плюс цена триггера геокодирования.
+Всё выполняется в одной транзакции и откатывается, но запускать только на отдельной тестовой БД!"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import time
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+RADII_KM = (10, 30, 100, 300)
+
+# Без индекса: расстояние считается для каждой активной вакансии
+FULL_SCAN = """
+    SELECT v.id, earth_distance(ll_to_earth(%(lat)s, %(lon)s), ll_to_earth(v.latitude, v.longitude)) AS distance
+    FROM vacancies v
+    WHERE v.status = 'active' AND v.latitude IS NOT NULL AND (v.expires_at IS NULL OR v.expires_at > NOW())
+      AND earth_distance(ll_to_earth(%(lat)s, %(lon)s), ll_to_earth(v.latitude, v.longitude)) <= %(radius)s
+    ORDER BY distance, v.created_at DESC
+    LIMIT %(limit)s
+"""
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run_queries(cur, sql: str, centers: list, radius_km: float, limit: int, positional: bool) -> tuple:
+    """Время каждого запроса, мс, и среднее число найденных вакансий"""
+    timings, found = [], []
+    for lat, lon in centers:
+        started = time.perf_counter()
+        if positional:
+            cur.execute(sql, (lat, lon, radius_km * 1000, limit, limit))
+        else:
+            cur.execute(sql, {'lat': lat, 'lon': lon, 'radius': radius_km * 1000, 'limit': limit})
+        found.append(len(cur.fetchall()))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, statistics.mean(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vacancies', type=int, default=1_000_000, help='размер каталога')
+    parser.add_argument('--queries', type=int, default=200, help='запросов на радиус')
+    parser.add_argument('--scan-queries', type=int, default=10, help='запросов на радиус для полного перебора')
+    args = parser.parse_args()
+
+    vacancies = load('vacancies')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        VALUES ('bench-geo@example.com', '-', 'Bench', 'company')
+        ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+        RETURNING id
+    """)
+    employer_id = cur.fetchone()[0]
+    cur.execute('SELECT name, latitude, longitude, population FROM geo_places')
+    places = cur.fetchall()
+    if not places:
+        raise SystemExit('geo_places пуст: примените миграции или загрузите справочник')
+
+    # Города вакансий — пропорционально населению, каждая десятая — без распознаваемого города
+    rng = random.Random(1)
+    locations = rng.choices([name for name, _, _, _ in places], weights=[p for _, _, _, p in places], k=args.vacancies)
+    locations = [location if i % 10 else 'Удалённо' for i, location in enumerate(locations)]
+    insert_sql = """
+        INSERT INTO vacancies (employer_id, title, company, location, description, tags, created_at)
+        SELECT %s, 'Вакансия ' || g, 'Компания ' || (g %% 5000), l.location, 'Описание', ARRAY['bench'],
+               NOW() - (g %% 100000) * INTERVAL '1 minute'
+        FROM unnest(%s::text[]) WITH ORDINALITY AS l (location, g)
+    """
+    sample = locations[:min(len(locations), 100_000)]
+    for label, enabled in (('без геокодирования', False), ('с геокодированием', True)):
+        cur.execute('SAVEPOINT bench_insert')
+        cur.execute(f"ALTER TABLE vacancies {'ENABLE' if enabled else 'DISABLE'} TRIGGER vacancies_geocode")
+        started = time.perf_counter()
+        cur.execute(insert_sql, (employer_id, sample))
+        print(f'вставка {len(sample)} вакансий {label}: {(time.perf_counter() - started) * 1000:.0f} мс')
+        cur.execute('ROLLBACK TO SAVEPOINT bench_insert')
+
+    started = time.perf_counter()
+    for offset in range(0, len(locations), 100_000):
+        cur.execute(insert_sql, (employer_id, locations[offset:offset + 100_000]))
+    cur.execute('ANALYZE vacancies')
+    print(f'каталог: {args.vacancies} вакансий, загрузка {time.perf_counter() - started:.1f} с')
+
+    # Центры поиска — города каталога (как при выборе города в фильтре) со случайным смещением до ~20 км
+    centers = [(lat + rng.uniform(-0.2, 0.2), lon + rng.uniform(-0.3, 0.3))
+               for _, lat, lon, _ in rng.choices(places, weights=[p for _, _, _, p in places], k=args.queries)]
+
+    print(f'{"радиус":>8}{"вариант":>22}{"найдено":>10}{"p50, мс":>10}{"p95, мс":>10}')
+    for radius_km in RADII_KM:
+        cur.execute('SET enable_indexscan = off')
+        cur.execute('SET enable_bitmapscan = off')
+        timings, found = run_queries(cur, FULL_SCAN, centers[:args.scan_queries], radius_km,
+                                     vacancies.NEARBY_LIMIT, positional=False)
+        cur.execute('RESET enable_indexscan')
+        cur.execute('RESET enable_bitmapscan')
+        print(f'{radius_km:>6}км{"полный перебор":>22}{found:10.0f}{statistics.median(timings):10.1f}'
+              f'{percentile(timings, 0.95):10.1f}')
+        timings, found = run_queries(cur, vacancies.PREPARED_STATEMENTS['vacancy_list_nearby'], centers, radius_km,
+                                     vacancies.NEARBY_LIMIT, positional=True)
+        print(f'{radius_km:>6}км{"места + индекс":>22}{found:10.0f}{statistics.median(timings):10.1f}'
+              f'{percentile(timings, 0.95):10.1f}')
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
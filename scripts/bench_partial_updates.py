@@ -0,0 +1,111 @@
+"""Усиление записи: полный PUT против PATCH одного поля для вакансий и резюме (только для отдельной тестовой БД!)"""
+import argparse
+import base64
+import importlib.util
+import os
+import time
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Тот же запрос, что в PUT backend/vacancies: переписывает все колонки
+VACANCY_PUT = """
+    UPDATE vacancies SET
+        title = %s, company = %s, location = %s, salary_min = %s, salary_max = %s,
+        employment_type = %s, experience = %s, description = %s, requirements = %s,
+        tags = %s, status = %s, version = version + 1, content_hash = NULL,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s
+"""
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def wal_lsn(conn) -> str:
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_current_wal_lsn()')
+        lsn = cur.fetchone()[0]
+    conn.commit()
+    return lsn
+
+
+def measure(conn, label: str, runs: int, operation):
+    """Время и байты WAL на одну операцию"""
+    start_lsn = wal_lsn(conn)
+    started = time.perf_counter()
+    for i in range(runs):
+        operation(i)
+    elapsed = time.perf_counter() - started
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)', (start_lsn,))
+        wal = float(cur.fetchone()[0])
+    conn.commit()
+    print(f'{label:28}{elapsed / runs * 1000:8.2f} ms/оп  {wal / runs / 1024:8.1f} KB WAL/оп')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=500)
+    parser.add_argument('--description-kb', type=int, default=8, help='размер несжимаемого описания (уходит в TOAST)')
+    parser.add_argument('--children', type=int, default=5, help='записей опыта, образования и навыков в резюме')
+    args = parser.parse_args()
+
+    vacancies = load('vacancies')
+    resumes = load('resumes')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    description = base64.b64encode(os.urandom(args.description_kb * 768)).decode()
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO users (email, password_hash, full_name, user_type)
+            VALUES ('bench-patch@example.com', '-', 'Bench', 'company')
+            ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+            RETURNING id
+        """)
+        user_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO vacancies (employer_id, title, company, location, description, requirements, tags)
+            VALUES (%s, 'Bench', 'Bench Co', 'City', %s, %s, ARRAY['python', 'sql'])
+            RETURNING id
+        """, (user_id, description, description))
+        vacancy_id = cur.fetchone()[0]
+    conn.commit()
+
+    vacancy = ('Bench', 'Bench Co', 'City', None, None, None, None, description, description, ['python', 'sql'], 'active')
+    with conn.cursor() as cur:
+        measure(conn, 'vacancy PUT (все поля)', args.runs, lambda i: (
+            cur.execute(VACANCY_PUT, vacancy[:3] + (i,) + vacancy[4:] + (vacancy_id,)), conn.commit()))
+        patch_sql = vacancies.build_vacancy_patch(('salary_min',))
+        measure(conn, 'vacancy PATCH salary_min', args.runs, lambda i: (
+            cur.execute(patch_sql, (i, vacancy_id, user_id, None, None)), conn.commit()))
+
+    user = {'id': user_id, 'full_name': 'Bench', 'email': 'bench-patch@example.com'}
+    children = {
+        'experience': [{'company': f'C{i}', 'position': 'Dev', 'start_date': '2020-01-01', 'description': 'x' * 500}
+                       for i in range(args.children)],
+        'education': [{'institution': f'U{i}', 'degree': 'BSc', 'start_date': '2015-09-01'} for i in range(args.children)],
+        'skills': [{'skill_name': f'skill{i}', 'skill_level': 'senior'} for i in range(args.children)],
+    }
+    resume = {'title': 'CV', 'full_name': 'Bench', 'email': 'bench-patch@example.com', 'about_me': description, **children}
+    resume_id = resumes.json.loads(resumes.create_resume(user, resume)['body'])['resume_id']
+
+    measure(conn, 'resume PUT (все поля)', args.runs,
+            lambda i: resumes.update_resume(user, dict(resume, id=resume_id, salary_min=i)))
+    measure(conn, 'resume PATCH salary_min', args.runs,
+            lambda i: resumes.patch_resume(user, {'id': resume_id, 'salary_min': i}))
+
+    with conn.cursor() as cur:
+        for table in ('resume_experience', 'resume_education', 'resume_skills'):
+            cur.execute(f'DELETE FROM {table} WHERE resume_id = %s', (resume_id,))
+        cur.execute('DELETE FROM resumes WHERE id = %s', (resume_id,))
+        cur.execute('DELETE FROM vacancies WHERE id = %s', (vacancy_id,))
+    conn.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Пропускная способность проверки паролей при конкурентных входах с разной стоимостью PBKDF2"""
+import argparse
+import importlib.util
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+AUTH_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'auth', 'index.py')
+
+
+def load_auth(iterations: int, workers: int, max_pending: int):
+    """Загрузка auth/index.py с заданными параметрами пула хеширования"""
+    os.environ['PASSWORD_HASH_ITERATIONS'] = str(iterations)
+    os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+    os.environ['PASSWORD_HASH_MAX_PENDING'] = str(max_pending)
+    spec = importlib.util.spec_from_file_location(f'auth_{iterations}_{workers}', AUTH_INDEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench(auth, clients: int, logins: int) -> dict:
+    """clients параллельных клиентов выполняют logins проверок пароля через пул"""
+    stored = auth.hash_password('correct horse battery staple')
+    latencies = []
+    rejected = 0
+
+    def attempt(_):
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            auth.run_password_task(auth.check_password, 'correct horse battery staple', stored)
+        except auth.PasswordHasherBusy:
+            rejected += 1
+            return
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as clients_pool:
+        list(clients_pool.map(attempt, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'logins_per_sec': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+        'rejected': rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 260000, 600000])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--max-pending', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f'workers={args.workers} max_pending={args.max_pending} (только хеширование, без БД)')
+    print(f"{'iterations':>10} {'clients':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'rejected':>8}")
+    for iterations in args.iterations:
+        auth = load_auth(iterations, args.workers, args.max_pending)
+        for clients in args.clients:
+            r = bench(auth, clients, args.logins)
+            print(f"{iterations:>10} {clients:>7} {r['logins_per_sec']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['rejected']:>8}")
+
+
+if __name__ == '__main__':
+    main()
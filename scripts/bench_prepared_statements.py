@@ -0,0 +1,61 @@
+"""Сравнение пропускной способности функции с реестром PREPARE и без него"""
+import argparse
+import importlib.util
+import json
+import os
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def load_function(name: str, prepared: bool):
+    """Свежая загрузка index.py функции с нужным режимом DB_PREPARED_STATEMENTS"""
+    os.environ['DB_PREPARED_STATEMENTS'] = '1' if prepared else '0'
+    spec = importlib.util.spec_from_file_location(f'{name}_{prepared}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(module, event: dict, requests: int) -> float:
+    """Последовательные вызовы handler, возвращает запросов в секунду"""
+    module.handler(event, None)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = module.handler(event, None)
+        if response['statusCode'] >= 500:
+            raise RuntimeError(response['body'])
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('function', help='имя функции, например vacancies')
+    parser.add_argument('--query', action='append', default=[], help='параметр запроса key=value')
+    parser.add_argument('--session-token', help='токен сессии для функций с авторизацией')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('нужна переменная окружения DATABASE_URL')
+
+    headers = {}
+    if args.session_token:
+        headers = {'X-Session-Token': args.session_token, 'X-Authorization': f'Bearer {args.session_token}'}
+    event = {
+        'httpMethod': 'GET',
+        'headers': headers,
+        'queryStringParameters': dict(q.split('=', 1) for q in args.query) or None,
+    }
+
+    plain_rps = run(load_function(args.function, prepared=False), event, args.requests)
+    prepared_module = load_function(args.function, prepared=True)
+    prepared_rps = run(prepared_module, event, args.requests)
+
+    print(f'без PREPARE:  {plain_rps:8.0f} req/s')
+    print(f'с PREPARE:    {prepared_rps:8.0f} req/s ({(prepared_rps / plain_rps - 1) * 100:+.1f}%)')
+    print(json.dumps(prepared_module.get_statement_stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
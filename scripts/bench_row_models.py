@@ -0,0 +1,113 @@
+"""Выдача списка вакансий: RealDictCursor + dict(row) + json.dumps(default=str) против namedtuple-строк
+и скомпилированного сериализатора (только для отдельной тестовой БД!)"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import time
+import tracemalloc
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+QUERY = """
+    SELECT v.*, u.full_name as employer_name
+    FROM vacancies v
+    JOIN users u ON v.employer_id = u.id
+    WHERE v.employer_id = %s
+    ORDER BY v.created_at DESC
+"""
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def dict_path(conn, employer_id: int):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(QUERY, (employer_id,))
+        rows = cur.fetchall()
+    return rows, lambda: json.dumps([dict(v) for v in rows], ensure_ascii=False, default=str)
+
+
+def row_model_path(vacancies, conn, employer_id: int):
+    with vacancies.open_row_cursor(conn) as cur:
+        cur.execute(QUERY, (employer_id,))
+        rows = cur.fetchall()
+        serialize = vacancies.row_serializer(cur)
+    return rows, lambda: '[' + ','.join(map(serialize, rows)) + ']'
+
+
+def measure(label: str, rows_count: int, fetch, runs: int):
+    """Время выборки/кодирования (лучший из прогонов), затем отдельным прогоном под tracemalloc —
+    память под строки результата и пик при кодировании"""
+    fetch_ms, encode_ms = [], []
+    for _ in range(runs):
+        gc.collect()
+        started = time.perf_counter()
+        rows, encode = fetch()
+        fetch_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        body = encode()
+        encode_ms.append((time.perf_counter() - started) * 1000)
+        del rows, encode, body
+
+    gc.collect()
+    tracemalloc.start()
+    rows, encode = fetch()
+    rows_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    body = encode()
+    peak_bytes = tracemalloc.get_traced_memory()[1] - rows_bytes
+    tracemalloc.stop()
+    del rows, encode, body
+
+    scale = 100_000 / rows_count
+    print(f'{label:22}{rows_bytes * scale / 2**20:10.1f} MB{peak_bytes * scale / 2**20:12.1f} MB'
+          f'{min(fetch_ms) * scale:12.0f} ms{min(encode_ms) * scale:12.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    vacancies = load('vacancies')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO users (email, password_hash, full_name, user_type)
+            VALUES ('bench-rows@example.com', '-', 'Bench', 'company')
+            ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+            RETURNING id
+        """)
+        employer_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO vacancies (employer_id, title, company, location, salary_min, salary_max,
+                                   employment_type, experience, description, requirements, tags)
+            SELECT %s, 'Python-разработчик ' || g, 'ООО Бенч', 'Москва', 100000 + g %% 1000, 200000,
+                   'full', '3-6', repeat('Описание вакансии. ', 20), 'Python, SQL', ARRAY['python', 'sql']
+            FROM generate_series(1, %s) g
+        """, (employer_id, args.rows))
+    conn.commit()
+
+    try:
+        print(f'на 100k строк:        {"строки":>13}{"пик кодир.":>15}{"выборка":>15}{"кодирование":>15}')
+        measure('dict + default=str', args.rows, lambda: dict_path(conn, employer_id), args.runs)
+        measure('namedtuple + сериал.', args.rows, lambda: row_model_path(vacancies, conn, employer_id), args.runs)
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('DELETE FROM vacancies WHERE employer_id = %s', (employer_id,))
+        conn.commit()
+
+
+if __name__ == '__main__':
+    main()
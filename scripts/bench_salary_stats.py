@@ -0,0 +1,71 @@
+"""Стоимость обновления salary_stats на синтетических данных (только для отдельной тестовой БД!)"""
+import argparse
+import os
+import time
+import psycopg2
+
+TITLES = 2000
+LOCATIONS = 50
+EMPLOYMENT_TYPES = ('full', 'part', 'contract', 'remote')
+
+
+def seed(cur, rows: int):
+    """Синтетические вакансии и резюме: rows строк в каждой таблице"""
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        VALUES ('bench-salary@example.com', '-', 'Bench', 'company')
+        ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+        RETURNING id
+    """)
+    user_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO vacancies (employer_id, title, company, location, salary_min, salary_max, employment_type)
+        SELECT %s, 'Position ' || (g %% %s), 'Company', 'City ' || (g %% %s),
+               50000 + (random() * 100000)::int, 150000 + (random() * 150000)::int,
+               (%s::text[])[1 + g %% %s]
+        FROM generate_series(1, %s) g
+    """, (user_id, TITLES, LOCATIONS, list(EMPLOYMENT_TYPES), len(EMPLOYMENT_TYPES), rows))
+    cur.execute("""
+        INSERT INTO resumes (user_id, title, full_name, email, location, position, salary_min, is_published)
+        SELECT %s, 'CV', 'Bench', 'bench@example.com', 'City ' || (g %% %s), 'Position ' || (g %% %s),
+               60000 + (random() * 200000)::int, true
+        FROM generate_series(1, %s) g
+    """, (user_id, LOCATIONS, TITLES, rows))
+
+
+def timed(cur, sql: str, params=None) -> float:
+    started = time.perf_counter()
+    cur.execute(sql, params)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000, help='строк в vacancies и в resumes')
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed(cur, args.rows)
+            cur.execute('ANALYZE vacancies; ANALYZE resumes')
+            print(f'seed {args.rows} + {args.rows} строк: {time.perf_counter() - started:.1f} s')
+
+        print(f'REFRESH:              {timed(cur, "REFRESH MATERIALIZED VIEW salary_stats"):10.0f} ms')
+        print(f'REFRESH CONCURRENTLY: {timed(cur, "REFRESH MATERIALIZED VIEW CONCURRENTLY salary_stats"):10.0f} ms')
+        cur.execute('SELECT COUNT(*) FROM salary_stats')
+        print(f'строк в salary_stats: {cur.fetchone()[0]}')
+
+        lookups = [timed(cur, """
+            SELECT * FROM salary_stats
+            WHERE title_norm = %s AND grouping_level = 1 AND location_norm = %s AND employment_type IS NULL
+        """, (f'position {i % TITLES}', f'city {i % LOCATIONS}')) for i in range(1000)]
+        lookups.sort()
+        print(f'запрос сводки: p50 {lookups[500]:.2f} ms, p99 {lookups[990]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
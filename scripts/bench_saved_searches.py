@@ -0,0 +1,140 @@
+"""Сопоставление потока новых вакансий с большим числом сохранённых поисков: пакетный match_saved_searches
+по инвертированному индексу термов против проверки каждого поиска для каждой вакансии.
+Всё выполняется в одной транзакции и откатывается, но запускать только на отдельной тестовой БД!"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import time
+import psycopg2
+
+SEARCH_USERS = 100_000
+
+
+def cumulative(weights) -> list:
+    return list(itertools.accumulate(weights))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--searches', type=int, default=1_000_000)
+    parser.add_argument('--catalogue', type=int, default=50_000, help='уже опубликованные вакансии (частоты тегов)')
+    parser.add_argument('--vacancies', type=int, default=1000, help='поток новых вакансий')
+    parser.add_argument('--batch-size', type=int, default=50, help='как ALERT_MATCH_BATCH_SIZE в cleanup')
+    parser.add_argument('--tags', type=int, default=5000, help='размер словаря тегов')
+    parser.add_argument('--naive-vacancies', type=int, default=10, help='вакансий для полного перебора поисков')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    rng = random.Random(1)
+    vocabulary = [f'tag{i}' for i in range(args.tags)]
+    tag_weights = cumulative(1 / rank for rank in range(1, args.tags + 1))
+    cur.execute('SELECT name, population FROM geo_places')
+    places = cur.fetchall()
+    cities = [name for name, _ in places]
+    city_weights = cumulative(population for _, population in places)
+
+    def random_city():
+        return rng.choices(cities, cum_weights=city_weights)[0]
+
+    def random_tags(k: int) -> list:
+        return sorted(set(rng.choices(vocabulary, cum_weights=tag_weights, k=k)))
+
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        SELECT 'bench-search-' || g || '@example.com', '-', 'Bench', 'candidate' FROM generate_series(1, %s) g
+        RETURNING id
+    """, (SEARCH_USERS,))
+    user_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        VALUES ('bench-search-employer@example.com', '-', 'Bench', 'company')
+        RETURNING id
+    """)
+    employer_id = cur.fetchone()[0]
+
+    # Каталог до появления поисков: по нему считаются частоты тегов, от которых зависит выбор терма поиска
+    cur.execute("""
+        INSERT INTO vacancies (employer_id, title, company, location, description, tags)
+        SELECT %s, 'Вакансия', 'Компания', c.location, 'Описание', c.tags::text[]
+        FROM unnest(%s::text[], %s::text[]) AS c (location, tags)
+    """, (employer_id, [random_city() for _ in range(args.catalogue)],
+          ['{' + ','.join(random_tags(rng.randint(3, 6))) + '}' for _ in range(args.catalogue)]))
+    cur.execute('DELETE FROM saved_search_queue')
+    cur.execute('ANALYZE vacancy_suggestions')
+
+    # Поиски: 1-3 тега (один тег — всегда с городом), у трети ещё город, у трети нижняя граница зарплаты;
+    # изредка — только город
+    started = time.perf_counter()
+    for offset in range(0, args.searches, 100_000):
+        rows = []
+        for _ in range(min(100_000, args.searches - offset)):
+            tags = random_tags(rng.choice((1, 2, 2, 3)))
+            location = random_city() if len(tags) == 1 or rng.random() < 0.33 else None
+            if rng.random() < 0.002:
+                tags, location = [], random_city()
+            salary_min = rng.randrange(50_000, 400_000, 10_000) if rng.random() < 0.33 else None
+            rows.append((rng.choice(user_ids), '{' + ','.join(tags) + '}', location, salary_min))
+        cur.execute("""
+            INSERT INTO saved_searches (user_id, tags, location, place_id, salary_min)
+            SELECT r.user_id, r.tags::text[], r.location, g.place_id, r.salary_min
+            FROM unnest(%s::int[], %s::text[], %s::text[], %s::int[]) AS r (user_id, tags, location, salary_min)
+            LEFT JOIN LATERAL geocode_place(r.location) g ON true
+        """, tuple(map(list, zip(*rows))))
+    cur.execute('ANALYZE saved_searches')
+    cur.execute('ANALYZE saved_search_terms')
+    print(f'сохранённых поисков: {args.searches}, загрузка {time.perf_counter() - started:.1f} с')
+
+    # Поток вакансий: по одной на INSERT, как из POST /vacancies
+    started = time.perf_counter()
+    for _ in range(args.vacancies):
+        salary = rng.randrange(50_000, 500_000, 10_000)
+        cur.execute("""
+            INSERT INTO vacancies (employer_id, title, company, location, salary_min, salary_max, description, tags)
+            VALUES (%s, 'Вакансия', 'Компания', %s, %s, %s, 'Описание', %s)
+        """, (employer_id, random_city(), salary, salary + 50_000, random_tags(rng.randint(3, 6))))
+    insert_ms = (time.perf_counter() - started) * 1000
+    cur.execute('ANALYZE vacancies')
+    print(f'вставка {args.vacancies} вакансий по одной: {insert_ms / args.vacancies:.2f} мс на вакансию')
+
+    cur.execute('SELECT vacancy_id FROM saved_search_queue ORDER BY vacancy_id LIMIT %s', (args.naive_vacancies,))
+    sample = [row[0] for row in cur.fetchall()]
+
+    batch_ms = []
+    started = time.perf_counter()
+    while True:
+        batch_started = time.perf_counter()
+        cur.execute('SELECT * FROM match_saved_searches(%s)', (args.batch_size,))
+        if not cur.rowcount:
+            break
+        batch_ms.append((time.perf_counter() - batch_started) * 1000)
+    total_seconds = time.perf_counter() - started
+    cur.execute('SELECT COUNT(*) FROM saved_search_outbox')
+    matches = cur.fetchone()[0]
+    print(f'пакетное сопоставление: {len(batch_ms)} пачек по {args.batch_size}, p50 {statistics.median(batch_ms):.0f} мс, '
+          f'{args.vacancies / total_seconds:.0f} вакансий/с, совпадений {matches} '
+          f'({total_seconds * 1000 / args.vacancies:.2f} мс на вакансию)')
+
+    # Как без индекса: каждый поиск проверяется для каждой вакансии
+    timings = []
+    for vacancy_id in sample:
+        started = time.perf_counter()
+        cur.execute("""
+            SELECT s.id
+            FROM vacancies v
+            CROSS JOIN LATERAL vacancy_alert_fields(v) AS f
+            CROSS JOIN saved_searches s
+            WHERE v.id = %s AND s.user_id <> v.employer_id AND saved_search_matches(s, v, f.tags, f.location_norm)
+        """, (vacancy_id,))
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f'перебор всех поисков: {statistics.median(timings):.0f} мс на вакансию')
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Задержка подсказок (backend/suggest) на большом синтетическом словаре и цена триггера при вставке вакансий.
+Всё выполняется в одной транзакции и откатывается, но запускать только на отдельной тестовой БД!"""
+import argparse
+import importlib.util
+import io
+import itertools
+import os
+import random
+import statistics
+import time
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+SYLLABLES = ('ра', 'бо', 'тчик', 'ме', 'нед', 'жер', 'ана', 'ли', 'тик', 'про', 'дав', 'ец', 'ин', 'же', 'нер',
+             'во', 'ди', 'тель', 'ку', 'рьер', 'ад', 'мин', 'ис', 'тра', 'тор', 'бух', 'гал', 'тер', 'зай', 'тон',
+             'py', 'ja', 'va', 'go', 'sql', 'ops', 'dev', 'qa', 'lead', 'data')
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_vocabulary(size: int) -> list:
+    """Уникальные значения из слов-слогов; частоты по закону Ципфа в перемешанном порядке"""
+    words = [''.join(parts) for n in (2, 3) for parts in itertools.product(SYLLABLES, repeat=n)]
+    random.Random(1).shuffle(words)
+    ranks = list(range(1, size + 1))
+    random.Random(2).shuffle(ranks)
+    vocabulary = []
+    for i in range(size):
+        first, second = words[i % len(words)], i // len(words)
+        value = first.capitalize() + (f' {words[second]}' if second else '')
+        vocabulary.append((('title', 'company', 'location', 'tag')[i % 4], value, 1 + int(100_000 / ranks[i] ** 1.1)))
+    return vocabulary
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vocabulary', type=int, default=1_000_000, help='различных значений в словаре')
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--vacancies', type=int, default=10_000, help='вставка для замера цены триггера')
+    args = parser.parse_args()
+
+    suggest = load('suggest')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    vocabulary = build_vocabulary(args.vocabulary)
+    buffer = io.StringIO(''.join(f'{field}\t{value.lower()}\t{value}\t{frequency}\n' for field, value, frequency in vocabulary))
+    started = time.perf_counter()
+    cur.copy_expert('COPY vacancy_suggestions (field, value_norm, value, frequency) FROM STDIN', buffer)
+    # Без VACUUM (он не работает в транзакции) новые строки остаются в списках ожидания GIN — переносим их в индекс
+    cur.execute("""
+        SELECT gin_clean_pending_list(c.oid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_am a ON a.oid = c.relam
+        WHERE i.indrelid = 'vacancy_suggestions'::regclass AND a.amname = 'gin'
+    """)
+    cur.execute('ANALYZE vacancy_suggestions')
+    print(f'словарь: {args.vocabulary} значений, загрузка {time.perf_counter() - started:.1f} с')
+
+    # Запросы — набор префиксов популярных значений, как при посимвольном вводе
+    weighted = random.Random(3).choices(vocabulary, weights=[frequency for _, _, frequency in vocabulary], k=args.queries)
+    rng = random.Random(4)
+    timings = {}
+    for field, value, _ in weighted:
+        query = value[:rng.randint(1, min(len(value), 12))].lower()
+        started = time.perf_counter()
+        # Те же запросы, что в suggest.suggest(), но на этом подключении — словарь виден только в транзакции
+        params = {'field': field, 'query': query, 'pattern': suggest.escape_like(query), 'limit': suggest.DEFAULT_LIMIT}
+        cur.execute(suggest.SUGGEST_PREFIX, params)
+        rows = cur.fetchall()
+        if len(rows) < suggest.DEFAULT_LIMIT and len(query) >= suggest.MIN_INFIX_LENGTH:
+            cur.execute(suggest.SUGGEST_INFIX, dict(params, limit=suggest.DEFAULT_LIMIT - len(rows)))
+            cur.fetchall()
+        bucket = '1' if len(query) == 1 else '2' if len(query) == 2 else '3-4' if len(query) <= 4 else '5+'
+        timings.setdefault(bucket, []).append((time.perf_counter() - started) * 1000)
+
+    print(f'{"длина префикса":16}{"запросов":>10}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}')
+    for bucket in ('1', '2', '3-4', '5+'):
+        values = timings.get(bucket, [])
+        if values:
+            print(f'{bucket:16}{len(values):10}{statistics.median(values):10.2f}'
+                  f'{percentile(values, 0.95):10.2f}{percentile(values, 0.99):10.2f}')
+    everything = [t for values in timings.values() for t in values]
+    print(f'{"все":16}{len(everything):10}{statistics.median(everything):10.2f}'
+          f'{percentile(everything, 0.95):10.2f}{percentile(everything, 0.99):10.2f}')
+
+    # Цена поддержки частот: одна массовая вставка вакансий с триггером и без
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, user_type)
+        VALUES ('bench-suggest@example.com', '-', 'Bench', 'company')
+        ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+        RETURNING id
+    """)
+    employer_id = cur.fetchone()[0]
+    insert_sql = """
+        INSERT INTO vacancies (employer_id, title, company, location, tags)
+        SELECT %s, 'Разработчик ' || (g %% 500), 'Компания ' || (g %% 2000), 'Город ' || (g %% 300),
+               ARRAY['тег' || (g %% 100), 'тег' || (g %% 37)]
+        FROM generate_series(1, %s) g
+    """
+    for label, enabled in (('без триггера', False), ('с триггером', True)):
+        cur.execute('SAVEPOINT bench_insert')
+        cur.execute(f"ALTER TABLE vacancies {'ENABLE' if enabled else 'DISABLE'} TRIGGER vacancy_suggestions_insert")
+        started = time.perf_counter()
+        cur.execute(insert_sql, (employer_id, args.vacancies))
+        print(f'вставка {args.vacancies} вакансий {label}: {(time.perf_counter() - started) * 1000:.0f} мс')
+        cur.execute('ROLLBACK TO SAVEPOINT bench_insert')
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
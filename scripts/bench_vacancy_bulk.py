@@ -0,0 +1,106 @@
+"""Массовый импорт, синхронизация и экспорт вакансий против построчных INSERT (только для отдельной тестовой БД!)"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import time
+
+BULK_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'vacancies-bulk', 'index.py')
+
+
+def load_bulk():
+    """Импорт backend/vacancies-bulk/index.py (в имени каталога дефис)"""
+    spec = importlib.util.spec_from_file_location('vacancies_bulk', BULK_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_ndjson(rows: int) -> str:
+    return ''.join(
+        json.dumps({
+            'external_id': f'bench-{i}', 'title': f'Position {i % 2000}', 'company': 'Bench Co', 'location': f'City {i % 50}',
+            'salary_min': 50000 + i % 1000, 'salary_max': 150000 + i % 1000,
+            'employment_type': 'full', 'description': 'Lorem ipsum ' * 20, 'tags': ['python', 'sql'],
+        }, ensure_ascii=False) + '\n'
+        for i in range(rows)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--row-by-row-sample', type=int, default=5000, help='строк для замера построчных INSERT')
+    parser.add_argument('--sync-rows', type=int, default=10000, help='строк для замера повторной синхронизации')
+    args = parser.parse_args()
+
+    bulk = load_bulk()
+    conn = bulk.get_db_connection()
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO users (email, password_hash, full_name, user_type)
+            VALUES ('bench-bulk@example.com', '-', 'Bench', 'company')
+            ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name
+            RETURNING id
+        """)
+        employer_id = cur.fetchone()['id']
+        conn.commit()
+
+    payload = make_ndjson(args.rows)
+    print(f'NDJSON: {args.rows} строк, {len(payload) / 1e6:.1f} MB')
+
+    started = time.perf_counter()
+    result = bulk.import_vacancies(conn, employer_id, io.StringIO(payload))
+    elapsed = time.perf_counter() - started
+    print(f'import (COPY):        {elapsed:8.2f} s  {result["imported"] / elapsed:10.0f} строк/с')
+
+    sample = payload.splitlines()[:args.row_by_row_sample]
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        for line in sample:
+            values = bulk.validate_record(json.loads(line))
+            cur.execute("""
+                INSERT INTO vacancies (employer_id, title, company, location, salary_min, salary_max,
+                                       employment_type, experience, description, requirements, tags)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ARRAY(SELECT jsonb_array_elements_text(%s)))
+            """, (employer_id,) + values)
+            conn.commit()
+    elapsed = time.perf_counter() - started
+    print(f'построчные INSERT:    {elapsed * args.rows / len(sample):8.2f} s  {len(sample) / elapsed:10.0f} строк/с'
+          f'  (экстраполяция по {len(sample)} строкам)')
+
+    for fmt in ('ndjson', 'csv'):
+        out = io.StringIO()
+        started = time.perf_counter()
+        bulk.export_vacancies(conn, employer_id, out, fmt)
+        conn.rollback()
+        elapsed = time.perf_counter() - started
+        print(f'export ({fmt}):{" " * (14 - len(fmt))}{elapsed:8.2f} s  {len(out.getvalue()) / 1e6:10.1f} MB')
+
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM vacancies WHERE employer_id = %s', (employer_id,))
+        conn.commit()
+    sync_payload = ''.join(payload.splitlines(keepends=True)[:args.sync_rows])
+    for label in ('sync (новые)', 'sync (без изменений)'):
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_current_wal_lsn() AS lsn')
+            lsn = cur.fetchone()['lsn']
+            conn.commit()
+        started = time.perf_counter()
+        result = bulk.sync_vacancies(conn, employer_id, io.StringIO(sync_payload))
+        elapsed = time.perf_counter() - started
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s) AS wal', (lsn,))
+            wal = float(cur.fetchone()['wal'])
+            conn.commit()
+        print(f'{label + ":":22}{elapsed:8.2f} s  WAL {wal / 1e6:8.2f} MB  '
+              f'created={result["created"]} updated={result["updated"]} unchanged={result["unchanged"]}')
+
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM vacancies WHERE employer_id = %s', (employer_id,))
+        conn.commit()
+
+
+if __name__ == '__main__':
+    main()
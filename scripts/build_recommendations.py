@@ -0,0 +1,156 @@
+"""Офлайн-пересчёт рекомендаций: похожие вакансии (vacancy_neighbors) и лента «для вас» (user_recommendations).
+Отклики и избранное — неявные оценки в разреженной матрице пользователи x вакансии; похожесть вакансий —
+косинус её столбцов (кто откликнулся на X, интересовался и Y). Запускается по расписанию, например раз в час.
+Нужны numpy и scipy; функциям они не нужны — там одно чтение по первичному ключу готовых таблиц."""
+import argparse
+import io
+import os
+import time
+import numpy as np
+import psycopg2
+from scipy import sparse
+
+# Отклик — более сильный сигнал, чем добавление в избранное
+APPLICATION_WEIGHT = 2.0
+FAVORITE_WEIGHT = 1.0
+WRITE_BATCH = 500_000
+
+
+def read_interactions(cur, days: int) -> np.ndarray:
+    """Пары (пользователь, вакансия, вес) за последние days дней; из отклика и избранного берётся больший вес"""
+    buffer = io.StringIO()
+    cur.copy_expert(cur.mogrify("""
+        COPY (
+            SELECT user_id, vacancy_id, MAX(weight)
+            FROM (
+                SELECT applicant_id AS user_id, vacancy_id, %s AS weight FROM applications
+                WHERE created_at > NOW() - %s * INTERVAL '1 day'
+                UNION ALL
+                SELECT user_id, vacancy_id, %s FROM favorites
+                WHERE created_at > NOW() - %s * INTERVAL '1 day'
+            ) i
+            GROUP BY user_id, vacancy_id
+        ) TO STDOUT
+    """, (APPLICATION_WEIGHT, days, FAVORITE_WEIGHT, days)).decode(), buffer)
+    buffer.seek(0)
+    return np.loadtxt(buffer, dtype=np.float64, delimiter='\t', ndmin=2).reshape(-1, 3)
+
+
+def top_k(matrix: sparse.csr_matrix, k: int) -> tuple:
+    """k наибольших значений каждой строки: массивы (строка, место, столбец, значение); при равенстве — меньший столбец"""
+    matrix.sort_indices()
+    parts = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        data = matrix.data[start:end]
+        best = np.argsort(-data, kind='stable')[:k]
+        parts.append((np.full(len(best), row), np.arange(1, len(best) + 1), matrix.indices[start:end][best], data[best]))
+    return concatenate(parts)
+
+
+def concatenate(parts: list) -> tuple:
+    """Склейка результатов top_k по блокам строк"""
+    if not parts:
+        return tuple(np.empty(0, dtype=np.int64) for _ in range(3)) + (np.empty(0),)
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def similar_vacancies(ratings: sparse.csr_matrix, active: np.ndarray, args) -> tuple:
+    """Соседи каждой вакансии: косинус столбцов матрицы оценок по блокам вакансий, чтобы в памяти была
+    не вся матрица похожести (в плотных сегментах это десятки миллионов пар), а один блок до отбора лучших"""
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0))).ravel()
+    normalized = (ratings @ sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0))).tocsc()
+    engaged = (ratings > 0).astype(np.float32).tocsc()
+    # Соседями бывают только открытые вакансии; искать похожие можно и для закрытой
+    candidates = sparse.diags(active.astype(np.float64))
+    parts = []
+    for offset in range(0, ratings.shape[1], args.chunk):
+        block = slice(offset, offset + args.chunk)
+        similarity = (normalized[:, block].T @ normalized @ candidates).tocsr()
+        # Пары с малым числом общих пользователей — случайные совпадения
+        support = (engaged[:, block].T @ engaged).tocsr()
+        similarity = similarity.multiply(support >= args.min_support).tocsr()
+        similarity.setdiag(0, k=offset)
+        similarity.eliminate_zeros()
+        rows, ranks, columns, scores = top_k(similarity, args.neighbors)
+        parts.append((rows + offset, ranks, columns, scores))
+    return concatenate(parts)
+
+
+def recommend(ratings: sparse.csr_matrix, neighbors: sparse.csr_matrix, args) -> tuple:
+    """«Для вас»: сумма похожестей соседей всего, с чем пользователь уже работал, кроме него самого"""
+    parts = []
+    for offset in range(0, ratings.shape[0], args.chunk):
+        chunk = ratings[offset:offset + args.chunk]
+        scores = (chunk @ neighbors).tocsr()
+        scores = (scores - scores.multiply(chunk > 0)).tocsr()
+        scores.eliminate_zeros()
+        rows, ranks, columns, values = top_k(scores, args.recommendations)
+        parts.append((rows + offset, ranks, columns, values))
+    return concatenate(parts)
+
+
+def write_table(cur, table: str, *columns: np.ndarray):
+    """Полная замена содержимого таблицы; читатели видят старые строки до фиксации транзакции"""
+    cur.execute(f'DELETE FROM {table}')
+    for offset in range(0, len(columns[0]), WRITE_BATCH):
+        batch = (column[offset:offset + WRITE_BATCH].tolist() for column in columns)
+        cur.copy_expert(f'COPY {table} FROM STDIN', io.StringIO(
+            ''.join(f'{key}\t{rank}\t{item}\t{score:.5g}\n' for key, rank, item, score in zip(*batch))
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=180, help='окно активности')
+    parser.add_argument('--neighbors', type=int, default=30, help='похожих вакансий на вакансию')
+    parser.add_argument('--recommendations', type=int, default=50, help='рекомендаций на пользователя')
+    parser.add_argument('--min-support', type=int, default=2,
+                        help='минимум общих пользователей у пары вакансий: реже — случайное совпадение')
+    parser.add_argument('--max-user-items', type=int, default=500,
+                        help='пользователи с большей активностью (боты, массовые отклики) не учитываются')
+    parser.add_argument('--chunk', type=int, default=2000, help='строк (вакансий или пользователей) на одно умножение матриц')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    with conn.cursor() as cur:
+        interactions = read_interactions(cur, args.days)
+        cur.execute("SELECT id FROM vacancies WHERE status = 'active' AND (expires_at IS NULL OR expires_at > NOW())")
+        active_ids = np.array([row[0] for row in cur.fetchall()], dtype=np.int64)
+    conn.rollback()
+
+    user_ids, user_index = np.unique(interactions[:, 0].astype(np.int64), return_inverse=True)
+    vacancy_ids, vacancy_index = np.unique(interactions[:, 1].astype(np.int64), return_inverse=True)
+    ratings = sparse.csr_matrix((interactions[:, 2], (user_index, vacancy_index)),
+                                shape=(len(user_ids), len(vacancy_ids)))
+    per_user = np.diff(ratings.indptr)
+    ratings = sparse.diags((per_user <= args.max_user_items).astype(np.float64)) @ ratings
+    ratings.eliminate_zeros()
+    loaded = time.perf_counter()
+
+    rows, ranks, columns, scores = similar_vacancies(ratings, np.isin(vacancy_ids, active_ids), args)
+    neighbors = sparse.csr_matrix((scores, (rows, columns)), shape=(len(vacancy_ids), len(vacancy_ids)))
+    neighbor_rows = (vacancy_ids[rows], ranks, vacancy_ids[columns], scores)
+    similar_done = time.perf_counter()
+
+    rows, ranks, columns, scores = recommend(ratings, neighbors, args)
+    user_rows = (user_ids[rows], ranks, vacancy_ids[columns], scores)
+    computed = time.perf_counter()
+
+    with conn.cursor() as cur:
+        write_table(cur, 'vacancy_neighbors', *neighbor_rows)
+        write_table(cur, 'user_recommendations', *user_rows)
+    conn.commit()
+    conn.close()
+
+    print(f'взаимодействий: {len(interactions)}, пользователей: {len(user_ids)}, вакансий: {len(vacancy_ids)}; '
+          f'соседей: {len(neighbor_rows[0])}, рекомендаций: {len(user_rows[0])}')
+    print(f'чтение {loaded - started:.1f} с, похожие {similar_done - loaded:.1f} с, '
+          f'для вас {computed - similar_done:.1f} с, запись {time.perf_counter() - computed:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
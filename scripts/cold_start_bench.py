@@ -0,0 +1,124 @@
+"""Бенчмарк холодного старта облачных функций с историей замеров"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.bench', 'cold_start.jsonl')
+
+# Выполняется в свежем интерпретаторе: импорт, OPTIONS без БД, затем первый GET
+PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+index.handler({'httpMethod': 'OPTIONS', 'headers': {}}, None)
+t2 = time.perf_counter()
+first_request_ms = None
+if %(with_db)r:
+    index.handler({'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {}}, None)
+    first_request_ms = (time.perf_counter() - t2) * 1000
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'options_ms': (t2 - t1) * 1000, 'first_request_ms': first_request_ms}))
+'''
+
+
+def list_functions() -> list:
+    """Список функций: каталоги backend/ с index.py"""
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def run_probe(name: str, warmup: bool, with_db: bool) -> dict:
+    """Один холодный старт функции в отдельном процессе"""
+    env = dict(os.environ)
+    env.pop('DB_WARMUP', None)
+    if warmup:
+        env['DB_WARMUP'] = '1'
+    proc = subprocess.run(
+        [sys.executable, '-c', PROBE % {'with_db': with_db}],
+        cwd=os.path.join(BACKEND_DIR, name),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f'{name}: {proc.stderr.strip()}')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list, key: str):
+    values = [s[key] for s in samples if s[key] is not None]
+    if not values:
+        return None
+    return {'median': round(statistics.median(values), 2), 'max': round(max(values), 2)}
+
+
+def git_revision() -> str:
+    proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=BACKEND_DIR)
+    return proc.stdout.strip() or 'unknown'
+
+
+def load_previous(history_path: str) -> dict:
+    """Последний замер по каждой функции и режиму из файла истории"""
+    previous = {}
+    if not os.path.exists(history_path):
+        return previous
+    with open(history_path) as f:
+        for line in f:
+            record = json.loads(line)
+            previous[(record['function'], record['warmup'])] = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('functions', nargs='*', help='имена функций (по умолчанию все)')
+    parser.add_argument('--runs', type=int, default=10, help='число холодных стартов на функцию')
+    parser.add_argument('--warmup', action='store_true', help='замер с DB_WARMUP=1')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='файл истории замеров (JSONL)')
+    parser.add_argument('--no-save', action='store_true', help='не дописывать результат в историю')
+    args = parser.parse_args()
+
+    with_db = bool(os.environ.get('DATABASE_URL'))
+    previous = load_previous(args.history)
+    revision = git_revision()
+    records = []
+
+    for name in args.functions or list_functions():
+        samples = [run_probe(name, args.warmup, with_db) for _ in range(args.runs)]
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': revision,
+            'function': name,
+            'warmup': args.warmup,
+            'runs': args.runs,
+            'import_ms': summarize(samples, 'import_ms'),
+            'options_ms': summarize(samples, 'options_ms'),
+            'first_request_ms': summarize(samples, 'first_request_ms'),
+        }
+        records.append(record)
+
+        line = f"{name:<14} import {record['import_ms']['median']:7.1f} ms"
+        if record['first_request_ms']:
+            line += f"  first request {record['first_request_ms']['median']:7.1f} ms"
+        prev = previous.get((name, args.warmup))
+        if prev:
+            delta = record['import_ms']['median'] - prev['import_ms']['median']
+            line += f"  (import {delta:+.1f} ms vs {prev['revision']})"
+        print(line)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        with open(args.history, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Пакетный поиск почти одинаковых активных вакансий: досчитывает MinHash-подписи (массовый импорт, правки текста),
+сравнивает вакансии, совпавшие хотя бы в одной LSH-полосе, и помечает дубли ссылкой duplicate_of на самую раннюю
+вакансию группы. Подписи и пороги — те же, что при публикации в backend/vacancies.
+--close ещё и закрывает дубли; с --dry-run вакансии не меняются (подписи всё равно досчитываются)."""
+import argparse
+import importlib.util
+import os
+import psycopg2
+from psycopg2.extras import execute_values
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# В больших корзинах (шаблонные тексты) вакансии сравниваются только с самой ранней, а не попарно
+PAIRWISE_BUCKET_SIZE = 50
+
+
+def load(name: str):
+    spec = importlib.util.spec_from_file_location(f'dedupe_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def backfill_signatures(conn, vacancies, batch_size: int) -> int:
+    """Подписи активных вакансий, у которых их нет; пачками по id, каждая пачка — своя транзакция"""
+    last_id, total = 0, 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT v.id, v.employer_id, v.title, v.company, v.description
+                FROM vacancies v
+                WHERE v.id > %s AND v.status = 'active'
+                  AND NOT EXISTS (SELECT 1 FROM vacancy_signatures s WHERE s.vacancy_id = v.id)
+                ORDER BY v.id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            signed = []
+            for vacancy_id, employer_id, title, company, description in rows:
+                signature = vacancies.minhash_signature(title, company, description)
+                if signature:
+                    signed.append((vacancy_id, employer_id, signature, vacancies.lsh_bands(signature)))
+            if signed:
+                execute_values(cur, """
+                    INSERT INTO vacancy_signatures (vacancy_id, employer_id, minhash, bands) VALUES %s
+                    ON CONFLICT (vacancy_id) DO NOTHING
+                """, signed, page_size=batch_size)
+        conn.commit()
+        total += len(signed)
+    return total
+
+
+def find_groups(cur, vacancies) -> dict:
+    """Вакансия -> самая ранняя похожая на неё (через цепочку похожих); только для дублей"""
+    cur.execute("""
+        SELECT array_agg(s.vacancy_id ORDER BY s.vacancy_id)
+        FROM vacancy_signatures s
+        CROSS JOIN LATERAL unnest(s.bands) AS b (band)
+        GROUP BY b.band
+        HAVING count(*) > 1
+    """)
+    buckets = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT vacancy_id, minhash, employer_id FROM vacancy_signatures WHERE vacancy_id = ANY(%s)
+    """, (list({vacancy_id for bucket in buckets for vacancy_id in bucket}),))
+    signatures = {vacancy_id: (bytes(minhash), employer_id) for vacancy_id, minhash, employer_id in cur.fetchall()}
+
+    parent = {}
+
+    def root(vacancy_id: int) -> int:
+        while parent.get(vacancy_id, vacancy_id) != vacancy_id:
+            vacancy_id = parent[vacancy_id]
+        return vacancy_id
+
+    compared = set()
+    for bucket in buckets:
+        pairs = ((a, b) for i, a in enumerate(bucket) for b in bucket[i + 1:]) if len(bucket) <= PAIRWISE_BUCKET_SIZE \
+            else ((bucket[0], b) for b in bucket[1:])
+        for a, b in pairs:
+            if (a, b) in compared:
+                continue
+            compared.add((a, b))
+            (first, first_employer), (second, second_employer) = signatures[a], signatures[b]
+            threshold = vacancies.EMPLOYER_DUPLICATE_SIMILARITY if first_employer == second_employer \
+                else vacancies.DUPLICATE_SIMILARITY
+            if vacancies.signature_similarity(first, second) >= threshold:
+                ra, rb = root(a), root(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+    return {vacancy_id: root(vacancy_id) for vacancy_id in parent if root(vacancy_id) != vacancy_id}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--close', action='store_true', help='закрыть дубли, а не только пометить')
+    parser.add_argument('--dry-run', action='store_true', help='только посчитать дубли')
+    args = parser.parse_args()
+
+    vacancies = load('vacancies')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    signed = backfill_signatures(conn, vacancies, args.batch_size)
+    with conn.cursor() as cur:
+        originals = find_groups(cur, vacancies)
+    conn.commit()
+
+    marked = 0
+    status = "'closed'" if args.close else 'v.status'
+    if not args.dry_run:
+        rows = sorted(originals.items())
+        for offset in range(0, len(rows), args.batch_size):
+            with conn.cursor() as cur:
+                execute_values(cur, f"""
+                    UPDATE vacancies v SET duplicate_of = d.original_id, status = {status},
+                        version = v.version + 1, updated_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS d (id, original_id)
+                    WHERE v.id = d.id AND (v.duplicate_of IS DISTINCT FROM d.original_id OR v.status <> {status})
+                """, rows[offset:offset + args.batch_size], page_size=args.batch_size)
+                marked += cur.rowcount
+            conn.commit()
+    conn.close()
+
+    print(f'подписей досчитано: {signed}, групп: {len(set(originals.values()))}, дублей: {len(originals)}, '
+          f'{"закрыто" if args.close else "помечено"}: {marked}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Отчёт о времени импорта облачных функций (по выводу python -X importtime)"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def list_functions() -> list:
+    """Список функций: каталоги backend/ с index.py"""
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def parse_importtime(stderr: str) -> list:
+    """Разбор строк 'import time: self | cumulative | package' в список записей"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        entries.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(parts[0]),
+            'cumulative_us': int(parts[1]),
+        })
+    return entries
+
+
+def profile_function(name: str) -> dict:
+    """Импорт index.py функции в чистом интерпретаторе с -X importtime"""
+    env = dict(os.environ)
+    env.pop('DB_WARMUP', None)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import index'],
+        cwd=os.path.join(BACKEND_DIR, name),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {'function': name, 'error': proc.stderr.strip().splitlines()[-1]}
+
+    entries = parse_importtime(proc.stderr)
+    index_entry = next((e for e in entries if e['module'] == 'index'), None)
+    direct = [e for e in entries if e['depth'] == 1]
+    direct.sort(key=lambda e: e['cumulative_us'], reverse=True)
+    return {
+        'function': name,
+        'total_us': index_entry['cumulative_us'] if index_entry else sum(e['self_us'] for e in entries),
+        'index_self_us': index_entry['self_us'] if index_entry else 0,
+        'imports': direct,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('functions', nargs='*', help='имена функций (по умолчанию все)')
+    parser.add_argument('--top', type=int, default=10, help='сколько импортов показывать')
+    parser.add_argument('--json', action='store_true', help='вывод в JSON')
+    args = parser.parse_args()
+
+    reports = [profile_function(name) for name in (args.functions or list_functions())]
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+
+    for report in reports:
+        if 'error' in report:
+            print(f"{report['function']}: ошибка импорта: {report['error']}")
+            continue
+        print(f"{report['function']}: {report['total_us'] / 1000:.1f} ms (index.py: {report['index_self_us'] / 1000:.1f} ms)")
+        for entry in report['imports'][:args.top]:
+            print(f"    {entry['cumulative_us'] / 1000:8.1f} ms  {entry['module']}")
+
+
+if __name__ == '__main__':
+    main()
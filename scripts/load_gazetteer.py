@@ -0,0 +1,110 @@
+"""Загрузка справочника населённых пунктов geo_places из локальной выгрузки GeoNames (cities15000.txt, RU.txt и т.п.)
+и простановка координат вакансиям и резюме, город которых раньше не распознавался. Сеть не нужна: файл скачивается заранее.
+Повторный запуск обновляет уже загруженные места по geoname_id."""
+import argparse
+import io
+import os
+import psycopg2
+
+# Колонки формата geoname: https://download.geonames.org/export/dump/readme.txt
+GEONAME_ID, NAME, ALTERNATE_NAMES, LATITUDE, LONGITUDE, FEATURE_CLASS, COUNTRY_CODE, POPULATION = 0, 1, 3, 4, 5, 6, 8, 14
+
+
+def read_places(path: str, countries: set, min_population: int):
+    """Населённые пункты (класс P) из файла GeoNames: строки для COPY в staging-таблицу"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) <= POPULATION or columns[FEATURE_CLASS] != 'P':
+                continue
+            if countries and columns[COUNTRY_CODE] not in countries:
+                continue
+            population = int(columns[POPULATION] or 0)
+            if population < min_population:
+                continue
+            # Альтернативные названия — только буквенные (без кодов аэропортов и ссылок)
+            names = [name for name in columns[ALTERNATE_NAMES].split(',')
+                     if name and not any(ch.isdigit() for ch in name) and '\\' not in name and '"' not in name
+                     and '{' not in name and '}' not in name]
+            yield '\t'.join((columns[GEONAME_ID], columns[NAME].replace('\\', ''), columns[COUNTRY_CODE],
+                             columns[LATITUDE], columns[LONGITUDE], str(population),
+                             '{' + ','.join(f'"{name}"' for name in names) + '}')) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help='файл выгрузки GeoNames в формате geoname')
+    parser.add_argument('--countries', default='RU,BY,KZ', help='коды стран через запятую; пусто — все')
+    parser.add_argument('--min-population', type=int, default=1000)
+    args = parser.parse_args()
+
+    countries = {code.strip().upper() for code in args.countries.split(',') if code.strip()}
+    buffer = io.StringIO(''.join(read_places(args.path, countries, args.min_population)))
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE staging_places (
+                geoname_id INTEGER, name TEXT, country_code CHAR(2),
+                latitude DOUBLE PRECISION, longitude DOUBLE PRECISION, population INTEGER, alternate_names TEXT[]
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert('COPY staging_places FROM STDIN', buffer)
+
+        # Города из начального набора миграции получают geoname_id, а не дублируются
+        cur.execute("""
+            UPDATE geo_places p SET geoname_id = s.geoname_id
+            FROM staging_places s
+            WHERE p.geoname_id IS NULL AND p.country_code = s.country_code
+              AND normalize_place_name(p.name) IN (SELECT normalize_place_name(a) FROM unnest(s.name || s.alternate_names) a)
+              AND earth_distance(ll_to_earth(p.latitude, p.longitude), ll_to_earth(s.latitude, s.longitude)) < 20000
+        """)
+        cur.execute("""
+            INSERT INTO geo_places AS p (geoname_id, name, country_code, latitude, longitude, population)
+            SELECT geoname_id, name, country_code, latitude, longitude, population FROM staging_places
+            ON CONFLICT (geoname_id) DO UPDATE SET latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude,
+                population = GREATEST(p.population, EXCLUDED.population)
+        """)
+        places = cur.rowcount
+
+        # Одно написание — одно место: самое населённое среди одноимённых
+        cur.execute("""
+            INSERT INTO geo_place_names AS n (name_norm, place_id)
+            SELECT DISTINCT ON (name_norm) name_norm, p.id
+            FROM staging_places s
+            JOIN geo_places p ON p.geoname_id = s.geoname_id
+            CROSS JOIN LATERAL unnest(s.name || s.alternate_names) AS a (name)
+            CROSS JOIN LATERAL normalize_place_name(a.name) AS name_norm
+            WHERE name_norm IS NOT NULL AND length(name_norm) <= 200
+            ORDER BY name_norm, p.population DESC
+            ON CONFLICT (name_norm) DO UPDATE SET place_id = EXCLUDED.place_id
+            WHERE (SELECT population FROM geo_places WHERE id = EXCLUDED.place_id)
+                > (SELECT population FROM geo_places WHERE id = n.place_id)
+        """)
+        names = cur.rowcount
+
+        geocoded = {}
+        for table in ('vacancies', 'resumes'):
+            cur.execute(f"""
+                UPDATE {table} SET (place_id, latitude, longitude) = (
+                    SELECT g.place_id, g.latitude, g.longitude FROM geocode_place(location) g
+                )
+                WHERE location IS NOT NULL AND place_id IS NULL
+                  AND EXISTS (SELECT 1 FROM geo_place_names WHERE name_norm = normalize_place_name(location))
+            """)
+            geocoded[table] = cur.rowcount
+            # Координаты уточнённых мест (начальный набор -> GeoNames)
+            cur.execute(f"""
+                UPDATE {table} t SET latitude = p.latitude, longitude = p.longitude
+                FROM geo_places p
+                WHERE t.place_id = p.id AND (t.latitude, t.longitude) IS DISTINCT FROM (p.latitude, p.longitude)
+            """)
+    conn.commit()
+    conn.close()
+
+    print(f'мест: {places}, названий: {names}, '
+          f'распознано вакансий: {geocoded["vacancies"]}, резюме: {geocoded["resumes"]}')
+
+
+if __name__ == '__main__':
+    main()
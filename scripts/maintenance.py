@@ -0,0 +1,217 @@
+"""Обслуживающие задачи над большими таблицами вместо разовых UPDATE на всю таблицу: строки обходятся пачками
+по первичному ключу (keyset), каждая пачка — своя короткая транзакция, скорость ограничена --rate строк в секунду.
+После каждой пачки в maintenance_checkpoints фиксируется последний id: прерванная задача (Ctrl+C, падение,
+деплой) при повторном запуске продолжается с него. --dry-run проходит те же пачки и только считает строки.
+
+    python scripts/maintenance.py close_stale_vacancies --days 90 --rate 2000
+    python scripts/maintenance.py recount_views --dry-run
+    python scripts/maintenance.py --list"""
+import argparse
+import json
+import os
+import time
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import Json
+
+# Просмотры, уже свёрнутые аналитикой, берутся из посуточных агрегатов, остальные — из хвоста журнала после
+# водяного знака; агрегаты и водяной знак фиксируются одной транзакцией, поэтому в снимке одного запроса
+# событие не считается дважды
+COUNTED_VIEWS_SQL = """
+    SELECT v.id,
+           COALESCE((SELECT SUM(r.events) FROM vacancy_event_rollups r
+                     WHERE r.vacancy_id = v.id AND r.granularity = 'day' AND r.event_type = 'view'), 0)
+           + COALESCE(t.views, 0) AS views
+    FROM vacancies v
+    LEFT JOIN (
+        SELECT e.vacancy_id, COUNT(*) AS views FROM vacancy_events e
+        WHERE e.id > (SELECT last_id FROM rollup_watermarks WHERE name = 'vacancy_events')
+          AND e.event_type = 'view' AND e.vacancy_id > %(lower)s AND e.vacancy_id <= %(upper)s
+        GROUP BY e.vacancy_id
+    ) t ON t.vacancy_id = v.id
+    WHERE v.id > %(lower)s AND v.id <= %(upper)s
+"""
+
+# Каждая задача: (таблица обхода, описание, параметры, запрос подсчёта, запрос изменения).
+# Запросы получают границы пачки %(lower)s < id <= %(upper)s и параметры задачи и возвращают одно число строк
+JOBS = {
+    'close_stale_vacancies': (
+        'vacancies',
+        'закрыть активные вакансии, не обновлявшиеся --days дней',
+        ('days',),
+        """
+            SELECT COUNT(*) FROM vacancies
+            WHERE id > %(lower)s AND id <= %(upper)s
+              AND status = 'active' AND updated_at < NOW() - %(days)s * INTERVAL '1 day'
+        """,
+        """
+            WITH changed AS (
+                UPDATE vacancies SET status = 'closed', version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id > %(lower)s AND id <= %(upper)s
+                  AND status = 'active' AND updated_at < NOW() - %(days)s * INTERVAL '1 day'
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM changed
+        """,
+    ),
+    'rederive_tags': (
+        'vacancies',
+        'нормализовать теги: без пробелов по краям, без пустых и повторов без учёта регистра (первое написание)',
+        (),
+        """
+            SELECT COUNT(*) FROM vacancies
+            WHERE id > %(lower)s AND id <= %(upper)s AND tags IS DISTINCT FROM normalized_vacancy_tags(tags)
+        """,
+        """
+            WITH changed AS (
+                UPDATE vacancies
+                SET tags = normalized_vacancy_tags(tags), version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id > %(lower)s AND id <= %(upper)s AND tags IS DISTINCT FROM normalized_vacancy_tags(tags)
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM changed
+        """,
+    ),
+    'recount_views': (
+        'vacancies',
+        'пересчитать views_count по журналу событий',
+        (),
+        f"""
+            WITH counted AS ({COUNTED_VIEWS_SQL})
+            SELECT COUNT(*) FROM counted c JOIN vacancies v ON v.id = c.id WHERE v.views_count IS DISTINCT FROM c.views
+        """,
+        f"""
+            WITH counted AS ({COUNTED_VIEWS_SQL}), changed AS (
+                UPDATE vacancies v SET views_count = c.views
+                FROM counted c
+                WHERE v.id = c.id AND v.views_count IS DISTINCT FROM c.views
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM changed
+        """,
+    ),
+}
+
+LOCK_TIMEOUT = os.environ.get('MAINTENANCE_LOCK_TIMEOUT', '2s')
+LOCK_RETRIES = 5
+PROGRESS_SECONDS = 10
+
+
+def get_db_connection():
+    """Создание подключения к БД"""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+
+def load_checkpoint(cur, job: str, params: dict, restart: bool) -> tuple:
+    """(last_id, scanned, changed) для продолжения прерванного запуска; завершённый запуск начинается заново"""
+    cur.execute("SELECT params, last_id, scanned, changed, finished_at FROM maintenance_checkpoints WHERE job = %s",
+                (job,))
+    row = cur.fetchone()
+    if row and row[4] is None and not restart:
+        if row[0] != params:
+            raise SystemExit(f'{job}: прерванный запуск с параметрами {json.dumps(row[0])}; '
+                             f'повторите с ними или начните заново с --restart')
+        return row[1], row[2], row[3]
+    cur.execute("""
+        INSERT INTO maintenance_checkpoints (job, params) VALUES (%s, %s)
+        ON CONFLICT (job) DO UPDATE SET params = EXCLUDED.params, last_id = 0, scanned = 0, changed = 0,
+            started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP, finished_at = NULL
+    """, (job, Json(params)))
+    return 0, 0, 0
+
+
+def run_job(conn, job: str, params: dict, batch_size: int, rate: float, dry_run: bool, restart: bool) -> dict:
+    """Обход таблицы пачками; контрольная точка фиксируется в одной транзакции с изменениями пачки"""
+    table, _, _, count_sql, apply_sql = JOBS[job]
+    with conn.cursor() as cur:
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        if dry_run:
+            last_id, scanned, changed = 0, 0, 0
+        else:
+            last_id, scanned, changed = load_checkpoint(cur, job, params, restart)
+        conn.commit()
+
+        started = reported = time.monotonic()
+        resumed_from, resumed_scanned = last_id, scanned
+        while True:
+            chunk_started = time.monotonic()
+            cur.execute(f"""
+                SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s) chunk
+            """, (last_id, batch_size))
+            upper, rows = cur.fetchone()
+            if upper is None:
+                break
+            for attempt in range(LOCK_RETRIES):
+                try:
+                    cur.execute(count_sql if dry_run else apply_sql, dict(params, lower=last_id, upper=upper))
+                    matched = cur.fetchone()[0]
+                    if not dry_run:
+                        cur.execute("""
+                            UPDATE maintenance_checkpoints
+                            SET last_id = %s, scanned = scanned + %s, changed = changed + %s,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE job = %s
+                        """, (upper, rows, matched, job))
+                    conn.commit()
+                    break
+                except psycopg2.errors.LockNotAvailable:
+                    # Строки пачки держит другая транзакция: пачка повторяется целиком после паузы
+                    conn.rollback()
+                    if attempt == LOCK_RETRIES - 1:
+                        raise
+                    time.sleep(2 ** attempt)
+            last_id, scanned, changed = upper, scanned + rows, changed + matched
+
+            # Ограничение скорости по просмотренным строкам, а не по изменённым: нагрузку дают обе
+            time.sleep(max(0.0, rows / rate - (time.monotonic() - chunk_started)))
+            if time.monotonic() - reported >= PROGRESS_SECONDS:
+                reported = time.monotonic()
+                print(f'{job}: id {last_id}, просмотрено {scanned}, '
+                      f'{"к изменению" if dry_run else "изменено"} {changed}, '
+                      f'{(scanned - resumed_scanned) / (reported - started):.0f} строк/с', flush=True)
+
+        if not dry_run:
+            cur.execute("UPDATE maintenance_checkpoints SET finished_at = CURRENT_TIMESTAMP WHERE job = %s", (job,))
+            conn.commit()
+    return {'job': job, 'resumed_from': resumed_from, 'scanned': scanned,
+            'would_change' if dry_run else 'changed': changed, 'seconds': round(time.monotonic() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('job', nargs='?', choices=sorted(JOBS), help='задача')
+    parser.add_argument('--list', action='store_true', help='показать задачи и их контрольные точки')
+    parser.add_argument('--batch-size', type=int, default=1000, help='строк в пачке (одна транзакция)')
+    parser.add_argument('--rate', type=float, default=5000, help='не больше строк в секунду')
+    parser.add_argument('--days', type=int, default=90, help='для close_stale_vacancies')
+    parser.add_argument('--dry-run', action='store_true', help='только посчитать строки к изменению')
+    parser.add_argument('--restart', action='store_true', help='начать заново, не продолжая прерванный запуск')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.list or not args.job:
+            with conn.cursor() as cur:
+                cur.execute("SELECT job, last_id, scanned, changed, updated_at, finished_at FROM maintenance_checkpoints")
+                checkpoints = {row[0]: row[1:] for row in cur.fetchall()}
+            for name, (table, description, *_) in JOBS.items():
+                print(f'{name} ({table}): {description}')
+                if name in checkpoints:
+                    last_id, scanned, changed, updated_at, finished_at = checkpoints[name]
+                    state = f'завершён {finished_at:%Y-%m-%d %H:%M}' if finished_at else \
+                        f'прерван на id {last_id} ({updated_at:%Y-%m-%d %H:%M})'
+                    print(f'    {state}, просмотрено {scanned}, изменено {changed}')
+            return
+        params = {name: getattr(args, name) for name in JOBS[args.job][2]}
+        try:
+            result = run_job(conn, args.job, params, args.batch_size, args.rate, args.dry_run, args.restart)
+        except KeyboardInterrupt:
+            conn.rollback()
+            raise SystemExit(f'{args.job}: прервано, повторный запуск продолжит с последней контрольной точки')
+        print(json.dumps(result, ensure_ascii=False))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
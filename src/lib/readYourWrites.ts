@@ -0,0 +1,35 @@
+// Чтение своих записей при репликах: после успешного POST/PUT/PATCH/DELETE к функциям бэкенда
+// GET-запросы в течение минуты несут X-Since-Last-Write — сколько миллисекунд прошло с записи.
+// Функции по нему читают с primary, на каком бы инстансе ни выполнялся запрос.
+// Передаётся возраст записи, а не время, поэтому расхождение часов клиента и сервера не мешает.
+const FUNCTIONS_ORIGIN = 'https://functions.poehali.dev';
+const STORAGE_KEY = 'lastWriteAt';
+const WINDOW_MS = 60_000;
+
+export function installReadYourWrites() {
+  const originalFetch = window.fetch.bind(window);
+
+  window.fetch = async (input: RequestInfo | URL, init?: RequestInit) => {
+    const url = input instanceof Request ? input.url : String(input);
+    if (!url.startsWith(FUNCTIONS_ORIGIN)) {
+      return originalFetch(input, init);
+    }
+
+    const method = (init?.method || (input instanceof Request ? input.method : 'GET')).toUpperCase();
+    if (method === 'GET') {
+      const sinceWrite = Date.now() - Number(sessionStorage.getItem(STORAGE_KEY) || 0);
+      if (sinceWrite >= 0 && sinceWrite < WINDOW_MS) {
+        const headers = new Headers(init?.headers || (input instanceof Request ? input.headers : undefined));
+        headers.set('X-Since-Last-Write', String(sinceWrite));
+        init = { ...init, headers };
+      }
+      return originalFetch(input, init);
+    }
+
+    const response = await originalFetch(input, init);
+    if (response.ok && method !== 'OPTIONS') {
+      sessionStorage.setItem(STORAGE_KEY, String(Date.now()));
+    }
+    return response;
+  };
+}
@@ -0,0 +1,48 @@
+"""check_password (backend/auth) на повреждённых хешах: неудачная проверка вместо исключения.
+PostgreSQL не нужен: python -m unittest discover tests"""
+import hashlib
+import importlib.util
+import os
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://unused')
+os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+
+spec = importlib.util.spec_from_file_location('auth_index', os.path.join(ROOT_DIR, 'backend', 'auth', 'index.py'))
+auth = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(auth)
+
+
+class CheckPasswordTest(unittest.TestCase):
+
+    def test_valid_hash(self):
+        self.assertEqual(auth.check_password('secret', auth.hash_password('secret')), (True, False))
+        self.assertEqual(auth.check_password('wrong', auth.hash_password('secret')), (False, False))
+
+    def test_weaker_hash_needs_rehash(self):
+        self.assertEqual(auth.check_password('secret', auth.hash_password('secret', 500)), (True, True))
+
+    def test_legacy_sha256_needs_rehash(self):
+        legacy = hashlib.sha256(b'secret').hexdigest()
+        self.assertEqual(auth.check_password('secret', legacy), (True, True))
+
+    def test_malformed_hashes_fail_verification(self):
+        salt = auth.b64url_encode(bytes(16))
+        for password_hash in (
+            'a$b',
+            'pbkdf2_sha256$1000$salt',
+            'pbkdf2_sha256$1000$salt$digest$extra',
+            f'pbkdf2_sha256$abc${salt}${salt}',
+            f'pbkdf2_sha256$0${salt}${salt}',
+            f'pbkdf2_sha256${2 ** 64}${salt}${salt}',
+            f'pbkdf2_sha256$1000$!!!${salt}',
+            f'md5$1000${salt}${salt}',
+        ):
+            with self.subTest(password_hash=password_hash):
+                self.assertEqual(auth.check_password('secret', password_hash), (False, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""Число запросов update_profile (backend/auth) по веткам: поиск сессии и не больше одного UPDATE.
+Подключение к БД подменяется курсором, который считает запросы и отвечает заготовленными строками,
+поэтому тест не требует PostgreSQL: python -m unittest discover tests"""
+import importlib.util
+import json
+import os
+import unittest
+
+import psycopg2.errors
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://unused')
+os.environ['DB_PREPARED_STATEMENTS'] = '0'
+os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+
+spec = importlib.util.spec_from_file_location('auth_index', os.path.join(ROOT_DIR, 'backend', 'auth', 'index.py'))
+auth = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(auth)
+
+CURRENT_PASSWORD = 'old-password'
+
+
+class CountingCursor:
+    """Курсор, записывающий каждый запрос; SELECT сессии и UPDATE ... RETURNING получают строки из FakeConnection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+        self._row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.queries.append(' '.join(sql.split()))
+        if sql.lstrip().startswith('UPDATE users'):
+            if self.conn.email_taken:
+                raise psycopg2.errors.UniqueViolation()
+            full_name, email, _, user_id = params
+            user = self.conn.user
+            self._row = {'id': user_id, 'email': email or user['email'], 'full_name': full_name or user['full_name'],
+                         'user_type': user['user_type']}
+        else:
+            self._row = dict(self.conn.user) if self.conn.user else None
+
+    def fetchone(self):
+        return self._row
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, user, email_taken=False):
+        self.user = user
+        self.email_taken = email_taken
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self, cursor_factory=None):
+        return CountingCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class UpdateProfileQueriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.user = {'id': 1, 'email': 'user@example.com', 'full_name': 'Иван', 'user_type': 'applicant',
+                     'password_hash': auth.hash_password(CURRENT_PASSWORD)}
+        self.original_get_db_connection = auth.get_db_connection
+
+    def tearDown(self):
+        auth.get_db_connection = self.original_get_db_connection
+
+    def update(self, body, user='default', token='session-token', email_taken=False):
+        conn = FakeConnection(self.user if user == 'default' else user, email_taken)
+        auth.get_db_connection = lambda: conn
+        headers = {'X-Authorization': f'Bearer {token}'} if token else {}
+        response = auth.update_profile({'httpMethod': 'PUT', 'headers': headers, 'body': json.dumps(body)})
+        return response['statusCode'], json.loads(response['body']), conn
+
+    def assert_queries(self, conn, *prefixes):
+        self.assertEqual(len(conn.queries), len(prefixes), conn.queries)
+        for query, prefix in zip(conn.queries, prefixes):
+            self.assertTrue(query.startswith(prefix), query)
+
+    def test_without_token_no_queries(self):
+        status, _, conn = self.update({'full_name': 'Пётр'}, token=None)
+        self.assertEqual(status, 401)
+        self.assert_queries(conn)
+
+    def test_expired_session_only_lookup(self):
+        status, _, conn = self.update({'full_name': 'Пётр'}, user=None)
+        self.assertEqual(status, 401)
+        self.assert_queries(conn, 'SELECT')
+
+    def test_empty_body_only_lookup(self):
+        status, _, conn = self.update({})
+        self.assertEqual(status, 400)
+        self.assert_queries(conn, 'SELECT')
+
+    def test_same_email_no_update(self):
+        status, body, conn = self.update({'email': 'USER@example.com'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['profile']['email'], 'user@example.com')
+        self.assert_queries(conn, 'SELECT')
+        self.assertEqual(conn.commits, 0)
+
+    def test_name_change_lookup_and_one_update(self):
+        status, body, conn = self.update({'full_name': 'Пётр'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['profile']['full_name'], 'Пётр')
+        self.assert_queries(conn, 'SELECT', 'UPDATE users')
+        self.assertEqual(conn.commits, 1)
+
+    def test_all_fields_one_update(self):
+        status, body, conn = self.update({'full_name': 'Пётр', 'email': 'new@example.com',
+                                          'current_password': CURRENT_PASSWORD, 'new_password': 'new-password'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['profile']['email'], 'new@example.com')
+        self.assert_queries(conn, 'SELECT', 'UPDATE users')
+
+    def test_password_without_current_only_lookup(self):
+        status, _, conn = self.update({'new_password': 'new-password'})
+        self.assertEqual(status, 400)
+        self.assert_queries(conn, 'SELECT')
+
+    def test_wrong_current_password_only_lookup(self):
+        status, _, conn = self.update({'current_password': 'wrong', 'new_password': 'new-password'})
+        self.assertEqual(status, 400)
+        self.assert_queries(conn, 'SELECT')
+
+    def test_taken_email_lookup_and_failed_update(self):
+        status, body, conn = self.update({'email': 'taken@example.com'}, email_taken=True)
+        self.assertEqual(status, 400)
+        self.assertEqual(body['error'], 'Email уже используется')
+        self.assert_queries(conn, 'SELECT', 'UPDATE users')
+        self.assertEqual(conn.commits, 0)
+
+    def test_lookup_fetches_password_hash_only_here(self):
+        _, _, conn = self.update({'full_name': 'Пётр'})
+        self.assertIn('password_hash', conn.queries[0].split('FROM')[0])
+        for name in ('user_by_session', 'user_by_id'):
+            self.assertNotIn('password_hash', auth.PREPARED_STATEMENTS[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""validate_vacancy_patch и parse_int_param (backend/vacancies): тело PATCH и целые параметры GET проверяются до SQL,
+ошибки — 400, а не 500 от PostgreSQL.
+PostgreSQL не нужен: python -m unittest discover tests"""
+import importlib.util
+import os
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://unused')
+
+spec = importlib.util.spec_from_file_location('vacancies_index', os.path.join(ROOT_DIR, 'backend', 'vacancies', 'index.py'))
+vacancies = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(vacancies)
+
+
+class ValidateVacancyPatchTest(unittest.TestCase):
+
+    def test_valid_bodies(self):
+        for body in (
+            {'id': 1, 'status': 'closed'},
+            {'id': 1, 'version': 3, 'title': 'Аналитик', 'tags': ['sql'], 'salary_min': 100000},
+            {'id': 1, 'location': None, 'expires_at': '2030-01-01T10:00:00'},
+        ):
+            with self.subTest(body=body):
+                self.assertIsNone(vacancies.validate_vacancy_patch(body))
+
+    def test_invalid_bodies(self):
+        for body, field in (
+            ([], None),
+            ({'title': 'Аналитик'}, 'id'),
+            ({'id': '1', 'title': 'Аналитик'}, 'id'),
+            ({'id': True, 'title': 'Аналитик'}, 'id'),
+            ({'id': 1, 'version': 'x', 'title': 'Аналитик'}, 'version'),
+            ({'id': 1, 'title': None}, 'title'),
+            ({'id': 1, 'company': ' '}, 'company'),
+            ({'id': 1, 'status': None}, 'status'),
+            ({'id': 1, 'status': 'expired'}, 'status'),
+            ({'id': 1, 'title': 'x' * 256}, 'title'),
+            ({'id': 1, 'salary_max': 2 ** 31}, 'salary_max'),
+            ({'id': 1, 'tags': 'sql'}, 'tags'),
+            ({'id': 1, 'expires_at': 'завтра'}, 'expires_at'),
+        ):
+            with self.subTest(body=body):
+                error = vacancies.validate_vacancy_patch(body)
+                self.assertIsNotNone(error)
+                if field:
+                    self.assertTrue(error.startswith(field), error)
+
+    def test_no_patchable_fields(self):
+        self.assertEqual(vacancies.validate_vacancy_patch({'id': 1, 'version': 2}), 'Нет полей для обновления')
+
+
+class ParseIntParamTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(vacancies.parse_int_param({'similar_to': '42'}, 'similar_to', None, 1, 10 ** 6), 42)
+        self.assertIsNone(vacancies.parse_int_param({}, 'similar_to', None, 1, 10 ** 6))
+        self.assertIsNone(vacancies.parse_int_param({'similar_to': ''}, 'similar_to', None, 1, 10 ** 6))
+
+    def test_invalid_values(self):
+        for value in ('abc', '1.5', '0', str(2 ** 31)):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError) as raised:
+                    vacancies.parse_int_param({'similar_to': value}, 'similar_to', None, 1, vacancies.INT_MAX)
+                self.assertTrue(str(raised.exception).startswith('similar_to'))
+
+
+if __name__ == '__main__':
+    unittest.main()
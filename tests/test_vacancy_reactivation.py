@@ -0,0 +1,125 @@
+"""Новый срок публикации при повторной активации вакансии: PATCH (backend/vacancies) и синхронизация по external_id
+(backend/vacancies-bulk). Подключение к БД подменяется курсором, который записывает запросы и параметры,
+поэтому тест не требует PostgreSQL: python -m unittest discover tests"""
+import importlib.util
+import io
+import json
+import os
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://unused')
+os.environ['DB_PREPARED_STATEMENTS'] = '0'
+
+
+def load(function: str):
+    spec = importlib.util.spec_from_file_location(
+        function.replace('-', '_') + '_index', os.path.join(ROOT_DIR, 'backend', function, 'index.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+vacancies = load('vacancies')
+vacancies_bulk = load('vacancies-bulk')
+
+EMPLOYER = {'id': 7, 'user_type': 'employer'}
+
+
+class RecordingCursor:
+    """Курсор, записывающий запросы с параметрами; отвечает строками из FakeConnection.rows"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.queries.append((' '.join(sql.split()), params))
+
+    def copy_expert(self, sql, source):
+        self.conn.queries.append((' '.join(sql.split()), source.read()))
+
+    def fetchone(self):
+        return self.conn.rows.pop(0) if self.conn.rows else None
+
+    def fetchall(self):
+        rows, self.conn.rows = self.conn.rows, []
+        return rows
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    def cursor(self, cursor_factory=None, name=None):
+        return RecordingCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class PatchReactivationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.originals = vacancies.get_user_from_session, vacancies.get_db_connection
+        vacancies.get_user_from_session = lambda token: EMPLOYER
+
+    def tearDown(self):
+        vacancies.get_user_from_session, vacancies.get_db_connection = self.originals
+
+    def patch(self, body):
+        conn = FakeConnection([{'version': 2}])
+        vacancies.get_db_connection = lambda: conn
+        response = vacancies.handler({'httpMethod': 'PATCH', 'headers': {}, 'body': json.dumps(body)}, None)
+        self.assertEqual(response['statusCode'], 200, response['body'])
+        sql, params = conn.queries[0]
+        self.assertEqual(sql.count('%s'), len(params))
+        return sql, params
+
+    def test_status_change_recomputes_expiry(self):
+        sql, params = self.patch({'id': 1, 'status': 'active'})
+        self.assertIn("expires_at = CASE WHEN %s = 'active'", sql)
+        self.assertIn("NOW() + INTERVAL '30 days'", sql)
+        self.assertEqual(params[:2], ('active', 'active'))
+
+    def test_explicit_expiry_is_kept(self):
+        sql, params = self.patch({'id': 1, 'status': 'active', 'expires_at': '2030-01-01'})
+        self.assertNotIn('CASE', sql)
+        self.assertEqual(params[:2], ('active', '2030-01-01'))
+
+    def test_other_fields_leave_expiry(self):
+        sql, _ = self.patch({'id': 1, 'title': 'Python-разработчик'})
+        self.assertNotIn('expires_at', sql)
+
+
+class SyncReactivationTest(unittest.TestCase):
+
+    def test_upsert_recomputes_expiry_and_revives_expired(self):
+        conn = FakeConnection([{'distinct': 1}, {'created': False}])
+        line = json.dumps({'external_id': 'e1', 'title': 'Аналитик', 'company': 'ООО Ромашка', 'status': 'active'})
+        result = vacancies_bulk.sync_vacancies(conn, EMPLOYER['id'], io.StringIO(line + '\n'))
+        self.assertEqual(result['updated'], 1)
+
+        upsert = next(sql for sql, _ in conn.queries if sql.startswith('INSERT INTO vacancies'))
+        self.assertIn("expires_at = CASE WHEN EXCLUDED.status = 'active'", upsert)
+        # Вакансия, истёкшая по таймеру, при том же содержимом снова проходит в upsert
+        self.assertIn('AND v.status = s.status', upsert)
+        self.assertIn('OR vacancies.status IS DISTINCT FROM EXCLUDED.status', upsert)
+
+
+if __name__ == '__main__':
+    unittest.main()